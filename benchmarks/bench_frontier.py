@@ -0,0 +1,140 @@
+"""Compare link bookkeeping with and without the URL frontier.
+
+Simulates a crawl that sees 100k links: 1000 pages, each repeating the
+site's sidebar and adding a few page-specific links (some out of scope or
+pointing at assets). The legacy path recomputes the scope for every page,
+canonicalizes every link several times and scans the extension set with
+`endswith`; the frontier computes the scope once and interns keys.
+
+Run with: `uv run python benchmarks/bench_frontier.py`
+"""
+
+from __future__ import annotations
+
+import time
+from urllib.parse import urljoin, urlparse
+
+from docs2epub.frontier import NON_DOC_EXTENSIONS, UrlFrontier, canonicalize_url, path_within_root
+
+
+START_URL = "https://example.com/docs/intro"
+
+
+def synthetic_pages(*, pages: int = 1000, sidebar: int = 90, extra: int = 10) -> list[tuple[str, list[str]]]:
+  shared = [f"/docs/section-{i // 10}/page-{i}" for i in range(sidebar)]
+  out: list[tuple[str, list[str]]] = []
+  for p in range(pages):
+    page_url = f"https://example.com/docs/section-{p % 9}/page-{p}/"
+    links = list(shared)
+    for k in range(extra):
+      kind = k % 5
+      if kind == 0:
+        links.append(f"../page-{(p + k) % pages}/#heading-{k}")
+      elif kind == 1:
+        links.append(f"/docs/assets/diagram-{p}-{k}.png")
+      elif kind == 2:
+        links.append(f"https://github.com/example/repo/blob/main/file-{k}.md")
+      elif kind == 3:
+        links.append(f"/blog/post-{p}")
+      else:
+        links.append(f"#section-{k}")
+    out.append((page_url, links))
+  return out
+
+
+# --- Previous bookkeeping, as `_crawl` and `_extract_content_urls` did it. ---
+
+
+def _legacy_infer_root_path(start_url: str) -> str:
+  path = (urlparse(start_url).path or "").rstrip("/")
+  if not path:
+    return ""
+  parts = path.split("/")
+  return path if len(parts) <= 2 else "/".join(parts[:-1])
+
+
+def _legacy_is_probable_doc_link(url: str) -> bool:
+  path = (urlparse(url).path or "").lower()
+  for ext in NON_DOC_EXTENSIONS:
+    if path.endswith(ext):
+      return False
+  return True
+
+
+def _legacy_content_urls(hrefs: list[str], *, base_url: str, start_url: str) -> list[str]:
+  origin = urlparse(start_url).netloc.lower()
+  root_path = _legacy_infer_root_path(start_url)
+  urls: list[str] = []
+  seen: set[str] = set()
+  for href in hrefs:
+    if not href or href.startswith("#") or href.startswith(("mailto:", "tel:", "javascript:")):
+      continue
+    abs_url = urljoin(base_url, href)
+    parsed = urlparse(abs_url)
+    if parsed.scheme not in ("http", "https") or (origin and parsed.netloc.lower() != origin):
+      continue
+    if not _legacy_is_probable_doc_link(abs_url) or not path_within_root(parsed.path or "", root_path):
+      continue
+    canonical = canonicalize_url(abs_url)
+    if canonical in seen:
+      continue
+    seen.add(canonical)
+    urls.append(canonical)
+  return urls
+
+
+def legacy_crawl(pages: list[tuple[str, list[str]]]) -> list[str]:
+  queue: list[str] = []
+  discovered: set[str] = set()
+  visited: set[str] = set()
+  for page_url, hrefs in pages:
+    key = canonicalize_url(page_url)
+    if key not in visited:
+      visited.add(key)
+    for link in _legacy_content_urls(hrefs, base_url=page_url, start_url=START_URL):
+      key = canonicalize_url(link)
+      if key in discovered:
+        continue
+      discovered.add(key)
+      queue.append(link)
+  return queue
+
+
+def frontier_crawl(pages: list[tuple[str, list[str]]]) -> list[str]:
+  frontier = UrlFrontier(START_URL)
+  for page_url, hrefs in pages:
+    frontier.visit(page_url)
+    seen: set[str] = set()
+    for href in hrefs:
+      key = frontier.resolve(href, page_url)
+      if key is None or key in seen:
+        continue
+      seen.add(key)
+      frontier.push(key)
+  return frontier.queue
+
+
+def best_of(fn, *, repeat: int = 5) -> float:
+  best = float("inf")
+  for _ in range(repeat):
+    started = time.perf_counter()
+    fn()
+    best = min(best, time.perf_counter() - started)
+  return best
+
+
+def main() -> None:
+  pages = synthetic_pages()
+  total = sum(len(hrefs) for _, hrefs in pages)
+  assert legacy_crawl(pages) == frontier_crawl(pages)
+
+  legacy_s = best_of(lambda: legacy_crawl(pages))
+  frontier_s = best_of(lambda: frontier_crawl(pages))
+  print(f"links:    {total}")
+  print(f"legacy:   {legacy_s * 1000:8.1f} ms")
+  print(f"frontier: {frontier_s * 1000:8.1f} ms")
+  print(f"speedup:  {legacy_s / frontier_s:.1f}x")
+
+
+if __name__ == "__main__":
+  main()
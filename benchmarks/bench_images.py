@@ -0,0 +1,90 @@
+"""Measure image handling while writing chapters for pandoc.
+
+Feeds 20 chapters with 4 images each (640x480 JPEGs, re-encoded to PNG)
+through the EPUB2 chapter loop, served from memory with a fixed per-request
+latency. Sequentially, each `<img>` waits for its download and then its
+conversion. With the pools, images of the next chapters are downloaded on
+threads and converted in worker processes while earlier chapters are
+cleaned.
+
+Run with: `uv run python benchmarks/bench_images.py`
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+from PIL import Image
+
+from docs2epub.kindle_html import clean_html_for_kindle_epub2
+from docs2epub.kindle_images import KindleImageProcessor
+from docs2epub.model import Chapter
+from docs2epub.pandoc_epub2 import _read_ahead
+from docs2epub.transport import make_response
+
+
+CHAPTERS = 20
+IMAGES_PER_CHAPTER = 4
+LATENCY_S = 0.05
+
+
+def _jpeg(seed: int) -> bytes:
+  image = Image.effect_noise((640, 480), 40 + seed % 20).convert("RGB")
+  with io.BytesIO() as out:
+    image.save(out, format="JPEG", quality=85)
+    return out.getvalue()
+
+
+class SlowSession:
+  def __init__(self, images: dict[str, bytes]) -> None:
+    self.headers: dict[str, str] = {}
+    self._images = images
+
+  def get(self, url: str, timeout: float = 30, **kwargs) -> requests.Response:
+    time.sleep(LATENCY_S)
+    return make_response(url, status=200, body=self._images[url], headers={"Content-Type": "image/jpeg"})
+
+
+def run(chapters: list[Chapter], images: dict[str, bytes], *, workers: int, processes: int) -> tuple[float, list[str]]:
+  with tempfile.TemporaryDirectory() as tmp:
+    processor = KindleImageProcessor(
+      assets_dir=Path(tmp) / "assets", session=SlowSession(images), workers=workers, processes=processes
+    )
+    started = time.perf_counter()
+    with processor:
+      html = [
+        clean_html_for_kindle_epub2(ch.html, keep_images=True, base_url=ch.url, image_rewriter=processor.rewrite)
+        for ch, _ in _read_ahead(chapters, processor, 8)
+      ]
+    return time.perf_counter() - started, html
+
+
+def main() -> None:
+  images: dict[str, bytes] = {}
+  chapters: list[Chapter] = []
+  for i in range(CHAPTERS):
+    srcs = [f"https://example.com/img/{i}-{k}.jpg" for k in range(IMAGES_PER_CHAPTER)]
+    for k, src in enumerate(srcs):
+      images[src] = _jpeg(i * IMAGES_PER_CHAPTER + k)
+    body = "".join(f'<p>Figure {k}</p><img src="{src}" alt="">' for k, src in enumerate(srcs))
+    chapters.append(
+      Chapter(index=i + 1, title=f"Chapter {i}", url=f"https://example.com/docs/{i}", html=body, image_urls=tuple(srcs))
+    )
+
+  processes = min(4, os.cpu_count() or 1)
+  serial, expected = run(chapters, images, workers=0, processes=0)
+  pooled, actual = run(chapters, images, workers=8, processes=processes)
+  assert actual == expected
+
+  print(f"{CHAPTERS} chapters x {IMAGES_PER_CHAPTER} images, {LATENCY_S * 1000:.0f} ms latency")
+  label = f"8 threads + {processes} processes:"
+  print(f"  {'sequential:':<{len(label)}} {serial * 1000:7.0f} ms")
+  print(f"  {label} {pooled * 1000:7.0f} ms ({serial / pooled:.2f}x)")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,133 @@
+"""Compare page parsing before and after the heavy-element pre-filter.
+
+Builds a synthetic Next.js-style page (large `__NEXT_DATA__` payload, inline
+bundles, styles and SVG icons around a modest article) and measures the time
+and peak traced memory of:
+
+- full: `BeautifulSoup(html)` of everything, then `_remove_unwanted` (the old path)
+- targeted: `_parse_article_region` (pre-filter + article-region parse)
+
+It also compares charset handling on a page served without a charset
+parameter: `resp.text` (requests guesses the encoding, then the parser
+re-encodes the str) against handing the raw bytes to the parser.
+
+Run with: `uv run python benchmarks/bench_parse.py`
+"""
+
+from __future__ import annotations
+
+import json
+import time
+import tracemalloc
+
+import requests
+from bs4 import BeautifulSoup
+
+from docs2epub.docusaurus_next import (
+  _extract_article,
+  _page_markup,
+  _parse_article_region,
+  _parse_page,
+  _remove_unwanted,
+)
+
+
+ICON = '<svg viewBox="0 0 24 24" width="16" height="16"><path d="M12 2L2 7l10 5 10-5-10-5z"/></svg>'
+
+
+def heavy_page(*, payload_items: int = 4000, sidebar_links: int = 400) -> str:
+  next_data = json.dumps(
+    {
+      "props": {
+        "pageProps": {
+          "items": [
+            {"id": i, "title": f"Item {i}", "body": "<p>" + "lorem ipsum " * 20 + "</p>"}
+            for i in range(payload_items)
+          ]
+        }
+      }
+    }
+  )
+  scripts = "".join(f"<script>self.__next_f.push([1, {json.dumps('x' * 4000)}])</script>" for _ in range(60))
+  styles = "".join(f"<style>.c{i} {{ color: #{i:06x}; }}</style>" for i in range(200))
+  sidebar = "".join(f'<li><a href="/docs/page-{i}">{ICON}Page {i}</a></li>' for i in range(sidebar_links))
+  article = "".join(f"<h2>Section {i}</h2><p>{'Some documentation text. ' * 30}</p>" for i in range(40))
+  return (
+    "<!doctype html><html><head><title>Docs</title>"
+    f"{styles}</head><body>"
+    f'<header>{ICON * 50}</header><nav class="sidebar"><ul>{sidebar}</ul></nav>'
+    f"<main><article><h1>Heavy page</h1>{article}</article></main>"
+    f'{scripts}<script id="__NEXT_DATA__" type="application/json">{next_data}</script>'
+    "</body></html>"
+  )
+
+
+class _Response:
+  def __init__(self, text: str) -> None:
+    self.content = text.encode("utf-8")
+    self.headers = {"content-type": "text/html; charset=utf-8"}
+
+
+def full_parse(html: str) -> str:
+  soup = BeautifulSoup(html, "lxml")
+  article = _extract_article(soup)
+  _remove_unwanted(article)
+  return article.decode_contents()
+
+
+def targeted_parse(html: str) -> str:
+  soup = _parse_article_region(_page_markup(_Response(html)))
+  article = _extract_article(soup)
+  _remove_unwanted(article)
+  return article.decode_contents()
+
+
+def measure(fn, html: str, *, repeat: int = 5) -> tuple[float, float]:
+  best = float("inf")
+  for _ in range(repeat):
+    started = time.perf_counter()
+    fn(html)
+    best = min(best, time.perf_counter() - started)
+  tracemalloc.start()
+  fn(html)
+  _, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return best, peak / (1024 * 1024)
+
+
+def _unlabelled_response(html: str) -> requests.Response:
+  resp = requests.Response()
+  resp.status_code = 200
+  resp._content = html.encode("utf-8")
+  return resp
+
+
+def text_decode(html: str) -> str:
+  resp = _unlabelled_response(html)
+  return BeautifulSoup(resp.text, "lxml").title.get_text()
+
+
+def bytes_decode(html: str) -> str:
+  resp = _unlabelled_response(html)
+  return _parse_page(_page_markup(resp)).title.get_text()
+
+
+def main() -> None:
+  html = heavy_page()
+  assert full_parse(html) == targeted_parse(html)
+  print(f"fixture: {len(html) / (1024 * 1024):.2f} MB")
+  full_s, full_mb = measure(full_parse, html)
+  targeted_s, targeted_mb = measure(targeted_parse, html)
+  print(f"full:     {full_s * 1000:8.1f} ms  peak {full_mb:7.1f} MB")
+  print(f"targeted: {targeted_s * 1000:8.1f} ms  peak {targeted_mb:7.1f} MB")
+  print(f"speedup:  {full_s / targeted_s:.1f}x time, {full_mb / targeted_mb:.1f}x memory")
+
+  page = heavy_page(payload_items=200, sidebar_links=100).replace("Heavy page", "Héavy page")
+  text_s, _ = measure(text_decode, page)
+  bytes_s, _ = measure(bytes_decode, page)
+  print(f"resp.text + parse:  {text_s * 1000:8.1f} ms")
+  print(f"raw bytes + parse:  {bytes_s * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,87 @@
+"""Measure speculative prefetch on the Next-button chain over a slow link.
+
+Serves a 40-page chain from memory with a fixed per-request latency (the
+round trip to a distant host). Each page is a realistic ~150 KB article,
+so parsing and cleaning take a noticeable share of the time. Without
+prefetch, the crawl is serial: each page waits for its fetch, then for its
+parse. With prefetch, the next page is already on the wire while the
+current page is parsed.
+
+Run with: `uv run python benchmarks/bench_prefetch.py`
+"""
+
+from __future__ import annotations
+
+import time
+
+import requests
+
+import docs2epub.docusaurus_next as crawler
+from docs2epub.docusaurus_next import DocusaurusNextOptions, iter_docusaurus_next
+from docs2epub.transport import make_response
+
+
+PAGES = 40
+LATENCY_S = 0.06
+
+
+def _page(index: int) -> bytes:
+  body = "".join(
+    f"<h2 id='s{k}'>Section {k}</h2><p>{'Lorem ipsum dolor sit amet. ' * 30}</p>"
+    f"<pre><code>{'x = compute(y) ' * 20}</code></pre>"
+    for k in range(40)
+  )
+  pager = (
+    f'<nav aria-label="Docs pages"><a class="pagination-nav__link--next" href="/docs/p{index + 1}">Next</a></nav>'
+    if index + 1 < PAGES
+    else ""
+  )
+  return f"<html><body><main><article><h1>Page {index}</h1>{body}</article>{pager}</main></body></html>".encode()
+
+
+class SlowSession:
+  def __init__(self, pages: dict[str, bytes]) -> None:
+    self.headers: dict[str, str] = {}
+    self._pages = pages
+
+  def get(self, url: str, timeout: float = 30, **kwargs) -> requests.Response:
+    time.sleep(LATENCY_S)
+    return make_response(
+      url,
+      status=200 if url in self._pages else 404,
+      body=self._pages.get(url, b""),
+      headers={"Content-Type": "text/html; charset=utf-8"},
+    )
+
+
+def run(*, prefetch: bool) -> float:
+  pages = {f"https://example.com/docs/p{i}": _page(i) for i in range(PAGES)}
+  crawler.new_session = lambda *args, **kwargs: SlowSession(pages)
+  if not prefetch:
+    crawler._prefetch_hints = lambda raw: []
+  options = DocusaurusNextOptions(
+    start_url="https://example.com/docs/p0",
+    sleep_s=0,
+    respect_robots=False,
+    max_rate=None,
+    dedupe=False,
+  )
+  started = time.perf_counter()
+  chapters = list(iter_docusaurus_next(options))
+  elapsed = time.perf_counter() - started
+  assert len(chapters) == PAGES
+  return elapsed
+
+
+def main() -> None:
+  hints = crawler._prefetch_hints
+  serial = run(prefetch=False)
+  crawler._prefetch_hints = hints
+  speculative = run(prefetch=True)
+  print(f"{PAGES} pages, {LATENCY_S * 1000:.0f} ms latency")
+  print(f"  serial chain: {serial * 1000:7.0f} ms")
+  print(f"  prefetch:     {speculative * 1000:7.0f} ms ({serial / speculative:.2f}x)")
+
+
+if __name__ == "__main__":
+  main()
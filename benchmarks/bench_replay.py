@@ -0,0 +1,67 @@
+"""Measure WARC replay: index build on open and per-response reads.
+
+Writes 2000 synthetic 60 KB pages to `.warc` and `.warc.gz`, then times
+opening each archive (the one-off index scan) and reading every response
+back. Replay should stay far below parse/clean costs so recorded crawls
+benchmark the pipeline, not the archive.
+
+Run with: `uv run python benchmarks/bench_replay.py`
+"""
+
+from __future__ import annotations
+
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from docs2epub.warc import WarcArchive, WarcWriter
+
+
+PAGES = 2000
+
+
+def _page(index: int) -> requests.Response:
+  resp = requests.Response()
+  resp.url = f"https://example.com/docs/page-{index}"
+  resp.status_code = 200
+  resp.reason = "OK"
+  resp.headers = CaseInsensitiveDict({"Content-Type": "text/html; charset=utf-8"})
+  resp._content = (f"<p>Paragraph {index} of the page.</p>\n" * 2000).encode("utf-8")
+  return resp
+
+
+def bench(path: Path) -> None:
+  writer = WarcWriter(path)
+  for index in range(PAGES):
+    writer.record(_page(index))
+  writer.close()
+
+  started = time.perf_counter()
+  archive = WarcArchive(path)
+  open_ms = (time.perf_counter() - started) * 1000
+
+  started = time.perf_counter()
+  total = 0
+  for index in range(PAGES):
+    total += len(archive.response(f"https://example.com/docs/page-{index}").content)
+  read_ms = (time.perf_counter() - started) * 1000
+  archive.close()
+
+  size_mb = path.stat().st_size / (1024 * 1024)
+  print(
+    f"{path.name:>14}: {size_mb:7.1f} MB on disk, open+index {open_ms:7.1f} ms, "
+    f"reads {read_ms / PAGES:.3f} ms/response ({total / (1024 * 1024):.0f} MB)"
+  )
+
+
+def main() -> None:
+  with tempfile.TemporaryDirectory() as tmp:
+    bench(Path(tmp) / "crawl.warc")
+    bench(Path(tmp) / "crawl.warc.gz")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,167 @@
+"""Compare sidebar detection against the previous multi-pass implementation.
+
+The fixture mimics a large single-page site (like GitHub's rendered BOOK.md):
+thousands of nested `div`s whose classes contain sidebar keywords, with the
+links spread across overlapping containers.
+
+Run with: `uv run python benchmarks/bench_sidebar.py`
+"""
+
+from __future__ import annotations
+
+import time
+from urllib.parse import urljoin, urlparse
+
+from bs4 import BeautifulSoup, Tag
+
+from docs2epub.docusaurus_next import _extract_sidebar_urls
+from docs2epub.frontier import (
+  UrlFrontier,
+  canonicalize_url,
+  infer_root_path,
+  is_probable_doc_link,
+  path_within_root,
+)
+
+
+# --- Previous implementation, kept verbatim for comparison. ---
+
+_LEGACY_SELECTORS = [
+  'aside[data-testid="table-of-contents"]',
+  "aside#table-of-contents",
+  'nav[aria-label="Table of contents"]',
+  'nav[aria-label="Table of Contents"]',
+  'nav[aria-label="Docs sidebar"]',
+  'nav[aria-label="Docs navigation"]',
+  'nav[aria-label="Documentation"]',
+  'nav[aria-label="Docs"]',
+  "aside.theme-doc-sidebar-container",
+  "div.theme-doc-sidebar-container",
+  "nav.theme-doc-sidebar-menu",
+  "nav.menu",
+  'nav[class*="menu"]',
+  'aside[class*="sidebar"]',
+  'nav[class*="sidebar"]',
+]
+
+
+def _legacy_candidates(soup: BeautifulSoup) -> list[Tag]:
+  seen: set[int] = set()
+  candidates: list[Tag] = []
+  for selector in _LEGACY_SELECTORS:
+    for el in soup.select(selector):
+      if id(el) in seen:
+        continue
+      seen.add(id(el))
+      candidates.append(el)
+  keywords = ["sidebar", "toc", "table of contents", "table-of-contents", "docs", "documentation"]
+  for el in soup.find_all(["nav", "aside", "div"]):
+    if id(el) in seen:
+      continue
+    haystack = " ".join(
+      [
+        str(el.get("aria-label") or "").lower(),
+        str(el.get("id") or "").lower(),
+        str(el.get("data-testid") or "").lower(),
+        " ".join(el.get("class", [])).lower(),
+      ]
+    )
+    if any(k in haystack for k in keywords):
+      seen.add(id(el))
+      candidates.append(el)
+  return candidates
+
+
+def _legacy_looks_like_pager(container: Tag, links: list[Tag]) -> bool:
+  label = str(container.get("aria-label") or "").lower()
+  if "docs pages" in label or "breadcrumb" in label:
+    return True
+  if not links:
+    return True
+  texts = [t for t in (" ".join(a.get_text(" ", strip=True).split()).lower() for a in links) if t]
+  if not texts:
+    return False
+  return all(text in {"next", "previous", "prev", "back"} for text in texts)
+
+
+def legacy_extract_sidebar_urls(soup: BeautifulSoup, *, base_url: str, start_url: str) -> list[str]:
+  candidates = _legacy_candidates(soup)
+  origin = urlparse(start_url).netloc.lower()
+  root_path = infer_root_path(start_url)
+  best: list[str] = []
+  for container in candidates:
+    anchors = list(container.find_all("a", href=True))
+    if _legacy_looks_like_pager(container, anchors):
+      continue
+    urls: list[str] = []
+    seen: set[str] = set()
+    for a in anchors:
+      href = str(a.get("href") or "").strip()
+      if not href or href.startswith("#") or href.startswith(("mailto:", "tel:", "javascript:")):
+        continue
+      abs_url = urljoin(base_url, href)
+      parsed = urlparse(abs_url)
+      if parsed.scheme not in ("http", "https"):
+        continue
+      if origin and parsed.netloc.lower() != origin:
+        continue
+      if not is_probable_doc_link(abs_url) or not path_within_root(parsed.path or "", root_path):
+        continue
+      canonical = canonicalize_url(abs_url)
+      if canonical in seen:
+        continue
+      seen.add(canonical)
+      urls.append(canonical)
+    if len(urls) > len(best):
+      best = urls
+  return best
+
+
+# --- Fixture and timing. ---
+
+
+def big_single_page(*, sections: int = 300, depth: int = 6, links_per_section: int = 8) -> str:
+  parts = ['<html><body><div class="docs-wrapper"><nav class="menu">']
+  parts.extend(f'<a href="/book/ch{i}">Chapter {i}</a>' for i in range(40))
+  parts.append("</nav><div class='markdown-body docs-content'>")
+  for s in range(sections):
+    parts.append("".join(f'<div class="toc-level-{d} docs-section">' for d in range(depth)))
+    parts.extend(
+      f'<a href="/book/ch{s % 40}#sec-{s}-{k}">Section {s}.{k}</a>' for k in range(links_per_section)
+    )
+    parts.append("</div>" * depth)
+  parts.append("</div></div></body></html>")
+  return "".join(parts)
+
+
+def best_of(fn, *, repeat: int = 5) -> float:
+  best = float("inf")
+  for _ in range(repeat):
+    started = time.perf_counter()
+    fn()
+    best = min(best, time.perf_counter() - started)
+  return best
+
+
+def main() -> None:
+  soup = BeautifulSoup(big_single_page(), "lxml")
+  base_url = start_url = "https://example.com/book/"
+
+  def current() -> list[str]:
+    return _extract_sidebar_urls(soup, base_url=base_url, frontier=UrlFrontier(start_url))
+
+  def legacy() -> list[str]:
+    return legacy_extract_sidebar_urls(soup, base_url=base_url, start_url=start_url)
+
+  assert legacy() == current()
+
+  legacy_s = best_of(legacy)
+  current_s = best_of(current)
+  print(f"elements: {len(soup.find_all(True))}")
+  print(f"legacy:  {legacy_s * 1000:8.1f} ms")
+  print(f"current: {current_s * 1000:8.1f} ms")
+  print(f"speedup: {legacy_s / current_s:.1f}x")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import re
+import time
+import tomllib
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import urlparse
+
+
+_URL_RE = re.compile(r"https?://\S+")
+
+
+@dataclass(frozen=True)
+class BatchJob:
+  start_url: str
+  out: Path
+  title: str | None = None
+  author: str | None = None
+  language: str | None = None
+
+
+@dataclass
+class BatchResult:
+  job: BatchJob
+  pages: int = 0
+  elapsed_s: float = 0.0
+  size_bytes: int = 0
+  error: str | None = None
+
+
+def default_out_name(start_url: str) -> str:
+  """`https://example.com/docs/intro/` -> `example.com-docs-intro.epub`."""
+
+  parsed = urlparse(start_url)
+  parts = [parsed.netloc, *(part for part in parsed.path.split("/") if part)]
+  stem = re.sub(r"[^\w.-]+", "-", "-".join(parts)).strip("-")
+  return f"{stem or 'book'}.epub"
+
+
+def load_manifest(path: str | Path, *, out_dir: str | Path = ".") -> list[BatchJob]:
+  """Read the books to build from `path`.
+
+  A `.toml` manifest holds `[[book]]` tables with `url` and optional `out`,
+  `title`, `author` and `language`. Any other file is read as a list of
+  URLs, one per line (other text is ignored), so `ROADMAP.md` works as is.
+  Outputs without an explicit path go to `out_dir`, named after the URL.
+  """
+
+  path = Path(path)
+  out_dir = Path(out_dir)
+  if path.suffix == ".toml":
+    data = tomllib.loads(path.read_text(encoding="utf-8"))
+    entries = data.get("book") or []
+  else:
+    entries = [
+      {"url": match.group(0).rstrip(".,)>")}
+      for line in path.read_text(encoding="utf-8").splitlines()
+      if (match := _URL_RE.search(line))
+    ]
+
+  jobs: list[BatchJob] = []
+  for entry in entries:
+    url = entry.get("url")
+    if not url:
+      raise ValueError(f"{path}: every book needs a url")
+    out = Path(entry["out"]) if entry.get("out") else out_dir / default_out_name(url)
+    jobs.append(
+      BatchJob(
+        start_url=url,
+        out=out if out.is_absolute() or entry.get("out") is None else path.parent / out,
+        title=entry.get("title"),
+        author=entry.get("author"),
+        language=entry.get("language"),
+      )
+    )
+  outs = [job.out.resolve() for job in jobs]
+  if len(set(outs)) != len(outs):
+    raise ValueError(f"{path}: two books write to the same output file")
+  return jobs
+
+
+def run_batch(
+  jobs: list[BatchJob],
+  build: Callable[[BatchJob], tuple[int, Path]],
+  *,
+  max_jobs: int = 3,
+) -> list[BatchResult]:
+  """Build up to `max_jobs` books at a time; one failing book does not stop the rest.
+
+  `build` returns the number of pages and the output path. Results keep the
+  manifest order.
+  """
+
+  def run(job: BatchJob) -> BatchResult:
+    result = BatchResult(job=job)
+    started = time.perf_counter()
+    try:
+      result.pages, out_path = build(job)
+      result.size_bytes = out_path.stat().st_size
+    except (Exception, SystemExit) as exc:
+      result.error = str(exc) or type(exc).__name__
+    result.elapsed_s = time.perf_counter() - started
+    return result
+
+  with ThreadPoolExecutor(max_workers=max(1, max_jobs), thread_name_prefix="docs2epub-batch") as pool:
+    return list(pool.map(run, jobs))
+
+
+def summary_table(results: list[BatchResult]) -> list[str]:
+  rows = [("Book", "Pages", "Time", "Size", "Status")]
+  for result in results:
+    rows.append(
+      (
+        result.job.start_url,
+        str(result.pages) if result.error is None else "-",
+        f"{result.elapsed_s:.1f}s",
+        f"{result.size_bytes / (1024 * 1024):.2f} MB" if result.error is None else "-",
+        "ok" if result.error is None else f"failed: {result.error}",
+      )
+    )
+  widths = [max(len(row[i]) for row in rows) for i in range(4)]
+  return [
+    "  ".join(
+      [row[0].ljust(widths[0]), row[1].rjust(widths[1]), row[2].rjust(widths[2]), row[3].rjust(widths[3]), row[4]]
+    )
+    for row in rows
+  ]
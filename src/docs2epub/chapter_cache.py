@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from bs4 import Tag
+
+from .http_cache import atomic_write
+from .model import LazyHtml
+
+
+@dataclass(frozen=True)
+class ChapterArtifact:
+  """Everything the crawler derives from one page, minus the parse itself.
+
+  `html` and `tree` are both None for pages the crawler decided to skip (no
+  article content). Fresh extractions carry only the `tree`; `html` is
+  serialized from it when the artifact is stored (see `LazyHtml`).
+  """
+
+  title: str | None
+  html: str | None = LazyHtml()  # type: ignore[assignment]
+  links: tuple[str, ...] = ()
+  image_urls: tuple[str, ...] = ()
+  next_url: str | None = None
+  # Fingerprint of the article text (see `dedupe.fingerprint_text`).
+  text_hash: str | None = None
+  simhash: int | None = None
+  # The `artifact_key` of the page, when the chapter cache is on.
+  key: str | None = None
+  # Not persisted: the live article tree.
+  tree: Tag | None = field(default=None, compare=False, repr=False)
+
+
+@dataclass(frozen=True)
+class CleanedChapter:
+  """A chapter body as the EPUB2 builder finished it.
+
+  `images` holds each `(src, declared size, rewritten src)` the cleanup got
+  from the image pipeline; the body is only reused while the pipeline still
+  answers the same.
+  """
+
+  xhtml: str
+  images: tuple[tuple[str, tuple[int, int] | None, str | None], ...] = ()
+
+
+@dataclass
+class ChapterCacheStats:
+  hits: int = 0
+  misses: int = 0
+  cleaned_hits: int = 0
+  cleaned_misses: int = 0
+  _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+  def bump(self, name: str) -> None:
+    with self._lock:
+      setattr(self, name, getattr(self, name) + 1)
+
+
+def artifact_to_json(artifact: ChapterArtifact) -> str:
+  return json.dumps(
+    {
+      "title": artifact.title,
+      "html": artifact.html,
+      "links": list(artifact.links),
+      "image_urls": list(artifact.image_urls),
+      "next_url": artifact.next_url,
+      "text_hash": artifact.text_hash,
+      "simhash": artifact.simhash,
+      "key": artifact.key,
+    }
+  )
+
+
+def artifact_from_json(text: str) -> ChapterArtifact:
+  data: dict[str, Any] = json.loads(text)
+  return ChapterArtifact(
+    title=data.get("title"),
+    html=data.get("html"),
+    links=tuple(data.get("links") or ()),
+    image_urls=tuple(data.get("image_urls") or ()),
+    next_url=data.get("next_url"),
+    text_hash=data.get("text_hash"),
+    simhash=data.get("simhash"),
+    key=data.get("key"),
+  )
+
+
+def artifact_key(raw: bytes, *, pipeline_version: str, context: tuple[str, ...]) -> str:
+  """Content address for a page: raw bytes plus everything extraction depends on."""
+
+  digest = hashlib.sha256()
+  digest.update(pipeline_version.encode("utf-8"))
+  for part in context:
+    digest.update(b"\0")
+    digest.update(part.encode("utf-8"))
+  digest.update(b"\0")
+  digest.update(raw)
+  return digest.hexdigest()
+
+
+class ChapterCache:
+  def __init__(self, cache_dir: str | Path) -> None:
+    self.cache_dir = Path(cache_dir)
+    self.cache_dir.mkdir(parents=True, exist_ok=True)
+    self.stats = ChapterCacheStats()
+
+  def _path(self, key: str) -> Path:
+    return self.cache_dir / key[:2] / f"{key}.json"
+
+  def get(self, key: str) -> ChapterArtifact | None:
+    try:
+      artifact = artifact_from_json(self._path(key).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+      self.stats.bump("misses")
+      return None
+    self.stats.bump("hits")
+    return artifact
+
+  def put(self, key: str, artifact: ChapterArtifact) -> None:
+    atomic_write(self._path(key), artifact_to_json(artifact).encode("utf-8"))
+
+  def get_cleaned(self, key: str) -> CleanedChapter | None:
+    try:
+      data = json.loads(self._path(key).with_suffix(".xhtml.json").read_text(encoding="utf-8"))
+      cleaned = CleanedChapter(
+        xhtml=str(data["xhtml"]),
+        images=tuple(
+          (str(src), tuple(size) if size is not None else None, rewritten)
+          for src, size, rewritten in data["images"]
+        ),
+      )
+    except (OSError, ValueError, KeyError, TypeError):
+      self.stats.bump("cleaned_misses")
+      return None
+    self.stats.bump("cleaned_hits")
+    return cleaned
+
+  def put_cleaned(self, key: str, cleaned: CleanedChapter) -> None:
+    data = {"xhtml": cleaned.xhtml, "images": [list(image) for image in cleaned.images]}
+    atomic_write(self._path(key).with_suffix(".xhtml.json"), json.dumps(data).encode("utf-8"))
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import json
+import shutil
+from collections.abc import Iterator
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+from .http_cache import atomic_write
+from .model import Chapter
+
+
+# Bump when the layout of `state.json` or the chapter files changes.
+CHECKPOINT_VERSION = 1
+
+
+@dataclass
+class CrawlState:
+  """Where a crawl stands, as written to `state.json`.
+
+  `mode` is "queue" for the sidebar/sitemap crawl, where `position` is the
+  index in `queue` of the first page not yet committed, and "next" for the
+  Next-button chain, where `next_url` is the page to continue from.
+  """
+
+  start_url: str
+  discovery: str
+  url: str
+  base_url: str
+  mode: str
+  queue: list[str] = field(default_factory=list)
+  position: int = 0
+  next_url: str | None = None
+  visited: list[str] = field(default_factory=list)
+  emitted: int = 0
+  lastmods: dict[str, str] = field(default_factory=dict)
+  done: bool = False
+
+
+class CrawlCheckpoint:
+  """Persists crawl progress to `state_dir` so a failed crawl can resume.
+
+  Every committed chapter is written as it is produced; the (larger) crawl
+  state is rewritten every `every` chapters and whenever the crawl stops,
+  including on errors. Without `resume`, any previous state is discarded.
+  """
+
+  def __init__(self, state_dir: str | Path, *, resume: bool = False, every: int = 10) -> None:
+    self.state_dir = Path(state_dir)
+    self.resume = resume
+    self.every = max(1, every)
+    self._chapters_dir = self.state_dir / "chapters"
+    self._state_file = self.state_dir / "state.json"
+    self.replayed = 0
+    if not resume:
+      shutil.rmtree(self._chapters_dir, ignore_errors=True)
+      self._state_file.unlink(missing_ok=True)
+    self._chapters_dir.mkdir(parents=True, exist_ok=True)
+
+  def load(self, *, start_url: str, discovery: str) -> CrawlState | None:
+    if not self.resume:
+      return None
+    try:
+      data: dict[str, Any] = json.loads(self._state_file.read_text(encoding="utf-8"))
+    except OSError:
+      return None
+    if data.pop("version", None) != CHECKPOINT_VERSION:
+      raise ValueError(f"{self._state_file} was written by an incompatible docs2epub version")
+    state = CrawlState(**data)
+    if state.start_url != start_url or state.discovery != discovery:
+      raise ValueError(
+        f"{self.state_dir} holds a crawl of {state.start_url} (discovery={state.discovery}); "
+        "use a different --state-dir or drop --resume"
+      )
+    return state
+
+  def save(self, state: CrawlState) -> None:
+    data = {"version": CHECKPOINT_VERSION, **asdict(state)}
+    atomic_write(self._state_file, json.dumps(data).encode("utf-8"))
+
+  def record(self, chapter: Chapter, state: CrawlState) -> None:
+    data = {
+      "index": chapter.index,
+      "title": chapter.title,
+      "url": chapter.url,
+      "html": chapter.html,
+      "image_urls": list(chapter.image_urls),
+      "key": chapter.key,
+    }
+    atomic_write(self._chapter_path(chapter.index), json.dumps(data).encode("utf-8"))
+    if chapter.index % self.every == 0:
+      self.save(state)
+
+  def chapters(self, count: int) -> Iterator[Chapter]:
+    """Replay the first `count` committed chapters."""
+
+    for index in range(1, count + 1):
+      data = json.loads(self._chapter_path(index).read_text(encoding="utf-8"))
+      self.replayed += 1
+      yield Chapter(
+        index=int(data["index"]),
+        title=str(data["title"]),
+        url=str(data["url"]),
+        html=str(data["html"]),
+        image_urls=tuple(data.get("image_urls") or ()),
+        key=data.get("key"),
+      )
+
+  def _chapter_path(self, index: int) -> Path:
+    return self._chapters_dir / f"{index:05d}.json"
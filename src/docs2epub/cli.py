@@ -1,12 +1,46 @@
 from __future__ import annotations
 
 import argparse
+import contextlib
+import itertools
+import re
+import tempfile
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
+from typing import Any
 from urllib.parse import urlparse
 
-from .docusaurus_next import DocusaurusNextOptions, iter_docusaurus_next
+from .batch import BatchJob, load_manifest, run_batch, summary_table
+from .chapter_cache import ChapterCache
+from .checkpoint import CrawlCheckpoint
+from .docusaurus_next import DocusaurusNextOptions, build_rate_limiter, iter_docusaurus_next
 from .epub import EpubMetadata, build_epub
-from .pandoc_epub2 import PandocEpub2Options, build_epub2_with_pandoc
+from .http_cache import HttpCache
+from .image_probe import DEFAULT_DENY_HOSTS, ProbeOptions
+from .kindle_images import DEVICE_PROFILES, ImageOptions, ImageStats, ImageStore
+from .local_site import LocalSiteSession, site_root_url
+from .model import Chapter
+from .pandoc_epub2 import PandocEpub2Options, build_epub2_with_pandoc, shared_image_pools
+from .stats import RunStats
+from .transport import (
+  DownloadBudget,
+  DownloadLimits,
+  TransportOptions,
+  TransportStats,
+  new_session,
+)
+from .warc import WarcReplaySession, WarcWriter
+
+
+class _ChapterCounter:
+  def __init__(self) -> None:
+    self.count = 0
+
+  def wrap(self, chapters: Iterable[Chapter]) -> Iterator[Chapter]:
+    for chapter in chapters:
+      self.count += 1
+      yield chapter
 
 
 def _infer_defaults(start_url: str) -> tuple[str, str, str]:
@@ -18,6 +52,34 @@ def _infer_defaults(start_url: str) -> tuple[str, str, str]:
   return title, author, language
 
 
+def _megabytes(value: float) -> int | None:
+  return int(value * 1024 * 1024) if value > 0 else None
+
+
+_SIZE_UNITS = {
+  "": 1024 * 1024,
+  "k": 1024,
+  "kb": 1024,
+  "m": 1024 * 1024,
+  "mb": 1024 * 1024,
+  "g": 1024**3,
+  "gb": 1024**3,
+}
+
+
+def _size(value: str) -> int:
+  """`45MB`, `45M` or `45` (MB), `800KB`, `1.5GB` -> bytes."""
+
+  match = re.fullmatch(r"\s*([\d.]+)\s*([a-zA-Z]*)\s*", value)
+  unit = match.group(2).lower() if match else ""
+  if match is None or unit not in _SIZE_UNITS:
+    raise argparse.ArgumentTypeError(f"invalid size: {value!r} (use e.g. 45MB)")
+  try:
+    return int(float(match.group(1)) * _SIZE_UNITS[unit])
+  except ValueError as exc:
+    raise argparse.ArgumentTypeError(f"invalid size: {value!r} (use e.g. 45MB)") from exc
+
+
 def _build_parser() -> argparse.ArgumentParser:
   p = argparse.ArgumentParser(
     prog="docs2epub",
@@ -57,7 +119,190 @@ def _build_parser() -> argparse.ArgumentParser:
     help="Base URL used to resolve relative links (defaults to start-url).",
   )
   p.add_argument("--max-pages", type=int, default=None)
-  p.add_argument("--sleep-s", type=float, default=0.5)
+  p.add_argument(
+    "--discovery",
+    default="auto",
+    choices=["auto", "sitemap"],
+    help=(
+      "How pages are found. auto: sidebar links, else the Next-button chain. "
+      "sitemap: all in-scope pages from sitemap.xml, ordered by the sidebar when present."
+    ),
+  )
+  p.add_argument(
+    "--sleep-s",
+    type=float,
+    default=0.5,
+    help=(
+      "Initial delay between requests to the same host; the rate then adapts "
+      "to the host's latency and 429/503 responses. 0 disables the delay. Default: 0.5."
+    ),
+  )
+  p.add_argument(
+    "--max-rate",
+    type=float,
+    default=8.0,
+    help="Upper bound on requests per second to a single host. Default: 8.",
+  )
+  p.set_defaults(respect_robots=True)
+  p.add_argument(
+    "--ignore-robots",
+    dest="respect_robots",
+    action="store_false",
+    help="Do not read Crawl-delay from robots.txt.",
+  )
+  p.add_argument(
+    "--concurrency",
+    type=int,
+    default=4,
+    help="Number of pages fetched in parallel during the sidebar crawl. Default: 4.",
+  )
+  p.add_argument(
+    "--processes",
+    type=int,
+    default=1,
+    help=(
+      "Extract pages in this many worker processes sharing a local SQLite frontier "
+      "(sidebar and sitemap crawls). Helps when parsing, not the network, is the "
+      "bottleneck. Each process gets an equal share of the per-host rate limit "
+      "(start rate, --max-rate and Crawl-delay); 429 backoff is per process. Default: 1."
+    ),
+  )
+
+  p.add_argument(
+    "--http-retries",
+    type=int,
+    default=3,
+    help=(
+      "Retries, with exponential backoff, for connection errors and 500/502/504 "
+      "responses (429/503 are handled by the rate limiter). Default: 3."
+    ),
+  )
+
+  p.add_argument(
+    "--max-page-mb",
+    type=float,
+    default=50,
+    help="Skip pages (and sitemaps) larger than this many MB. 0 disables the cap. Default: 50.",
+  )
+  p.add_argument(
+    "--max-image-mb",
+    type=float,
+    default=16,
+    help="Skip images larger than this many MB. 0 disables the cap. Default: 16.",
+  )
+  p.add_argument(
+    "--max-download-mb",
+    type=float,
+    default=0,
+    help=(
+      "Stop downloading once this many MB of pages and images were fetched in total; "
+      "later resources are skipped. 0 (default) means no budget."
+    ),
+  )
+
+  p.set_defaults(dedupe=True)
+  p.add_argument(
+    "--keep-duplicates",
+    dest="dedupe",
+    action="store_false",
+    help="Keep pages whose text repeats an earlier page (they are skipped by default).",
+  )
+
+  p.add_argument(
+    "--source",
+    type=Path,
+    default=None,
+    help=(
+      "Build from a static site export on disk (a directory such as build/ or "
+      "_build/html, or a .zip of one) instead of fetching over HTTP. START_URL "
+      "still names the first page; its origin is mapped to the export's root."
+    ),
+  )
+  p.add_argument(
+    "--source-url",
+    default=None,
+    help=(
+      "URL the root of --source is served at, when the site lives under a path "
+      "(e.g. https://example.com/project/). Default: START_URL's origin."
+    ),
+  )
+
+  p.add_argument(
+    "--record-warc",
+    type=Path,
+    default=None,
+    help=(
+      "Record every HTTP response (pages and images) into this WARC file "
+      "(.warc or .warc.gz) for later --replay-warc runs."
+    ),
+  )
+  p.add_argument(
+    "--replay-warc",
+    type=Path,
+    default=None,
+    help="Serve every request from this WARC file instead of the network.",
+  )
+
+  p.add_argument(
+    "--cache-dir",
+    type=Path,
+    default=None,
+    help=(
+      "Directory for persistent caches: HTTP responses (pages and images, revalidated "
+      "on each run) and processed chapters keyed by page content."
+    ),
+  )
+  p.add_argument(
+    "--cache-only",
+    action="store_true",
+    help="Offline mode: serve everything from --cache-dir and never touch the network.",
+  )
+  p.add_argument(
+    "--cache-negative-ttl-s",
+    type=float,
+    default=24 * 3600,
+    help="How long 404/410 responses stay cached, in seconds. Default: 86400.",
+  )
+
+  p.add_argument(
+    "--state-dir",
+    type=Path,
+    default=None,
+    help=(
+      "Directory where crawl progress (queue, visited pages, extracted chapters) is "
+      "checkpointed, so an interrupted crawl can be resumed with --resume."
+    ),
+  )
+  p.add_argument(
+    "--resume",
+    action="store_true",
+    help="Continue the crawl checkpointed in --state-dir instead of starting over.",
+  )
+
+  p.add_argument(
+    "--batch",
+    type=Path,
+    default=None,
+    help=(
+      "Build every book listed in this manifest in one process: a .toml file with "
+      "[[book]] entries (url, out, title, author, language), or any text file of "
+      "URLs such as ROADMAP.md. Books share the HTTP session, caches and per-host "
+      "rate limits; --concurrency, --image-workers and --image-processes are totals "
+      "across books."
+    ),
+  )
+  p.add_argument(
+    "--batch-jobs",
+    type=int,
+    default=3,
+    help="Books built at the same time in --batch mode. Default: 3.",
+  )
+  p.add_argument(
+    "--out-dir",
+    type=Path,
+    default=Path("."),
+    help="Where --batch writes books whose manifest entry has no output path. Default: .",
+  )
 
   p.add_argument("--title", default=None)
   p.add_argument("--author", default=None)
@@ -85,6 +330,85 @@ def _build_parser() -> argparse.ArgumentParser:
     action="store_false",
     help="Drop images for a smaller/faster output.",
   )
+  p.add_argument(
+    "--device",
+    choices=sorted(DEVICE_PROFILES),
+    default=None,
+    help="Shrink images to fit this Kindle's screen (epub2). Default: keep full resolution.",
+  )
+  p.add_argument(
+    "--jpeg-quality",
+    type=int,
+    default=85,
+    help="JPEG quality (1-95) for photos (epub2). Default: 85.",
+  )
+  p.add_argument(
+    "--grayscale",
+    action="store_true",
+    help="Convert images to grayscale (epub2); smaller files, no loss on e-ink screens.",
+  )
+  p.add_argument(
+    "--min-image-pixels",
+    type=int,
+    default=ProbeOptions.min_pixels,
+    help=(
+      "Skip images smaller than this many pixels (width x height), judged from width/height "
+      "attributes before downloading (epub2), e.g. 256 for 16x16. Default: 0 (keep all)."
+    ),
+  )
+  p.add_argument(
+    "--min-image-kb",
+    type=float,
+    default=0,
+    help="Skip images smaller than this many KB (epub2). Default: 0 (keep all).",
+  )
+  p.add_argument(
+    "--skip-image-host",
+    action="append",
+    default=[],
+    metavar="HOST",
+    help="Never download images from HOST or its subdomains (repeatable, epub2).",
+  )
+  p.add_argument(
+    "--skip-badges",
+    action="store_true",
+    help=(
+      "Never download images from badge, CI, tracking and avatar hosts such as shields.io "
+      "and gravatar.com (epub2)."
+    ),
+  )
+  p.add_argument(
+    "--probe-images",
+    action="store_true",
+    help=(
+      "Before downloading an image without width/height attributes, fetch its first bytes "
+      "with a Range request to check its size (epub2)."
+    ),
+  )
+  p.add_argument(
+    "--max-size",
+    type=_size,
+    default=None,
+    help=(
+      "Target EPUB size, e.g. 45MB (epub2). Images are re-encoded at lower resolution and "
+      "quality, largest first, until the book fits."
+    ),
+  )
+  p.add_argument(
+    "--image-workers",
+    type=int,
+    default=8,
+    help="Images downloaded in parallel (epub2). 0 downloads them one at a time. Default: 8.",
+  )
+  p.add_argument(
+    "--image-processes",
+    type=int,
+    default=None,
+    help=(
+      "Worker processes for image conversion (epub2). 0 converts on the download threads. "
+      "Default: CPU count, up to 4."
+    ),
+  )
 
   p.add_argument(
     "-v",
@@ -96,62 +420,341 @@ def _build_parser() -> argparse.ArgumentParser:
   return p
 
 
-def main(argv: list[str] | None = None) -> int:
-  args = _build_parser().parse_args(argv)
-
-  start_url = args.start_url or args.start_url_pos
-  out_value = args.out or args.out_pos
+def _check_args(args: argparse.Namespace) -> None:
+  if args.cache_only and args.cache_dir is None:
+    raise SystemExit("--cache-only requires --cache-dir")
+  if args.resume and args.state_dir is None:
+    raise SystemExit("--resume requires --state-dir")
+  if args.processes > 1 and args.state_dir is not None:
+    raise SystemExit("--processes cannot be combined with --state-dir")
+  if args.source_url and args.source is None:
+    raise SystemExit("--source-url requires --source")
+  if args.source is not None and not args.source.exists():
+    raise SystemExit(f"--source {args.source} does not exist")
+  if args.replay_warc is not None and not args.replay_warc.is_file():
+    raise SystemExit(f"--replay-warc {args.replay_warc} does not exist")
+  if sum(value is not None for value in (args.source, args.replay_warc, args.record_warc)) > 1:
+    raise SystemExit("--source, --replay-warc and --record-warc are mutually exclusive")
+  if args.record_warc is not None and args.processes > 1:
+    raise SystemExit("--record-warc cannot be combined with --processes")
+  if not 1 <= args.jpeg_quality <= 95:
+    raise SystemExit("--jpeg-quality must be between 1 and 95")
+  if args.max_size is not None and (args.format != "epub2" or not args.keep_images):
+    raise SystemExit("--max-size requires --format epub2 with images")
 
-  if not start_url or not out_value:
-    raise SystemExit("Usage: docs2epub <START_URL> <OUT.epub> [options]")
 
-  inferred_title, inferred_author, inferred_language = _infer_defaults(start_url)
+def _transport(args: argparse.Namespace) -> TransportOptions:
+  defaults = TransportOptions()
+  return TransportOptions(
+    # Crawl workers and image downloads share the pools.
+    pool_maxsize=max(defaults.pool_maxsize, args.concurrency),
+    retries=max(0, args.http_retries),
+  )
 
-  title = args.title or inferred_title
-  author = args.author or inferred_author
-  language = args.language or inferred_language
 
-  options = DocusaurusNextOptions(
+def _crawl_options(args: argparse.Namespace, start_url: str, *, concurrency: int) -> DocusaurusNextOptions:
+  return DocusaurusNextOptions(
     start_url=start_url,
     base_url=args.base_url,
     max_pages=args.max_pages,
     sleep_s=args.sleep_s,
+    concurrency=concurrency,
+    discovery=args.discovery,
+    max_rate=args.max_rate,
+    respect_robots=args.respect_robots,
+    processes=args.processes,
+    dedupe=args.dedupe,
+    transport=_transport(args),
+    downloads=DownloadLimits(
+      max_page_bytes=_megabytes(args.max_page_mb),
+      max_image_bytes=_megabytes(args.max_image_mb),
+      max_total_bytes=_megabytes(args.max_download_mb),
+    ),
+    source=args.source,
+    source_url=args.source_url,
+    replay=args.replay_warc,
+  )
+
+
+def _http_cache(args: argparse.Namespace) -> HttpCache | None:
+  if args.cache_dir is None or args.source is not None or args.replay_warc is not None:
+    return None
+  return HttpCache(
+    args.cache_dir / "http",
+    negative_ttl_s=args.cache_negative_ttl_s,
+    offline=args.cache_only,
   )
 
-  chapters = iter_docusaurus_next(options)
-  if not chapters:
-    raise SystemExit("No pages scraped (did not find article content).")
 
-  out_path_value = Path(out_value)
+def _image_store(args: argparse.Namespace) -> ImageStore | None:
+  if args.cache_dir is None or args.source is not None or args.replay_warc is not None:
+    return None
+  return ImageStore(args.cache_dir / "images")
+
+
+def _warc_writer(args: argparse.Namespace) -> contextlib.AbstractContextManager[WarcWriter | None]:
+  if args.record_warc is None:
+    return contextlib.nullcontext()
+  return WarcWriter(args.record_warc)
+
+
+def _pandoc_options(args: argparse.Namespace) -> PandocEpub2Options:
+  return PandocEpub2Options(
+    keep_images=args.keep_images,
+    image_workers=args.image_workers,
+    image_processes=args.image_processes,
+    images=ImageOptions(
+      max_size=DEVICE_PROFILES[args.device] if args.device else None,
+      jpeg_quality=args.jpeg_quality,
+      grayscale=args.grayscale,
+    ),
+    max_bytes=args.max_size,
+    probe=ProbeOptions(
+      min_pixels=max(0, args.min_image_pixels),
+      min_bytes=int(args.min_image_kb * 1024),
+      deny_hosts=(DEFAULT_DENY_HOSTS if args.skip_badges else ())
+      + tuple(host.lower() for host in args.skip_image_host),
+      network=args.probe_images,
+    ),
+  )
 
+
+def _write_book(
+  args: argparse.Namespace,
+  chapters: Iterable[Chapter],
+  *,
+  out: Path,
+  title: str,
+  author: str,
+  language: str,
+  http_cache: HttpCache | None,
+  session: Any,
+  budget: DownloadBudget,
+  warc: WarcWriter | None,
+  image_store: ImageStore | None,
+  image_stats: ImageStats | None,
+  image_pools: tuple[ThreadPoolExecutor | None, ProcessPoolExecutor | None] = (None, None),
+  chapter_cache: ChapterCache | None = None,
+) -> Path:
   if args.format == "epub2":
-    out_path = build_epub2_with_pandoc(
+    return build_epub2_with_pandoc(
       chapters=chapters,
-      out_file=out_path_value,
+      out_file=out,
       title=title,
       author=author,
       language=language,
       publisher=args.publisher,
       identifier=args.identifier,
       verbose=args.verbose,
-      options=PandocEpub2Options(keep_images=args.keep_images),
+      options=_pandoc_options(args),
+      http_cache=http_cache,
+      session=session,
+      budget=budget,
+      warc=warc,
+      image_store=image_store,
+      image_stats=image_stats,
+      image_pool=image_pools[0],
+      convert_pool=image_pools[1],
+      chapter_cache=chapter_cache,
     )
-  else:
-    meta = EpubMetadata(
+  meta = EpubMetadata(
+    title=title,
+    author=author,
+    language=language,
+    identifier=args.identifier,
+    publisher=args.publisher,
+  )
+  return build_epub(chapters=chapters, out_file=out, meta=meta)
+
+
+def _image_size_lines(stats: RunStats) -> list[str]:
+  if stats.images is None or not stats.images.sizes:
+    return []
+  return ["Image sizes (downloaded -> embedded, largest first):"] + [
+    f"  {url}: {before / 1024:.0f} KB -> {after / 1024:.0f} KB"
+    for url, before, after in sorted(stats.images.sizes, key=lambda item: item[2], reverse=True)
+  ]
+
+
+def main(argv: list[str] | None = None) -> int:
+  args = _build_parser().parse_args(argv)
+  _check_args(args)
+  if args.batch is not None:
+    return _main_batch(args)
+
+  start_url = args.start_url or args.start_url_pos
+  out_value = args.out or args.out_pos
+
+  if not start_url or not out_value:
+    raise SystemExit("Usage: docs2epub <START_URL> <OUT.epub> [options]")
+
+  inferred_title, inferred_author, inferred_language = _infer_defaults(start_url)
+
+  title = args.title or inferred_title
+  author = args.author or inferred_author
+  language = args.language or inferred_language
+
+  options = _crawl_options(args, start_url, concurrency=args.concurrency)
+
+  http_cache = _http_cache(args)
+  chapter_cache = ChapterCache(args.cache_dir / "chapters") if args.cache_dir is not None else None
+
+  checkpoint = None
+  if args.state_dir is not None:
+    checkpoint = CrawlCheckpoint(args.state_dir, resume=args.resume)
+
+  stats = RunStats(transport=TransportStats(), downloads=DownloadBudget(options.downloads), images=ImageStats())
+  # Closed even if the crawl fails, so the records written so far are kept.
+  with _warc_writer(args) as warc:
+    if args.source is not None:
+      session = LocalSiteSession(args.source, site_url=args.source_url or site_root_url(start_url))
+    elif args.replay_warc is not None:
+      session = WarcReplaySession(args.replay_warc)
+    else:
+      session = new_session(options.transport, user_agent=options.user_agent, on_request=stats.transport.record)
+    crawl = iter_docusaurus_next(
+      options,
+      stats=stats,
+      http_cache=http_cache,
+      chapter_cache=chapter_cache,
+      checkpoint=checkpoint,
+      session=session,
+      budget=stats.downloads,
+      warc=warc,
+    )
+    # Chapters stream from the crawler straight into the builder; pull the
+    # first one up front so an empty crawl fails before any output is written.
+    first = next(crawl, None)
+    if first is None:
+      raise SystemExit("No pages scraped (did not find article content).")
+    counter = _ChapterCounter()
+    chapters = counter.wrap(itertools.chain([first], crawl))
+
+    out_path = _write_book(
+      args,
+      chapters,
+      out=Path(out_value),
       title=title,
       author=author,
       language=language,
-      identifier=args.identifier,
-      publisher=args.publisher,
+      http_cache=http_cache,
+      session=session,
+      budget=stats.downloads,
+      warc=warc,
+      image_store=_image_store(args),
+      image_stats=stats.images,
+      chapter_cache=chapter_cache,
     )
 
-    out_path = build_epub(
-      chapters=chapters,
-      out_file=out_path_value,
-      meta=meta,
-    )
+  if http_cache is not None:
+    stats.http_cache = http_cache.stats
 
   size_mb = out_path.stat().st_size / (1024 * 1024)
-  print(f"Scraped {len(chapters)} pages")
+  print(f"Scraped {counter.count} pages")
+  if checkpoint is not None and checkpoint.replayed:
+    print(f"Resumed: {checkpoint.replayed} pages restored from {args.state_dir}")
+  if warc is not None:
+    print(f"WARC: recorded {warc.records} responses to {warc.path}")
+  if isinstance(session, WarcReplaySession) and session.misses:
+    print(f"WARC replay: {session.misses} requests not in {args.replay_warc}")
+  if args.verbose:
+    for line in _image_size_lines(stats):
+      print(line)
+  for line in stats.summary_lines():
+    print(line)
   print(f"EPUB written to: {out_path.resolve()} ({size_mb:.2f} MB)")
   return 0
+
+
+def _main_batch(args: argparse.Namespace) -> int:
+  if args.start_url or args.start_url_pos or args.out or args.out_pos:
+    raise SystemExit("--batch takes the books from the manifest; drop START_URL/OUT")
+  if args.state_dir is not None or args.source is not None or args.processes > 1:
+    raise SystemExit("--batch cannot be combined with --state-dir, --source or --processes")
+  try:
+    jobs = load_manifest(args.batch, out_dir=args.out_dir)
+  except (OSError, ValueError) as exc:
+    raise SystemExit(f"--batch: {exc}") from exc
+  if not jobs:
+    raise SystemExit(f"--batch: no books in {args.batch}")
+
+  max_jobs = max(1, min(args.batch_jobs, len(jobs)))
+  # --concurrency is a budget for the whole batch, split between the books.
+  concurrency = max(1, args.concurrency // max_jobs)
+  probe = _crawl_options(args, jobs[0].start_url, concurrency=concurrency)
+
+  stats = RunStats(transport=TransportStats(), downloads=DownloadBudget(probe.downloads), images=ImageStats())
+  if args.replay_warc is not None:
+    session: Any = WarcReplaySession(args.replay_warc)
+  else:
+    session = new_session(probe.transport, user_agent=probe.user_agent, on_request=stats.transport.record)
+  # One limiter for every book, so two books on the same host share its budget.
+  limiter = build_rate_limiter(probe, session)
+
+  with _warc_writer(args) as warc, tempfile.TemporaryDirectory(prefix="docs2epub-batch-") as tmp:
+    # Without --cache-dir, a throwaway cache still lets books share assets.
+    http_cache = _http_cache(args)
+    if http_cache is None and args.replay_warc is None:
+      http_cache = HttpCache(Path(tmp) / "http", negative_ttl_s=args.cache_negative_ttl_s)
+    chapter_cache = ChapterCache(args.cache_dir / "chapters") if args.cache_dir is not None else None
+    # Likewise for converted images, so each is fetched and converted once.
+    image_store = _image_store(args) or ImageStore(Path(tmp) / "images")
+    # Like --concurrency, --image-workers and --image-processes bound the whole batch.
+    image_pools = shared_image_pools(_pandoc_options(args)) if args.format == "epub2" else (None, None)
+
+    def build(job: BatchJob) -> tuple[int, Path]:
+      inferred_title, inferred_author, inferred_language = _infer_defaults(job.start_url)
+      crawl = iter_docusaurus_next(
+        _crawl_options(args, job.start_url, concurrency=concurrency),
+        stats=stats,
+        http_cache=http_cache,
+        chapter_cache=chapter_cache,
+        session=session,
+        budget=stats.downloads,
+        warc=warc,
+        limiter=limiter,
+      )
+      first = next(crawl, None)
+      if first is None:
+        raise RuntimeError("no pages scraped (did not find article content)")
+      counter = _ChapterCounter()
+      out_path = _write_book(
+        args,
+        counter.wrap(itertools.chain([first], crawl)),
+        out=job.out,
+        title=job.title or args.title or inferred_title,
+        author=job.author or args.author or inferred_author,
+        language=job.language or args.language or inferred_language,
+        http_cache=http_cache,
+        session=session,
+        budget=stats.downloads,
+        warc=warc,
+        image_store=image_store,
+        image_stats=stats.images,
+        image_pools=image_pools,
+        chapter_cache=chapter_cache,
+      )
+      return counter.count, out_path
+
+    try:
+      results = run_batch(jobs, build, max_jobs=max_jobs)
+    finally:
+      for pool in image_pools:
+        if pool is not None:
+          pool.shutdown(wait=True)
+    stats.host_rates = limiter.summaries()
+    if args.cache_dir is not None and http_cache is not None:
+      stats.http_cache = http_cache.stats
+
+  if warc is not None:
+    print(f"WARC: recorded {warc.records} responses to {warc.path}")
+  for line in summary_table(results):
+    print(line)
+  if args.verbose:
+    for line in _image_size_lines(stats):
+      print(line)
+  for line in stats.summary_lines():
+    print(line)
+  failed = sum(result.error is not None for result in results)
+  print(f"Built {len(results) - failed} of {len(results)} books")
+  return 1 if failed else 0
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+
+from .chapter_cache import ChapterArtifact, artifact_from_json, artifact_to_json
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+  seq INTEGER PRIMARY KEY AUTOINCREMENT,
+  key TEXT NOT NULL UNIQUE,
+  url TEXT NOT NULL,
+  state TEXT NOT NULL DEFAULT 'pending',
+  released INTEGER NOT NULL DEFAULT 0,
+  worker INTEGER,
+  artifact TEXT,
+  error TEXT
+);
+CREATE INDEX IF NOT EXISTS pages_state ON pages (state, seq);
+CREATE TABLE IF NOT EXISTS meta (
+  name TEXT PRIMARY KEY,
+  value TEXT NOT NULL
+);
+"""
+
+
+@dataclass(frozen=True)
+class PageResult:
+  state: str
+  artifact: ChapterArtifact | None = None
+  error: str | None = None
+
+
+class CrawlStore:
+  """SQLite-backed frontier shared by crawl worker processes.
+
+  Pages are keyed by canonical URL and claimed in insertion order. A worker
+  that finishes a page stores its artifact and queues its links in the same
+  transaction, so the store never holds a finished page whose links are
+  missing. Once `gate`d, only pages the parent has `release`d are claimed.
+  Each process must open its own `CrawlStore`.
+  """
+
+  def __init__(self, path: str | Path) -> None:
+    self.path = Path(path)
+    self._db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+    self._db.execute("PRAGMA journal_mode=WAL")
+    self._db.execute("PRAGMA synchronous=NORMAL")
+    self._db.executescript(_SCHEMA)
+
+  def close(self) -> None:
+    self._db.close()
+
+  def add(self, pages: Iterable[tuple[str, str]]) -> None:
+    """Queue `(key, url)` pairs; keys already in the store are ignored."""
+
+    with self._db:
+      self._db.executemany("INSERT OR IGNORE INTO pages (key, url) VALUES (?, ?)", pages)
+
+  def claim(self, worker: int) -> tuple[str, str] | None:
+    row = self._db.execute(
+      "UPDATE pages SET state = 'claimed', worker = ? "
+      "WHERE seq = (SELECT seq FROM pages WHERE state = 'pending' "
+      "AND (released OR NOT EXISTS (SELECT 1 FROM meta WHERE name = 'gated')) ORDER BY seq LIMIT 1) "
+      "RETURNING key, url",
+      (worker,),
+    ).fetchone()
+    return (row[0], row[1]) if row else None
+
+  def gate(self) -> None:
+    with self._db:
+      self._db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('gated', '1')")
+
+  def release(self, keys: Iterable[str]) -> None:
+    with self._db:
+      self._db.executemany("UPDATE pages SET released = 1 WHERE key = ?", ((key,) for key in keys))
+
+  def complete(self, key: str, artifact: ChapterArtifact | None, *, worker: int | None = None) -> None:
+    """Store a finished page (None: skipped) and queue its links."""
+
+    with self._db:
+      self._db.execute(
+        "UPDATE pages SET state = 'done', worker = COALESCE(?, worker), artifact = ? WHERE key = ?",
+        (worker, artifact_to_json(artifact) if artifact is not None else None, key),
+      )
+      if artifact is not None:
+        self._db.executemany(
+          "INSERT OR IGNORE INTO pages (key, url) VALUES (?, ?)",
+          ((link, link) for link in artifact.links),
+        )
+
+  def fail(self, key: str, error: str) -> None:
+    with self._db:
+      self._db.execute("UPDATE pages SET state = 'failed', error = ? WHERE key = ?", (error, key))
+
+  def result(self, key: str) -> PageResult | None:
+    row = self._db.execute("SELECT state, artifact, error FROM pages WHERE key = ?", (key,)).fetchone()
+    if row is None:
+      return None
+    state, artifact, error = row
+    return PageResult(
+      state=state,
+      artifact=artifact_from_json(artifact) if artifact is not None else None,
+      error=error,
+    )
+
+  def stop(self) -> None:
+    with self._db:
+      self._db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('stopped', '1')")
+
+  def finished(self) -> bool:
+    """True once workers should exit: stopped, or nothing pending or in flight."""
+
+    if self._db.execute("SELECT 1 FROM meta WHERE name = 'stopped'").fetchone():
+      return True
+    busy = self._db.execute("SELECT 1 FROM pages WHERE state IN ('pending', 'claimed') LIMIT 1")
+    return busy.fetchone() is None
+
+  def save_worker_stats(self, worker: int, stats: dict[str, object]) -> None:
+    with self._db:
+      self._db.execute(
+        "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (f"stats:{worker}", json.dumps(stats))
+      )
+
+  def worker_stats(self) -> list[dict[str, object]]:
+    rows = self._db.execute("SELECT value FROM meta WHERE name LIKE 'stats:%' ORDER BY name")
+    return [json.loads(value) for (value,) in rows]
+
+  def pages_per_worker(self) -> dict[int, int]:
+    rows = self._db.execute(
+      "SELECT worker, COUNT(*) FROM pages WHERE state = 'done' AND worker IS NOT NULL GROUP BY worker"
+    )
+    return {int(worker): int(count) for worker, count in rows}
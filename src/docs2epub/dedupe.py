@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import hashlib
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+
+
+_WORD_RE = re.compile(r"\w+")
+_SHINGLE_WORDS = 3
+# SimHash is noisy on short texts (stub pages, "Overview" indexes); below this
+# many words only exact matches count.
+_MIN_SIMHASH_WORDS = 24
+_BITS = 64
+_BAND_BITS = 16
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+  digest: str | None
+  simhash: int | None = None
+
+
+def simhash(words: list[str]) -> int:
+  """64-bit SimHash over word 3-shingles."""
+
+  shingles = Counter(" ".join(words[i : i + _SHINGLE_WORDS]) for i in range(len(words) - _SHINGLE_WORDS + 1))
+  weights = [0] * _BITS
+  for shingle, count in shingles.items():
+    value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+    for bit in range(_BITS):
+      weights[bit] += count if value >> bit & 1 else -count
+  return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def fingerprint_text(text: str) -> Fingerprint:
+  words = _WORD_RE.findall(text.lower())
+  if not words:
+    return Fingerprint(digest=None)
+  digest = hashlib.sha256(" ".join(words).encode("utf-8")).hexdigest()
+  return Fingerprint(
+    digest=digest,
+    simhash=simhash(words) if len(words) >= _MIN_SIMHASH_WORDS else None,
+  )
+
+
+@dataclass
+class DuplicateDetector:
+  """Flags chapters whose text repeats an earlier one, exactly or nearly.
+
+  Near duplicates are SimHashes within `max_distance` bits. Hashes are
+  indexed by 16-bit bands: two hashes at most 3 bits apart share at least
+  one of their four bands, so only hashes in a matching band are compared.
+  """
+
+  max_distance: int = 3
+  _exact: dict[str, str] = field(default_factory=dict, init=False, repr=False)
+  _bands: dict[tuple[int, int], list[tuple[int, str]]] = field(default_factory=dict, init=False, repr=False)
+
+  def check(self, url: str, fingerprint: Fingerprint) -> str | None:
+    """Return the URL `url` duplicates, or remember it and return None."""
+
+    if fingerprint.digest is None:
+      return None
+    kept = self._exact.get(fingerprint.digest)
+    if kept is not None:
+      return kept
+
+    value = fingerprint.simhash
+    if value is not None:
+      for band in self._band_keys(value):
+        for other, other_url in self._bands.get(band, ()):
+          if (other ^ value).bit_count() <= self.max_distance:
+            return other_url
+
+    self._exact[fingerprint.digest] = url
+    if value is not None:
+      for band in self._band_keys(value):
+        self._bands.setdefault(band, []).append((value, url))
+    return None
+
+  @staticmethod
+  def _band_keys(value: int) -> list[tuple[int, int]]:
+    mask = (1 << _BAND_BITS) - 1
+    return [(i, value >> (i * _BAND_BITS) & mask) for i in range(_BITS // _BAND_BITS)]
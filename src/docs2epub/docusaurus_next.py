@@ -1,59 +1,72 @@
 from __future__ import annotations
 
+import codecs
+import html
+import multiprocessing
+import multiprocessing.context
 import re
+import tempfile
+import threading
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
 from urllib.parse import urljoin, urlparse
 
 import requests
-from bs4 import BeautifulSoup, Tag
-
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+from bs4.dammit import EncodingDetector
+
+from .chapter_cache import ChapterArtifact, ChapterCache, artifact_key
+from .checkpoint import CrawlCheckpoint, CrawlState
+from .crawl_store import CrawlStore, PageResult
+from .dedupe import DuplicateDetector, Fingerprint, fingerprint_text
+from .frontier import UrlFrontier, canonicalize_url
+from .http_cache import CacheMiss, CachingSession, HttpCache
+from .local_site import LocalSiteSession, site_root_url
 from .model import Chapter
+from .ratelimit import HostRateLimiter, parse_crawl_delay, parse_retry_after
+from .sitemap import SitemapEntry, discover_sitemap_entries, sitemap_candidates
+from .stats import PageParseStats, PrefetchStats, RunStats
+from .transport import (
+  DownloadBudget,
+  DownloadLimits,
+  LimitedSession,
+  ResourceTooLarge,
+  TransportOptions,
+  new_session,
+)
+from .warc import RecordingSession, WarcReplaySession, WarcWriter
 
 
 DEFAULT_USER_AGENT = "docs2epub/0.1 (+https://github.com/brenorb/docs2epub)"
 
-_SIDEBAR_SELECTORS = [
-  'aside[data-testid="table-of-contents"]',
-  "aside#table-of-contents",
-  'nav[aria-label="Table of contents"]',
-  'nav[aria-label="Table of Contents"]',
-  'nav[aria-label="Docs sidebar"]',
-  'nav[aria-label="Docs navigation"]',
-  'nav[aria-label="Documentation"]',
-  'nav[aria-label="Docs"]',
-  "aside.theme-doc-sidebar-container",
-  "div.theme-doc-sidebar-container",
-  "nav.theme-doc-sidebar-menu",
-  "nav.menu",
-  'nav[class*="menu"]',
-  'aside[class*="sidebar"]',
-  'nav[class*="sidebar"]',
+# Sidebar container rules, in priority order. Each is (tag, attribute, match,
+# value) and mirrors a CSS selector:
+#   "eq"       -> tag[attr="value"] (or tag#value for id)
+#   "class"    -> tag.value
+#   "contains" -> tag[class*="value"]
+_SIDEBAR_RULES: list[tuple[str, str, str, str]] = [
+  ("aside", "data-testid", "eq", "table-of-contents"),
+  ("aside", "id", "eq", "table-of-contents"),
+  ("nav", "aria-label", "eq", "Table of contents"),
+  ("nav", "aria-label", "eq", "Table of Contents"),
+  ("nav", "aria-label", "eq", "Docs sidebar"),
+  ("nav", "aria-label", "eq", "Docs navigation"),
+  ("nav", "aria-label", "eq", "Documentation"),
+  ("nav", "aria-label", "eq", "Docs"),
+  ("aside", "class", "class", "theme-doc-sidebar-container"),
+  ("div", "class", "class", "theme-doc-sidebar-container"),
+  ("nav", "class", "class", "theme-doc-sidebar-menu"),
+  ("nav", "class", "class", "menu"),
+  ("nav", "class", "contains", "menu"),
+  ("aside", "class", "contains", "sidebar"),
+  ("nav", "class", "contains", "sidebar"),
 ]
 
-_NON_DOC_EXTENSIONS = {
-  ".png",
-  ".jpg",
-  ".jpeg",
-  ".gif",
-  ".svg",
-  ".webp",
-  ".css",
-  ".js",
-  ".map",
-  ".json",
-  ".xml",
-  ".rss",
-  ".pdf",
-  ".zip",
-  ".tar",
-  ".gz",
-  ".tgz",
-  ".epub",
-  ".mp4",
-  ".mp3",
-  ".wav",
-}
-
+_SIDEBAR_KEYWORDS = ["sidebar", "toc", "table of contents", "table-of-contents", "docs", "documentation"]
 
 @dataclass(frozen=True)
 class DocusaurusNextOptions:
@@ -62,6 +75,35 @@ class DocusaurusNextOptions:
   max_pages: int | None = None
   sleep_s: float = 0.5
   user_agent: str = DEFAULT_USER_AGENT
+  concurrency: int = 4
+  # "auto": sidebar links, else the Next-button chain.
+  # "sitemap": every in-scope page from sitemap.xml, in sidebar order when
+  # a sidebar exists.
+  discovery: str = "auto"
+  max_rate: float | None = 8.0
+  respect_robots: bool = True
+  max_retries: int = 3
+  # >1: sidebar/sitemap crawls run in this many worker processes sharing a
+  # SQLite frontier (see `_crawl_processes`).
+  processes: int = 1
+  # Drop chapters whose text repeats an earlier chapter (exactly or nearly).
+  dedupe: bool = True
+  # Connection pools and transport-level retries (connection errors, 5xx).
+  transport: TransportOptions = TransportOptions()
+  # Byte caps on page bodies and on the run as a whole.
+  downloads: DownloadLimits = DownloadLimits()
+  # Read pages from a built static site (directory or .zip) instead of HTTP.
+  # `source_url` is the URL the export's root is served at (default: the
+  # start URL's origin).
+  source: Path | None = None
+  source_url: str | None = None
+  # Serve every request from this WARC file instead of the network.
+  replay: Path | None = None
+
+
+# Bump whenever extraction output changes so cached chapter artifacts are
+# not reused across incompatible versions.
+CHAPTER_PIPELINE_VERSION = "3"
 
 
 def _slugify_filename(text: str) -> str:
@@ -125,89 +167,82 @@ def _extract_canonical_url(soup: BeautifulSoup, *, base_url: str) -> str | None:
   return None
 
 
-def _canonicalize_url(url: str) -> str:
-  parsed = urlparse(url)
-  path = parsed.path or "/"
-  if path != "/" and path.endswith("/"):
-    path = path.rstrip("/")
-  return parsed._replace(
-    scheme=parsed.scheme.lower(),
-    netloc=parsed.netloc.lower(),
-    path=path,
-    query="",
-    fragment="",
-  ).geturl()
+@dataclass
+class _SidebarCandidate:
+  element: Tag
+  rank: int
+  order: int
+  anchors: list[Tag]
 
 
-def _infer_root_path(start_url: str) -> str:
-  parsed = urlparse(start_url)
-  path = (parsed.path or "").rstrip("/")
-  if not path:
-    return ""
-  parts = path.split("/")
-  if len(parts) <= 2:
-    return path
-  return "/".join(parts[:-1])
+def _sidebar_rank(el: Tag) -> int | None:
+  """Priority of `el` as a sidebar container, or None if it is not one.
 
+  Lower is better: rule matches rank by rule index, keyword matches after all
+  rules.
+  """
 
-def _path_within_root(path: str, root_path: str) -> bool:
-  if not root_path or root_path == "/":
-    return True
-  if path == root_path:
-    return True
-  root = root_path if root_path.endswith("/") else f"{root_path}/"
-  return path.startswith(root)
-
+  classes = el.get("class") or []
+  for idx, (name, attr, match, value) in enumerate(_SIDEBAR_RULES):
+    if el.name != name:
+      continue
+    if match == "class":
+      if value in classes:
+        return idx
+    elif match == "contains":
+      if value in " ".join(classes):
+        return idx
+    elif el.get(attr) == value:
+      return idx
+
+  haystack = " ".join(
+    [
+      str(el.get("aria-label") or ""),
+      str(el.get("id") or ""),
+      str(el.get("data-testid") or ""),
+      " ".join(classes),
+    ]
+  ).lower()
+  if any(k in haystack for k in _SIDEBAR_KEYWORDS):
+    return len(_SIDEBAR_RULES)
+  return None
 
-def _is_probable_doc_link(url: str) -> bool:
-  parsed = urlparse(url)
-  path = (parsed.path or "").lower()
-  for ext in _NON_DOC_EXTENSIONS:
-    if path.endswith(ext):
-      return False
-  return True
 
+def _sidebar_candidates(soup: BeautifulSoup) -> list[_SidebarCandidate]:
+  """Find sidebar containers and their links in a single walk of the tree.
 
-def _sidebar_candidates(soup: BeautifulSoup) -> list[Tag]:
-  seen: set[int] = set()
-  candidates: list[Tag] = []
+  Containers are scored as they are reached; each link is attached to every
+  candidate among its ancestors, so nested candidates share one pass instead
+  of each re-scanning its subtree.
+  """
 
-  for selector in _SIDEBAR_SELECTORS:
-    for el in soup.select(selector):
-      key = id(el)
-      if key in seen:
+  by_id: dict[int, _SidebarCandidate] = {}
+  order = 0
+  for el in soup.find_all(["nav", "aside", "div", "a"]):
+    if el.name == "a":
+      if not el.has_attr("href") or not by_id:
         continue
-      seen.add(key)
-      candidates.append(el)
-
-  keywords = ["sidebar", "toc", "table of contents", "table-of-contents", "docs", "documentation"]
-  for el in soup.find_all(["nav", "aside", "div"]):
-    key = id(el)
-    if key in seen:
+      for parent in el.parents:
+        candidate = by_id.get(id(parent))
+        if candidate is not None:
+          candidate.anchors.append(el)
       continue
-    label = str(el.get("aria-label") or "").lower()
-    elem_id = str(el.get("id") or "").lower()
-    data_testid = str(el.get("data-testid") or "").lower()
-    classes = " ".join(el.get("class", [])).lower()
-    haystack = " ".join([label, elem_id, data_testid, classes])
-    if any(k in haystack for k in keywords):
-      seen.add(key)
-      candidates.append(el)
+    rank = _sidebar_rank(el)
+    if rank is None:
+      continue
+    by_id[id(el)] = _SidebarCandidate(element=el, rank=rank, order=order, anchors=[])
+    order += 1
 
-  return candidates
+  return sorted(by_id.values(), key=lambda c: (c.rank, c.order))
 
 
-def _looks_like_pager(container: Tag, links: list[Tag]) -> bool:
+def _looks_like_pager(container: Tag, link_texts: list[str]) -> bool:
   label = str(container.get("aria-label") or "").lower()
   if "docs pages" in label or "breadcrumb" in label:
     return True
-  if not links:
+  if not link_texts:
     return True
-  texts = []
-  for a in links:
-    text = " ".join(a.get_text(" ", strip=True).split()).lower()
-    if text:
-      texts.append(text)
+  texts = [text for text in link_texts if text]
   if not texts:
     return False
   pager_words = {"next", "previous", "prev", "back"}
@@ -218,40 +253,34 @@ def _extract_sidebar_urls(
   soup: BeautifulSoup,
   *,
   base_url: str,
-  start_url: str,
+  frontier: UrlFrontier,
 ) -> list[str]:
   candidates = _sidebar_candidates(soup)
   if not candidates:
     return []
 
-  origin = urlparse(start_url).netloc.lower()
-  root_path = _infer_root_path(start_url)
+  # Overlapping candidates share anchors; read each link text only once.
+  texts: dict[int, str] = {}
+
+  def link_text(a: Tag) -> str:
+    key = id(a)
+    if key not in texts:
+      texts[key] = " ".join(a.get_text(" ", strip=True).split()).lower()
+    return texts[key]
+
   best: list[str] = []
-  for container in candidates:
-    anchors = list(container.find_all("a", href=True))
-    if _looks_like_pager(container, anchors):
+  for candidate in candidates:
+    # A candidate can never yield more URLs than it has links.
+    if len(candidate.anchors) <= len(best):
+      continue
+    if _looks_like_pager(candidate.element, [link_text(a) for a in candidate.anchors]):
       continue
 
     urls: list[str] = []
     seen: set[str] = set()
-    for a in anchors:
-      href = str(a.get("href") or "").strip()
-      if not href or href.startswith("#"):
-        continue
-      if href.startswith(("mailto:", "tel:", "javascript:")):
-        continue
-      abs_url = urljoin(base_url, href)
-      parsed = urlparse(abs_url)
-      if parsed.scheme not in ("http", "https"):
-        continue
-      if origin and parsed.netloc.lower() != origin:
-        continue
-      if not _is_probable_doc_link(abs_url):
-        continue
-      if not _path_within_root(parsed.path or "", root_path):
-        continue
-      canonical = _canonicalize_url(abs_url)
-      if canonical in seen:
+    for a in candidate.anchors:
+      canonical = frontier.resolve(str(a.get("href") or "").strip(), base_url)
+      if canonical is None or canonical in seen:
         continue
       seen.add(canonical)
       urls.append(canonical)
@@ -266,31 +295,14 @@ def _extract_content_urls(
   container: Tag,
   *,
   base_url: str,
-  start_url: str,
+  frontier: UrlFrontier,
 ) -> list[str]:
-  origin = urlparse(start_url).netloc.lower()
-  root_path = _infer_root_path(start_url)
   urls: list[str] = []
   seen: set[str] = set()
 
   for a in container.find_all("a", href=True):
-    href = str(a.get("href") or "").strip()
-    if not href or href.startswith("#"):
-      continue
-    if href.startswith(("mailto:", "tel:", "javascript:")):
-      continue
-    abs_url = urljoin(base_url, href)
-    parsed = urlparse(abs_url)
-    if parsed.scheme not in ("http", "https"):
-      continue
-    if origin and parsed.netloc.lower() != origin:
-      continue
-    if not _is_probable_doc_link(abs_url):
-      continue
-    if not _path_within_root(parsed.path or "", root_path):
-      continue
-    canonical = _canonicalize_url(abs_url)
-    if canonical in seen:
+    canonical = frontier.resolve(str(a.get("href") or "").strip(), base_url)
+    if canonical is None or canonical in seen:
       continue
     seen.add(canonical)
     urls.append(canonical)
@@ -298,11 +310,31 @@ def _extract_content_urls(
   return urls
 
 
+def _filter_sitemap_entries(
+  entries: list[SitemapEntry],
+  *,
+  frontier: UrlFrontier,
+) -> list[SitemapEntry]:
+  out: list[SitemapEntry] = []
+  seen: set[str] = set()
+  for entry in entries:
+    canonical = frontier.scoped_key(entry.url)
+    if canonical is None or canonical in seen:
+      continue
+    seen.add(canonical)
+    out.append(SitemapEntry(url=canonical, lastmod=entry.lastmod))
+  return out
+
+
+# The pager whose "Next" anchor the Next-button crawl follows.
+_DOCS_PAGER_LABEL = "Docs pages"
+
+
 def _remove_unwanted(article: Tag) -> None:
   for selector in [
     'nav[aria-label="Breadcrumbs"]',
     'nav[aria-label="Breadcrumb"]',
-    'nav[aria-label="Docs pages"]',
+    f'nav[aria-label="{_DOCS_PAGER_LABEL}"]',
     "div.theme-doc-footer",
     "div.theme-doc-footer-edit-meta-row",
     "div.theme-doc-version-badge",
@@ -329,141 +361,1057 @@ def _absolutize_urls(container: Tag, base_url: str) -> None:
         el["src"] = urljoin(base_url, src)
 
 
+def _is_next_label(text: str) -> bool:
+  return " ".join(text.split()).lower().startswith("next")
+
+
 def _extract_next_url(soup: BeautifulSoup, base_url: str) -> str | None:
-  nav = soup.select_one('nav[aria-label="Docs pages"]')
+  nav = soup.select_one(f'nav[aria-label="{_DOCS_PAGER_LABEL}"]')
   if not nav:
     return None
 
   for a in nav.find_all("a", href=True):
-    text = " ".join(a.get_text(" ", strip=True).split())
-    if text.lower().startswith("next"):
+    if _is_next_label(a.get_text(" ", strip=True)):
       return urljoin(base_url, a["href"])
 
   return None
 
 
-def iter_docusaurus_next(options: DocusaurusNextOptions) -> list[Chapter]:
-  session = requests.Session()
-  session.headers.update({"User-Agent": options.user_agent})
+# Markup hints for the page that follows: `<link rel="next">` and
+# prefetch/prerender hints in the head, and rel="next" or Docusaurus'
+# pagination "Next" anchor in the body. Scanned on raw bytes, before parsing;
+# the pager is matched as `_extract_next_url` matches it, so the link the
+# crawl will follow is always hinted first.
+_HINT_PAGER_RE = re.compile(
+  rb"""<nav\b[^>]*\baria-label\s*=\s*["']"""
+  + _DOCS_PAGER_LABEL.encode()
+  + rb"""["'][^>]*>(.*?)</nav\s*>""",
+  re.IGNORECASE | re.DOTALL,
+)
+_HINT_ANCHOR_RE = re.compile(rb"<a\s([^>]*)>(.*?)</a\s*>", re.IGNORECASE | re.DOTALL)
+_HINT_MARKUP_RE = re.compile(rb"<[^>]*>")
+_HINT_TAG_RE = re.compile(rb"<(link|a)\s[^>]*>", re.IGNORECASE)
+_HINT_REL_RE = re.compile(rb"""\brel\s*=\s*["']?([^"'>]*)""", re.IGNORECASE)
+_HINT_HREF_RE = re.compile(rb"""\bhref\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.IGNORECASE)
+_HINT_NEXT_CLASS = b"pagination-nav__link--next"
+
+
+def _prefetch_hints(raw: bytes) -> list[str]:
+  """hrefs that likely point at the next page, most likely first."""
+
+  strong: list[str] = []
+  weak: list[str] = []
+  pager = _pager_next_href(raw)
+  if pager is not None:
+    strong.append(pager)
+  for match in _HINT_TAG_RE.finditer(raw):
+    tag = match.group(0)
+    href = _hint_href(tag)
+    if href is None or href in strong:
+      continue
+    rel_match = _HINT_REL_RE.search(tag)
+    rels = rel_match.group(1).lower().split() if rel_match else []
+    if b"next" in rels or _HINT_NEXT_CLASS in tag:
+      strong.append(href)
+    elif match.group(1).lower() == b"link" and (b"prefetch" in rels or b"prerender" in rels):
+      weak.append(href)
+  return strong + weak
 
-  url = options.start_url
-  base_url = options.base_url or options.start_url
 
-  visited: set[str] = set()
-  chapters: list[Chapter] = []
-
-  def fetch_soup(target_url: str) -> BeautifulSoup:
-    resp = session.get(target_url, timeout=30)
-    resp.raise_for_status()
-    return BeautifulSoup(resp.text, "lxml")
-
-  initial_soup = fetch_soup(url)
-  canonical = _extract_canonical_url(initial_soup, base_url=url)
-  if options.base_url is None and canonical:
-    start_origin = urlparse(url).netloc.lower()
-    canonical_origin = urlparse(canonical).netloc.lower()
-    if canonical_origin == start_origin:
-      canonical_key = _canonicalize_url(canonical)
-      if canonical_key != _canonicalize_url(url):
-        url = canonical
-        base_url = canonical
-        initial_soup = fetch_soup(url)
-
-  sidebar_urls = _extract_sidebar_urls(initial_soup, base_url=base_url, start_url=url)
-  initial_key = _canonicalize_url(url)
-
-  def consume_page(target_url: str, *, soup: BeautifulSoup | None = None) -> Tag | None:
-    if options.max_pages is not None and len(chapters) >= options.max_pages:
-      return None
-    key = _canonicalize_url(target_url)
-    if key in visited:
+def _pager_next_href(raw: bytes) -> str | None:
+  """The "Next" anchor of the "Docs pages" pager, as `_extract_next_url` finds it."""
+
+  nav = _HINT_PAGER_RE.search(raw)
+  if nav is None:
+    return None
+  for anchor in _HINT_ANCHOR_RE.finditer(nav.group(1)):
+    href = _hint_href(anchor.group(1))
+    text = html.unescape(_HINT_MARKUP_RE.sub(b" ", anchor.group(2)).decode("utf-8", errors="replace"))
+    if href is not None and _is_next_label(text):
+      return href
+  return None
+
+
+def _hint_href(attrs: bytes) -> str | None:
+  match = _HINT_HREF_RE.search(attrs)
+  if match is None:
+    return None
+  return html.unescape(next(group for group in match.groups() if group is not None).decode("utf-8", errors="replace"))
+
+
+def build_rate_limiter(
+  options: DocusaurusNextOptions,
+  session: requests.Session | LimitedSession | CachingSession | RecordingSession,
+  *,
+  share: int = 1,
+) -> HostRateLimiter:
+  """Per-host limiter; `share` splits the budget between worker processes.
+
+  Each of `share` limiters gets `1/share` of the start rate, of `max_rate`
+  and of the `Crawl-delay` rate, so together they stay within them.
+  """
+
+  def load_crawl_delay(robots_url: str) -> float | None:
+    try:
+      resp = session.get(robots_url, timeout=10)
+      resp.raise_for_status()
+      delay = parse_crawl_delay(resp.text, user_agent=options.user_agent)
+    except Exception:
+      # robots.txt is advisory; a missing or broken one must not stop the crawl.
       return None
-    visited.add(key)
+    return delay * share if delay is not None else None
+
+  initial_rate = 1.0 / (options.sleep_s * share) if options.sleep_s > 0 else float("inf")
+  return HostRateLimiter(
+    initial_rate=initial_rate,
+    max_rate=options.max_rate / share if options.max_rate is not None else None,
+    robots_loader=load_crawl_delay if options.respect_robots else None,
+  )
+
+
+def iter_docusaurus_next(
+  options: DocusaurusNextOptions,
+  *,
+  stats: RunStats | None = None,
+  http_cache: HttpCache | None = None,
+  chapter_cache: ChapterCache | None = None,
+  checkpoint: CrawlCheckpoint | None = None,
+  session: requests.Session | LocalSiteSession | WarcReplaySession | None = None,
+  budget: DownloadBudget | None = None,
+  warc: WarcWriter | None = None,
+  limiter: HostRateLimiter | None = None,
+) -> Iterator[Chapter]:
+  """Crawl the site and yield chapters in reading order as they are extracted.
+
+  Nothing is fetched until the first chapter is requested, and pages are
+  fetched only as far ahead of the consumer as `options.concurrency` allows,
+  so callers can build the book while the crawl is still running.
+
+  With a `checkpoint`, progress is saved as chapters are committed and when
+  the crawl stops for any reason; a resumed crawl replays the saved chapters
+  and continues from the first page that was not committed.
+
+  `session` lets the caller share one transport (see `new_session`) with
+  the image pipeline; worker processes always open their own. `budget`
+  likewise lets the image pipeline draw from the same total byte budget.
+  With `warc`, every response the crawler sees is recorded (not in worker
+  processes). A shared `limiter` keeps per-host politeness across crawls
+  running side by side; worker processes cannot use it, so it excludes
+  `options.processes`.
+  """
+
+  if limiter is not None and options.processes > 1:
+    raise ValueError("a shared limiter cannot pace worker processes; use processes=1")
+  budget = budget or DownloadBudget(options.downloads)
+  fetch, limiter = _make_fetch(options, http_cache, session=session, budget=budget, warc=warc, limiter=limiter)
+  # Counters already on `stats` keep counting, so crawls side by side (a
+  # batch) can report together.
+  stats = stats if stats is not None else RunStats()
+  if stats.page_parse is None:
+    stats.page_parse = PageParseStats()
+  if stats.prefetch is None:
+    stats.prefetch = PrefetchStats()
+
+  try:
+    yield from _crawl(
+      options,
+      fetch=fetch,
+      http_cache=http_cache,
+      chapter_cache=chapter_cache,
+      page_parse=stats.page_parse,
+      budget=budget,
+      checkpoint=checkpoint,
+      worker_pages=stats.worker_pages,
+      duplicates=stats.duplicates,
+      prefetch=stats.prefetch,
+    )
+  finally:
+    stats.host_rates = limiter.summaries()
+    stats.downloads = budget
+    if chapter_cache is not None:
+      stats.chapter_cache = chapter_cache.stats
 
-    page_soup = soup
-    if page_soup is None:
+
+def _new_session(options: DocusaurusNextOptions) -> requests.Session | LocalSiteSession | WarcReplaySession:
+  if options.replay is not None:
+    return WarcReplaySession(options.replay)
+  if options.source is not None:
+    return LocalSiteSession(options.source, site_url=options.source_url or site_root_url(options.start_url))
+  return new_session(options.transport, user_agent=options.user_agent)
+
+
+def _make_fetch(
+  options: DocusaurusNextOptions,
+  http_cache: HttpCache | None,
+  *,
+  share: int = 1,
+  session: requests.Session | LocalSiteSession | WarcReplaySession | None = None,
+  budget: DownloadBudget | None = None,
+  warc: WarcWriter | None = None,
+  limiter: HostRateLimiter | None = None,
+) -> tuple[Callable[..., requests.Response], HostRateLimiter]:
+  if session is None:
+    session = _new_session(options)
+  session = LimitedSession(session, budget or DownloadBudget(options.downloads, share=share), kind="page")
+  if http_cache is not None:
+    session = CachingSession(session, http_cache)
+  if warc is not None:
+    # Outermost, so cache hits are recorded too and the WARC replays alone.
+    session = RecordingSession(session, warc)
+  offline = (
+    options.source is not None
+    or options.replay is not None
+    or (http_cache is not None and http_cache.offline)
+  )
+  limiter = limiter or build_rate_limiter(options, session, share=share)
+
+  def fetch(target_url: str, *, lastmod: datetime | None = None) -> requests.Response:
+    if http_cache is not None and lastmod is not None:
+      unchanged = http_cache.response_if_unchanged(target_url, lastmod.timestamp())
+      if unchanged is not None:
+        return unchanged
+    if offline:
+      # Nothing reaches a host: no pacing, and nothing for the limiter to report.
+      resp = session.get(target_url, timeout=30)
+      resp.raise_for_status()
+      return resp
+
+    attempt = 0
+    while True:
+      limiter.acquire(target_url)
+      started = time.monotonic()
+      resp = session.get(target_url, timeout=30)
+      latency_s = time.monotonic() - started
       try:
-        page_soup = fetch_soup(target_url)
+        resp.raise_for_status()
       except requests.HTTPError as exc:
         status = exc.response.status_code if exc.response is not None else None
-        if status in {404, 410} and key != initial_key:
-          return None
-        raise
+        if status not in {429, 503}:
+          limiter.record(target_url, latency_s=latency_s)
+          raise
+        retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+        limiter.record(target_url, latency_s=latency_s, throttled=True, retry_after_s=retry_after)
+        if attempt >= options.max_retries:
+          raise
+        attempt += 1
+        continue
+      limiter.record(target_url, latency_s=latency_s)
+      return resp
+
+  return fetch, limiter
+
+
+# Elements that `_remove_unwanted` would drop anyway. Removing them from the
+# markup before parsing keeps multi-megabyte hydration payloads
+# (`__NEXT_DATA__`, inline bundles) out of the tree entirely. Their content
+# is raw text, so the first closing tag ends them. Comments, CDATA sections
+# and tags with a "<" in a quoted attribute are matched (and kept) whole, so
+# "<script" inside them never starts a match. Anything less certain is left
+# to the parser and `_remove_unwanted`: `<script .../>` (self-closing only
+# inside SVG), bodies holding a CDATA section, and unclosed elements. <svg>
+# can nest and is left to the tree. The name must end at whitespace, `>` or
+# `/`, so custom elements such as <script-loader> are kept. The body is read
+# possessively, so a large payload leaves no backtracking state behind.
+_HEAVY_ELEMENTS_RE = re.compile(
+  rb"""
+  <(?P<name>script|style|noscript)(?=[\s>/])(?:"[^"]*"|'[^']*'|[^'">/]|/(?!>))*>
+    [^<]*+(?:<(?!/(?P=name)\s*>|!\[CDATA\[)[^<]*+)*+
+    </(?P=name)\s*>
+  | <!--.*?-->
+  | <!\[CDATA\[.*?\]\]>
+  | <[a-z](?:"[^"]*"|'[^']*'|[^'">])*?(?:"[^"<]*<[^"]*"|'[^'<]*<[^']*')(?:"[^"]*"|'[^']*'|[^'">])*>
+  """,
+  re.IGNORECASE | re.DOTALL | re.VERBOSE,
+)
+
+_CHARSET_PARAM_RE = re.compile(r"""charset\s*=\s*["']?([^"';\s]+)""", re.IGNORECASE)
+
+_BOMS = (codecs.BOM_UTF8, codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)
+
+# What extraction needs from a page other than the start page: the article
+# region and the "Docs pages" pager used by the Next-button crawl.
+_ARTICLE_REGION = SoupStrainer(["article", "main", "nav"])
+
 
+@dataclass(frozen=True)
+class _PageMarkup:
+  raw: bytes
+  encoding: str | None
+  detect: bool
+  charset_s: float
+
+
+def _strip_heavy_elements(markup: bytes) -> bytes:
+  return _HEAVY_ELEMENTS_RE.sub(lambda match: b"" if match.group("name") else match.group(0), markup)
+
+
+def _header_charset(resp: requests.Response) -> str | None:
+  # `resp.encoding` falls back to ISO-8859-1 for any text/* response, so read
+  # the header itself: only an explicit charset counts.
+  match = _CHARSET_PARAM_RE.search(resp.headers.get("content-type") or "")
+  return match.group(1) if match else None
+
+
+def _page_markup(resp: requests.Response) -> _PageMarkup:
+  """Prepare raw page bytes and the encoding to hand the parser.
+
+  Follows the HTML precedence: an explicit transport charset, then a BOM or
+  `<meta charset>` (which the parser reads itself), then UTF-8 when the bytes
+  are valid UTF-8. Statistical detection only runs when all of these fail.
+  """
+
+  raw = _strip_heavy_elements(resp.content)
+  started = time.perf_counter()
+  encoding = _header_charset(resp)
+  detect = False
+  if encoding is None and not (
+    raw.startswith(_BOMS) or EncodingDetector.find_declared_encoding(raw, is_html=True)
+  ):
     try:
-      article = _extract_article(page_soup)
-    except RuntimeError:
-      if key != initial_key:
+      raw.decode("utf-8")
+      encoding = "utf-8"
+    except UnicodeDecodeError:
+      detect = True
+  return _PageMarkup(raw=raw, encoding=encoding, detect=detect, charset_s=time.perf_counter() - started)
+
+
+def _parse_page(markup: _PageMarkup) -> BeautifulSoup:
+  return BeautifulSoup(markup.raw, "lxml", from_encoding=markup.encoding)
+
+
+def _parse_article_region(markup: _PageMarkup) -> BeautifulSoup:
+  """Parse only the regions `_extract_artifact` reads.
+
+  Falls back to a full parse when the page has no <article>/<main>, since
+  `_extract_article` then needs the rest of the document.
+  """
+
+  soup = BeautifulSoup(markup.raw, "lxml", parse_only=_ARTICLE_REGION, from_encoding=markup.encoding)
+  if soup.find(["article", "main"]) is None:
+    return _parse_page(markup)
+  return soup
+
+
+def _timed_parse(
+  page_parse: PageParseStats,
+  target_url: str,
+  resp: requests.Response,
+  parser: Callable[[_PageMarkup], BeautifulSoup],
+) -> BeautifulSoup:
+  markup = _page_markup(resp)
+  started = time.perf_counter()
+  soup = parser(markup)
+  page_parse.record(
+    target_url,
+    charset_s=markup.charset_s,
+    parse_s=time.perf_counter() - started,
+    detected=markup.detect,
+  )
+  return soup
+
+
+class _Prefetcher:
+  """Speculative fetches for the Next-button chain.
+
+  Each page's raw bytes are scanned for next-page hints as soon as they
+  arrive, and the hinted pages are fetched in the background while the
+  current page is parsed and extracted. Once the real next URL is known,
+  prefetches for any other page are discarded.
+  """
+
+  def __init__(
+    self,
+    fetch: Callable[..., requests.Response],
+    *,
+    frontier: UrlFrontier,
+    lastmods: dict[str, datetime],
+    pool: ThreadPoolExecutor,
+    limit: int,
+    stats: PrefetchStats,
+  ) -> None:
+    self._fetch = fetch
+    self._frontier = frontier
+    self._lastmods = lastmods
+    self._pool = pool
+    self._limit = max(1, limit)
+    self._pending: dict[str, Future[requests.Response]] = {}
+    self.stats = stats
+
+  def get(self, target_url: str, *, lastmod: datetime | None = None) -> requests.Response:
+    future = self._pending.pop(self._frontier.key(target_url), None)
+    if future is not None:
+      self.stats.hits += 1
+      resp = future.result()
+    else:
+      resp = self._fetch(target_url, lastmod=lastmod)
+    self.speculate(target_url, resp)
+    return resp
+
+  def speculate(self, page_url: str, resp: requests.Response) -> None:
+    for href in _prefetch_hints(resp.content):
+      if len(self._pending) >= self._limit:
+        break
+      abs_url = urljoin(page_url, href).split("#", 1)[0]
+      key = self._frontier.scoped_key(abs_url)
+      if key is None or key in self._frontier.visited or key in self._pending:
+        continue
+      self._pending[key] = self._pool.submit(self._fetch, abs_url, lastmod=self._lastmods.get(key))
+      self.stats.issued += 1
+
+  def settle(self, next_url: str | None) -> None:
+    """Drop prefetches that are not for `next_url`."""
+
+    keep = self._frontier.key(next_url) if next_url else None
+    for key in [key for key in self._pending if key != keep]:
+      self._pending.pop(key).cancel()
+      self.stats.discarded += 1
+
+
+@dataclass
+class _PageExtractor:
+  """Fetches one page and turns it into a `ChapterArtifact`.
+
+  Shared by the in-process crawl and the worker processes. `extract` returns
+  None for pages to skip (404/410, offline misses, no article content).
+  """
+
+  fetch: Callable[..., requests.Response]
+  frontier: UrlFrontier
+  url: str
+  base_url: str
+  page_parse: PageParseStats
+  lastmods: dict[str, datetime]
+  chapter_cache: ChapterCache | None = None
+
+  def extract(
+    self,
+    target_url: str,
+    *,
+    prefetched: tuple[requests.Response, BeautifulSoup | None] | None = None,
+  ) -> ChapterArtifact | None:
+    key = self.frontier.key(target_url)
+    soup = None
+    if prefetched is not None:
+      resp, soup = prefetched
+    else:
+      try:
+        resp = self.fetch(target_url, lastmod=self.lastmods.get(key))
+      except requests.HTTPError as exc:
+        status = exc.response.status_code if exc.response is not None else None
+        if status in {404, 410}:
+          return None
+        raise
+      except ResourceTooLarge:
+        if key == self.frontier.key(self.url):
+          raise
         return None
-      raise
-    title_el = article.find(["h1", "h2"])
-    title = (
-      " ".join(title_el.get_text(" ", strip=True).split())
-      if title_el
-      else f"Chapter {len(chapters) + 1}"
-    )
-    if title_el is None and article.name == "body":
-      body_text = " ".join(article.get_text(" ", strip=True).split())
-      if len(body_text) < 200:
+      except CacheMiss:
         return None
 
-    _remove_unwanted(article)
-    _absolutize_urls(article, base_url=target_url)
+    cache_key = None
+    if self.chapter_cache is not None:
+      cache_key = artifact_key(
+        resp.content,
+        pipeline_version=CHAPTER_PIPELINE_VERSION,
+        context=(target_url, self.url, self.base_url),
+      )
+      cached = self.chapter_cache.get(cache_key)
+      if cached is not None:
+        return cached if cached.html is not None else None
+
+    artifact = _extract_artifact(
+      soup if soup is not None else _timed_parse(self.page_parse, target_url, resp, _parse_article_region),
+      target_url=target_url,
+      base_url=self.base_url,
+      frontier=self.frontier,
+      required=key == self.frontier.key(self.url),
+      key=cache_key,
+    )
+    if self.chapter_cache is not None and cache_key is not None:
+      self.chapter_cache.put(cache_key, artifact)
+    return artifact if artifact.tree is not None else None
 
-    for a in list(article.select('a.hash-link[href^="#"]')):
-      a.decompose()
 
-    html = article.decode_contents()
-    chapters.append(Chapter(index=len(chapters) + 1, title=title, url=target_url, html=html))
+def _discover_sitemap(
+  fetch: Callable[..., requests.Response],
+  *,
+  start_url: str,
+  frontier: UrlFrontier,
+) -> list[SitemapEntry]:
+  def fetch_bytes(target_url: str) -> bytes | None:
+    try:
+      return fetch(target_url).content
+    except requests.RequestException:
+      return None
 
-    if options.sleep_s > 0 and (options.max_pages is None or len(chapters) < options.max_pages):
-      import time
+  parsed = urlparse(start_url)
+  robots = fetch_bytes(f"{parsed.scheme}://{parsed.netloc}/robots.txt")
+  candidates = sitemap_candidates(
+    start_url,
+    root_path=frontier.root_path,
+    robots_txt=robots.decode("utf-8", errors="replace") if robots else None,
+  )
+  entries = discover_sitemap_entries(fetch_bytes, candidates)
+  return _filter_sitemap_entries(entries, frontier=frontier)
+
+
+def _crawl(
+  options: DocusaurusNextOptions,
+  *,
+  fetch: Callable[..., requests.Response],
+  http_cache: HttpCache | None,
+  chapter_cache: ChapterCache | None,
+  page_parse: PageParseStats,
+  budget: DownloadBudget | None = None,
+  checkpoint: CrawlCheckpoint | None = None,
+  worker_pages: dict[int, int] | None = None,
+  duplicates: list[tuple[str, str]] | None = None,
+  prefetch: PrefetchStats | None = None,
+) -> Iterator[Chapter]:
+  url = options.start_url
+  base_url = options.base_url or options.start_url
 
-      time.sleep(options.sleep_s)
+  emitted = 0
+
+  def parse(
+    target_url: str,
+    resp: requests.Response,
+    parser: Callable[[_PageMarkup], BeautifulSoup],
+  ) -> BeautifulSoup:
+    return _timed_parse(page_parse, target_url, resp, parser)
+
+  initial_resp: requests.Response | None = None
+  initial_soup: BeautifulSoup | None = None
+  lastmods: dict[str, datetime] = {}
+  detector = DuplicateDetector() if options.dedupe else None
+  state = None
+  if checkpoint is not None:
+    state = checkpoint.load(start_url=options.start_url, discovery=options.discovery)
+
+  if state is not None:
+    # Resume: chapters committed before the interruption are replayed from
+    # the checkpoint and their pages are not fetched again.
+    url, base_url = state.url, state.base_url
+    frontier = UrlFrontier(url)
+    lastmods = {key: datetime.fromisoformat(value) for key, value in state.lastmods.items()}
+    for queued in state.queue:
+      frontier.push(queued)
+    for done_url in state.queue[: state.position] + state.visited:
+      frontier.visit(done_url)
+    for chapter in checkpoint.chapters(state.emitted):
+      if detector is not None:
+        text = BeautifulSoup(chapter.html, "lxml").get_text(" ")
+        detector.check(chapter.url, fingerprint_text(text))
+      yield chapter
+    emitted = state.emitted
+    if state.done:
+      return
+  else:
+    initial_resp = fetch(url)
+    initial_soup = parse(url, initial_resp, _parse_page)
+    canonical = _extract_canonical_url(initial_soup, base_url=url)
+    if options.base_url is None and canonical:
+      start_origin = urlparse(url).netloc.lower()
+      canonical_origin = urlparse(canonical).netloc.lower()
+      if canonical_origin == start_origin:
+        if canonicalize_url(canonical) != canonicalize_url(url):
+          url = canonical
+          base_url = canonical
+          initial_resp = fetch(url)
+          initial_soup = parse(url, initial_resp, _parse_page)
+
+    frontier = UrlFrontier(url)
+    sidebar_urls = _extract_sidebar_urls(initial_soup, base_url=base_url, frontier=frontier)
+
+    if options.discovery == "sitemap":
+      entries = _discover_sitemap(fetch, start_url=url, frontier=frontier)
+      for entry in entries:
+        if entry.lastmod is not None:
+          lastmods[entry.url] = entry.lastmod
+      # The sidebar (when present) defines reading order; sitemap-only pages
+      # follow in sitemap order (`push` drops the ones already queued).
+      sidebar_urls = sidebar_urls + [e.url for e in entries]
+
+    if sidebar_urls:
+      if frontier.key(url) not in {frontier.key(u) for u in sidebar_urls}:
+        frontier.push(url)
+      for sidebar_url in sidebar_urls:
+        frontier.push(sidebar_url)
+
+    state = CrawlState(
+      start_url=options.start_url,
+      discovery=options.discovery,
+      url=url,
+      base_url=base_url,
+      mode="queue" if frontier.queue else "next",
+      next_url=None if frontier.queue else url,
+      lastmods={key: value.isoformat() for key, value in lastmods.items()},
+    )
 
-    return article
+  initial_key = frontier.key(url)
+  # Shares the frontier's list, so the checkpoint sees links as they are queued.
+  state.queue = frontier.queue
+  extractor = _PageExtractor(
+    fetch=fetch,
+    frontier=frontier,
+    url=url,
+    base_url=base_url,
+    page_parse=page_parse,
+    lastmods=lastmods,
+    chapter_cache=chapter_cache,
+  )
+
+  def limit_reached() -> bool:
+    return options.max_pages is not None and emitted >= options.max_pages
+
+  def remaining() -> int | None:
+    return None if options.max_pages is None else options.max_pages - emitted
+
+  def extract_page(target_url: str) -> ChapterArtifact | None:
+    # Runs on worker threads: must not touch `emitted`, `state` or the
+    # frontier's queue and visited/discovered sets.
+    nonlocal initial_resp, initial_soup
+    prefetched = None
+    if initial_resp is not None and frontier.key(target_url) == initial_key:
+      prefetched = (initial_resp, initial_soup)
+      # The start page's tree is only needed once; drop it so it is not kept
+      # alive for the rest of the crawl.
+      initial_resp = initial_soup = None
+    return extractor.extract(target_url, prefetched=prefetched)
+
+  def sync_state() -> CrawlState:
+    state.emitted = emitted
+    if state.mode == "next":
+      # The page we would continue from is marked visited before it is
+      # fetched; it must be fetched again on resume.
+      resume_key = frontier.key(state.next_url) if state.next_url else None
+      state.visited = [key for key in frontier.visited if key != resume_key]
+    return state
+
+  def commit(target_url: str, page: ChapterArtifact) -> Chapter | None:
+    """Number and checkpoint a chapter, or return None for a duplicate.
+
+    Duplicates are dropped here, before they reach the builders and their
+    image pipelines. Their links have already been queued.
+    """
+
+    nonlocal emitted
+    if detector is not None:
+      kept = detector.check(target_url, Fingerprint(digest=page.text_hash, simhash=page.simhash))
+      if kept is not None:
+        if duplicates is not None:
+          duplicates.append((target_url, kept))
+        return None
+    emitted += 1
+    chapter = Chapter(
+      index=emitted,
+      title=page.title or f"Chapter {emitted}",
+      url=target_url,
+      # Chapters keep the tree alone; `html` serializes it if ever needed.
+      html=(page.html or "") if page.tree is None else None,
+      image_urls=page.image_urls,
+      key=page.key,
+      tree=page.tree,
+    )
+    # The chapter cache may have serialized the same tree already.
+    vars(Chapter)["html"].share(page, chapter)
+    if checkpoint is not None:
+      checkpoint.record(chapter, sync_state())
+    return chapter
+
+  try:
+    if state.mode == "queue" and options.processes > 1 and checkpoint is None:
+      yield from _crawl_processes(
+        frontier,
+        state=state,
+        options=options,
+        http_cache=http_cache,
+        chapter_cache=chapter_cache,
+        extract_page=extract_page,
+        commit=commit,
+        limit_reached=limit_reached,
+        remaining=remaining,
+        worker_pages=worker_pages if worker_pages is not None else {},
+        page_parse=page_parse,
+        budget=budget if budget is not None else DownloadBudget(options.downloads),
+      )
+    elif state.mode == "queue":
+      yield from _crawl_queue(
+        frontier,
+        state=state,
+        workers=max(1, options.concurrency),
+        extract_page=extract_page,
+        commit=commit,
+        limit_reached=limit_reached,
+        remaining=remaining,
+      )
+    else:
+      # Fallback: follow next/previous navigation.
+      with ThreadPoolExecutor(
+        max_workers=max(1, options.concurrency),
+        thread_name_prefix="docs2epub-prefetch",
+      ) as pool:
+        prefetcher = _Prefetcher(
+          fetch,
+          frontier=frontier,
+          lastmods=lastmods,
+          pool=pool,
+          limit=options.concurrency,
+          stats=prefetch if prefetch is not None else PrefetchStats(),
+        )
+        extractor.fetch = prefetcher.get
+        if initial_resp is not None:
+          prefetcher.speculate(url, initial_resp)
+        try:
+          yield from _crawl_next_chain(
+            frontier,
+            state=state,
+            prefetcher=prefetcher,
+            extract_page=extract_page,
+            commit=commit,
+            limit_reached=limit_reached,
+          )
+        finally:
+          prefetcher.settle(None)
+  finally:
+    if checkpoint is not None:
+      checkpoint.save(sync_state())
+
+
+def _crawl_next_chain(
+  frontier: UrlFrontier,
+  *,
+  state: CrawlState,
+  prefetcher: _Prefetcher,
+  extract_page: Callable[[str], ChapterArtifact | None],
+  commit: Callable[[str, ChapterArtifact], Chapter | None],
+  limit_reached: Callable[[], bool],
+) -> Iterator[Chapter]:
+  while state.next_url and not limit_reached():
+    current_url = state.next_url
+    if not frontier.visit(current_url):
+      state.next_url = None
+      break
+    page = extract_page(current_url)
+    if page is None:
+      state.next_url = None
+      break
+    state.next_url = page.next_url
+    prefetcher.settle(state.next_url)
+    chapter = commit(current_url, page)
+    if chapter is not None:
+      yield chapter
+  state.done = state.next_url is None
 
-  if sidebar_urls:
-    if initial_key not in {_canonicalize_url(u) for u in sidebar_urls}:
-      sidebar_urls.insert(0, url)
-    queue = list(sidebar_urls)
-    discovered = {_canonicalize_url(u) for u in queue}
-    idx = 0
-    while idx < len(queue):
-      if options.max_pages is not None and len(chapters) >= options.max_pages:
-        break
-      target_url = queue[idx]
-      use_soup = initial_soup if _canonicalize_url(target_url) == initial_key else None
-      article = consume_page(target_url, soup=use_soup)
-      if article is None:
+
+def _crawl_queue(
+  frontier: UrlFrontier,
+  *,
+  state: CrawlState,
+  workers: int,
+  extract_page: Callable[[str], ChapterArtifact | None],
+  commit: Callable[[str, ChapterArtifact], Chapter | None],
+  limit_reached: Callable[[], bool],
+  remaining: Callable[[], int | None] = lambda: None,
+) -> Iterator[Chapter]:
+  # Pages are fetched and extracted on a bounded pool, but results are
+  # committed strictly in queue order, and content links are appended to
+  # the queue only at commit time. The queue (and so the book) therefore
+  # grows exactly as it would in a serial crawl. With a page limit, no more
+  # pages are in flight than chapters still allowed.
+  queue = frontier.queue
+  with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="docs2epub-fetch") as pool:
+    pending: dict[int, Future[ChapterArtifact | None]] = {}
+    next_submit = state.position
+    idx = state.position
+    try:
+      while idx < len(queue) and not limit_reached():
+        budget = remaining()
+        while next_submit < len(queue) and len(pending) < min(workers, budget if budget is not None else workers):
+          target_url = queue[next_submit]
+          if frontier.visit(target_url):
+            pending[next_submit] = pool.submit(extract_page, target_url)
+          next_submit += 1
+
+        future = pending.pop(idx, None)
+        target_url = queue[idx]
+        page = future.result() if future is not None else None
+        # Only advance once the page is settled, so a failure leaves the
+        # checkpoint pointing at it.
         idx += 1
-        continue
-      extra = _extract_content_urls(article, base_url=target_url, start_url=url)
-      for link in extra:
-        key = _canonicalize_url(link)
-        if key in discovered:
+        state.position = idx
+        if page is None:
           continue
-        discovered.add(key)
-        queue.append(link)
-      idx += 1
-    return chapters
-
-  # Fallback: follow next/previous navigation.
-  current_url = url
-  soup = initial_soup
-  while True:
-    if options.max_pages is not None and len(chapters) >= options.max_pages:
-      break
+        for link in page.links:
+          frontier.push(link)
+        chapter = commit(target_url, page)
+        if chapter is not None:
+          yield chapter
+      state.done = idx >= len(queue)
+    finally:
+      for future in pending.values():
+        future.cancel()
 
-    article = consume_page(current_url, soup=soup)
-    if article is None:
-      break
 
-    next_url = _extract_next_url(soup, base_url=base_url)
-    if not next_url:
-      break
+# How often the assembling parent and idle workers poll the shared store.
+_PROCESS_POLL_S = 0.02
 
-    current_url = next_url
-    soup = fetch_soup(current_url)
 
-  return chapters
+@dataclass(frozen=True)
+class _WorkerConfig:
+  options: DocusaurusNextOptions
+  store_path: Path
+  worker: int
+  url: str
+  base_url: str
+  lastmods: dict[str, str]
+  http_cache_dir: Path | None = None
+  http_cache_offline: bool = False
+  http_cache_negative_ttl_s: float = 0.0
+  chapter_cache_dir: Path | None = None
+
+
+def _process_worker(config: _WorkerConfig) -> None:
+  """Worker process body: claim pages from the store until it is drained."""
+
+  http_cache = None
+  if config.http_cache_dir is not None:
+    http_cache = HttpCache(
+      config.http_cache_dir,
+      negative_ttl_s=config.http_cache_negative_ttl_s,
+      offline=config.http_cache_offline,
+    )
+  chapter_cache = ChapterCache(config.chapter_cache_dir) if config.chapter_cache_dir is not None else None
+  budget = DownloadBudget(config.options.downloads, share=config.options.processes)
+  page_parse = PageParseStats()
+  fetch, _ = _make_fetch(config.options, http_cache, share=config.options.processes, budget=budget)
+  extractor = _PageExtractor(
+    fetch=fetch,
+    frontier=UrlFrontier(config.url),
+    url=config.url,
+    base_url=config.base_url,
+    page_parse=page_parse,
+    lastmods={key: datetime.fromisoformat(value) for key, value in config.lastmods.items()},
+    chapter_cache=chapter_cache,
+  )
+
+  store = CrawlStore(config.store_path)
+  try:
+    while True:
+      claimed = store.claim(config.worker)
+      if claimed is None:
+        if store.finished():
+          return
+        time.sleep(_PROCESS_POLL_S)
+        continue
+      key, target_url = claimed
+      try:
+        artifact = extractor.extract(target_url)
+      except Exception as exc:
+        # Reported by the parent when it reaches this page in reading order.
+        store.fail(key, f"{type(exc).__name__}: {exc}")
+        continue
+      store.complete(key, artifact, worker=config.worker)
+  finally:
+    # Merged into the parent's stats once the crawl ends.
+    store.save_worker_stats(
+      config.worker,
+      {
+        "downloaded_bytes": budget.downloaded_bytes,
+        "skipped": dict(budget.skipped),
+        "pages": page_parse.pages,
+        "detected": page_parse.detected,
+        "charset_s": page_parse.charset_s,
+        "parse_s": page_parse.parse_s,
+        "slowest_charset_s": page_parse.slowest_charset_s,
+        "slowest_charset_url": page_parse.slowest_charset_url,
+      },
+    )
+    store.close()
+
+
+def _process_context() -> multiprocessing.context.BaseContext:
+  # fork is much cheaper to start, but forking while other threads run
+  # (image downloads, an embedding application's pools) can deadlock on the
+  # locks they hold. Everything the workers need is picklable for the others.
+  methods = multiprocessing.get_all_start_methods()
+  if "fork" in methods and threading.active_count() == 1:
+    return multiprocessing.get_context("fork")
+  return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _crawl_processes(
+  frontier: UrlFrontier,
+  *,
+  state: CrawlState,
+  options: DocusaurusNextOptions,
+  http_cache: HttpCache | None,
+  chapter_cache: ChapterCache | None,
+  extract_page: Callable[[str], ChapterArtifact | None],
+  commit: Callable[[str, ChapterArtifact], Chapter | None],
+  limit_reached: Callable[[], bool],
+  remaining: Callable[[], int | None],
+  worker_pages: dict[int, int],
+  page_parse: PageParseStats,
+  budget: DownloadBudget,
+) -> Iterator[Chapter]:
+  """Crawl with `options.processes` worker processes sharing a SQLite frontier.
+
+  Workers claim pages in discovery order, extract them and queue their links
+  in the store. This process assembles the book by replaying the serial
+  crawl over the stored artifacts: it walks the queue in order and appends
+  each page's links as the page is committed, so chapter order is exactly
+  what `_crawl_queue` would produce. With a page limit, workers only claim
+  the next pages of that order, no more than chapters still allowed. Their
+  download and parse counts are added to `budget` and `page_parse`.
+  """
+
+  with tempfile.TemporaryDirectory(prefix="docs2epub-crawl-") as tmp:
+    store_path = Path(tmp) / "frontier.sqlite"
+    store = CrawlStore(store_path)
+    store.add((frontier.key(u), u) for u in frontier.queue)
+    # The start page is already parsed here; extract it before the workers
+    # start so it is not fetched twice.
+    start_key = frontier.key(state.url)
+    local = {start_key: PageResult(state="done", artifact=extract_page(state.url))}
+    store.complete(start_key, local[start_key].artifact)
+    gated = remaining() is not None
+    if gated:
+      store.gate()
+    store.close()
+
+    ctx = _process_context()
+    workers = [
+      ctx.Process(
+        target=_process_worker,
+        args=(
+          _WorkerConfig(
+            options=options,
+            store_path=store_path,
+            worker=worker,
+            url=state.url,
+            base_url=state.base_url,
+            lastmods=state.lastmods,
+            http_cache_dir=http_cache.cache_dir if http_cache is not None else None,
+            http_cache_offline=http_cache.offline if http_cache is not None else False,
+            http_cache_negative_ttl_s=http_cache.negative_ttl_s if http_cache is not None else 0.0,
+            chapter_cache_dir=chapter_cache.cache_dir if chapter_cache is not None else None,
+          ),
+        ),
+        name=f"docs2epub-worker-{worker}",
+        daemon=True,
+      )
+      for worker in range(1, options.processes + 1)
+    ]
+    for worker in workers:
+      worker.start()
+
+    store = CrawlStore(store_path)
+    queue = frontier.queue
+    idx = state.position
+    released = idx
+    try:
+      while idx < len(queue) and not limit_reached():
+        if gated:
+          # As in `_crawl_queue`: no more pages in flight than chapters
+          # still allowed.
+          end = min(len(queue), idx + (remaining() or 0))
+          if end > released:
+            store.release(frontier.key(u) for u in queue[released:end])
+            released = end
+        target_url = queue[idx]
+        key = frontier.key(target_url)
+        result = local.pop(key, None) or store.result(key)
+        if result is None or result.state in {"pending", "claimed"}:
+          if any(worker.exitcode is not None for worker in workers):
+            raise RuntimeError(f"A crawl worker exited before {target_url} was extracted")
+          time.sleep(_PROCESS_POLL_S)
+          continue
+        if result.state == "failed":
+          raise RuntimeError(f"Failed to crawl {target_url}: {result.error}")
+
+        frontier.visit(target_url)
+        idx += 1
+        state.position = idx
+        page = result.artifact
+        if page is None:
+          continue
+        for link in page.links:
+          frontier.push(link)
+        chapter = commit(target_url, page)
+        if chapter is not None:
+          yield chapter
+      state.done = idx >= len(queue)
+    finally:
+      store.stop()
+      for worker in workers:
+        worker.join(timeout=10)
+        if worker.is_alive():
+          worker.terminate()
+          worker.join()
+      worker_pages.update(store.pages_per_worker())
+      for counts in store.worker_stats():
+        budget.merge(int(counts["downloaded_bytes"]), dict(counts["skipped"]))
+        page_parse.merge(
+          PageParseStats(
+            pages=int(counts["pages"]),
+            detected=int(counts["detected"]),
+            charset_s=float(counts["charset_s"]),
+            parse_s=float(counts["parse_s"]),
+            slowest_charset_s=float(counts["slowest_charset_s"]),
+            slowest_charset_url=counts["slowest_charset_url"],
+          )
+        )
+      store.close()
+
+
+def _extract_artifact(
+  soup: BeautifulSoup,
+  *,
+  target_url: str,
+  base_url: str,
+  frontier: UrlFrontier,
+  required: bool,
+  key: str | None = None,
+) -> ChapterArtifact:
+  try:
+    article = _extract_article(soup)
+  except RuntimeError:
+    if required:
+      raise
+    return ChapterArtifact(title=None, html=None)
+  title_el = article.find(["h1", "h2"])
+  title = " ".join(title_el.get_text(" ", strip=True).split()) if title_el else None
+  if title_el is None and article.name == "body":
+    body_text = " ".join(article.get_text(" ", strip=True).split())
+    if len(body_text) < 200:
+      return ChapterArtifact(title=None, html=None)
+
+  _remove_unwanted(article)
+  _absolutize_urls(article, base_url=target_url)
+
+  for a in list(article.select('a.hash-link[href^="#"]')):
+    a.decompose()
+
+  image_urls = []
+  for img in article.find_all("img", src=True):
+    src = str(img.get("src") or "")
+    if src and not src.startswith(("data:", "cid:")) and src not in image_urls:
+      image_urls.append(src)
+
+  fingerprint = fingerprint_text(article.get_text(" "))
+  artifact = ChapterArtifact(
+    title=title,
+    links=tuple(_extract_content_urls(article, base_url=target_url, frontier=frontier)),
+    image_urls=tuple(image_urls),
+    # Read after cleanup, like the serial crawl always did.
+    next_url=_extract_next_url(soup, base_url=base_url),
+    text_hash=fingerprint.digest,
+    simhash=fingerprint.simhash,
+    key=key,
+    tree=article,
+  )
+  # Detach the article so the rest of the page (sidebar, header, ...) can be
+  # freed while the chapter travels on to the builder.
+  article.extract()
+  return artifact
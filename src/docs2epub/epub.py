@@ -1,14 +1,15 @@
 from __future__ import annotations
 
+import tempfile
 import uuid
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Iterable
 
-from bs4 import BeautifulSoup
 from ebooklib import epub
 
+from .kindle_html import parse_fragment
 from .model import Chapter
 
 
@@ -45,23 +46,40 @@ class EpubMetadata:
   created_at: datetime | None = None
 
 
-def _extract_body_inner_html(html: str) -> str:
-  soup = BeautifulSoup(html, "lxml")
-  body = soup.find("body")
-  if not body:
-    return html
-  return body.decode_contents()
-
-
-def _strip_first_h1(html_fragment: str) -> str:
-  soup = BeautifulSoup(html_fragment, "lxml")
-  first_h1 = soup.find("h1")
+def _chapter_body_html(ch: Chapter) -> str:
+  # The chapter title is rendered separately, so drop the page's own <h1>.
+  root = ch.tree if ch.tree is not None else parse_fragment(ch.html)
+  first_h1 = root.find("h1")
   if first_h1:
     first_h1.decompose()
-  body = soup.find("body")
-  if body:
-    return body.decode_contents()
-  return str(soup)
+    if root is ch.tree:
+      ch.tree_changed()
+  return root.decode_contents()
+
+
+class _SpooledEpubHtml(epub.EpubHtml):
+  """EpubHtml whose markup lives in a file until ebooklib writes the book.
+
+  Keeps memory flat for large books: only the chapter being written is held
+  in memory, instead of every chapter body at once.
+  """
+
+  def __init__(self, *, spool_file: Path, **kwargs: object) -> None:
+    self._spool_file = spool_file
+    super().__init__(**kwargs)
+
+  @property
+  def content(self) -> bytes:
+    if not self._spool_file.exists():
+      return b""
+    return self._spool_file.read_bytes()
+
+  @content.setter
+  def content(self, value: str | bytes | None) -> None:
+    if value is None:
+      return
+    data = value.encode("utf-8") if isinstance(value, str) else value
+    self._spool_file.write_bytes(data)
 
 
 def build_epub(
@@ -98,32 +116,46 @@ def build_epub(
   chapter_items: list[epub.EpubHtml] = []
   toc_items: list[epub.Link] = []
 
-  for ch in chapters:
-    body_inner = _extract_body_inner_html(ch.html)
-    body_inner = _strip_first_h1(body_inner)
+  with tempfile.TemporaryDirectory(prefix="docs2epub-epub3-") as tmp:
+    spool_dir = Path(tmp)
+    for ch in chapters:
+      item = _add_chapter(book, ch, style_item=style_item, language=meta.language, spool_dir=spool_dir)
+      chapter_items.append(item)
+      toc_items.append(epub.Link(item.file_name, ch.title, f"chap_{ch.index:03d}"))
 
-    content = f"""<h1>{ch.title}</h1>
-<div class=\"chapter-sep\"></div>
-{body_inner}
-"""
+    book.toc = tuple(toc_items)
+    book.spine = ["nav", *chapter_items]
 
-    item = epub.EpubHtml(
-      title=ch.title,
-      file_name=f"chap_{ch.index:03d}.xhtml",
-      lang=meta.language,
-    )
-    item.content = content
-    item.add_item(style_item)
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
 
-    book.add_item(item)
-    chapter_items.append(item)
-    toc_items.append(epub.Link(item.file_name, ch.title, f"chap_{ch.index:03d}"))
+    epub.write_epub(str(out_path), book, {})
+  return out_path
 
-  book.toc = tuple(toc_items)
-  book.spine = ["nav", *chapter_items]
 
-  book.add_item(epub.EpubNcx())
-  book.add_item(epub.EpubNav())
+def _add_chapter(
+  book: epub.EpubBook,
+  ch: Chapter,
+  *,
+  style_item: epub.EpubItem,
+  language: str,
+  spool_dir: Path,
+) -> epub.EpubHtml:
+  body_inner = _chapter_body_html(ch)
 
-  epub.write_epub(str(out_path), book, {})
-  return out_path
+  content = f"""<h1>{ch.title}</h1>
+<div class=\"chapter-sep\"></div>
+{body_inner}
+"""
+
+  item = _SpooledEpubHtml(
+    spool_file=spool_dir / f"chap_{ch.index:03d}.xhtml",
+    title=ch.title,
+    file_name=f"chap_{ch.index:03d}.xhtml",
+    lang=language,
+  )
+  item.content = content
+  item.add_item(style_item)
+
+  book.add_item(item)
+  return item
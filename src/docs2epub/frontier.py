@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import sys
+from urllib.parse import urljoin, urlparse
+
+
+NON_DOC_EXTENSIONS = frozenset(
+  {
+    ".png",
+    ".jpg",
+    ".jpeg",
+    ".gif",
+    ".svg",
+    ".webp",
+    ".css",
+    ".js",
+    ".map",
+    ".json",
+    ".xml",
+    ".rss",
+    ".pdf",
+    ".zip",
+    ".tar",
+    ".gz",
+    ".tgz",
+    ".epub",
+    ".mp4",
+    ".mp3",
+    ".wav",
+  }
+)
+
+_SKIPPED_SCHEMES = ("mailto:", "tel:", "javascript:")
+
+
+def canonicalize_url(url: str) -> str:
+  parsed = urlparse(url)
+  path = parsed.path or "/"
+  if path != "/" and path.endswith("/"):
+    path = path.rstrip("/")
+  return parsed._replace(
+    scheme=parsed.scheme.lower(),
+    netloc=parsed.netloc.lower(),
+    path=path,
+    query="",
+    fragment="",
+  ).geturl()
+
+
+def infer_root_path(start_url: str) -> str:
+  parsed = urlparse(start_url)
+  path = (parsed.path or "").rstrip("/")
+  if not path:
+    return ""
+  parts = path.split("/")
+  if len(parts) <= 2:
+    return path
+  return "/".join(parts[:-1])
+
+
+def path_within_root(path: str, root_path: str) -> bool:
+  if not root_path or root_path == "/":
+    return True
+  if path == root_path:
+    return True
+  root = root_path if root_path.endswith("/") else f"{root_path}/"
+  return path.startswith(root)
+
+
+def path_suffix(path: str) -> str:
+  """The lowercased extension of the last path segment ("" if none)."""
+
+  dot = path.rfind(".")
+  if dot < 0 or dot < path.rfind("/"):
+    return ""
+  return path[dot:].lower()
+
+
+def is_probable_doc_link(url: str) -> bool:
+  return path_suffix(urlparse(url).path or "") not in NON_DOC_EXTENSIONS
+
+
+class UrlFrontier:
+  """Crawl scope and the discovered/visited bookkeeping for one crawl.
+
+  The scope (origin, root path) is computed once from `start_url`.
+  Canonical keys are interned and memoized per input URL, so each distinct
+  URL is parsed and canonicalized at most once however often it is seen.
+
+  Scope lookups (`key`, `resolve`) may run on worker threads; `push` and
+  `visit` belong to the thread driving the crawl.
+  """
+
+  def __init__(self, start_url: str) -> None:
+    self.origin = urlparse(start_url).netloc.lower()
+    self.root_path = infer_root_path(start_url)
+    self.queue: list[str] = []
+    self.discovered: set[str] = set()
+    self.visited: set[str] = set()
+    self._keys: dict[str, str] = {}
+    self._scoped: dict[str, str | None] = {}
+    self._origins: dict[str, str] = {}
+
+  def key(self, url: str) -> str:
+    key = self._keys.get(url)
+    if key is None:
+      key = sys.intern(canonicalize_url(url))
+      self._keys[url] = key
+      self._keys.setdefault(key, key)
+    return key
+
+  def scoped_key(self, abs_url: str) -> str | None:
+    """Canonical key of an absolute URL, or None if it is out of scope."""
+
+    if abs_url in self._scoped:
+      return self._scoped[abs_url]
+    parsed = urlparse(abs_url)
+    path = parsed.path or ""
+    result = None
+    if (
+      parsed.scheme in ("http", "https")
+      and (not self.origin or parsed.netloc.lower() == self.origin)
+      and path_suffix(path) not in NON_DOC_EXTENSIONS
+      and path_within_root(path, self.root_path)
+    ):
+      result = self.key(abs_url)
+    self._scoped[abs_url] = result
+    return result
+
+  def resolve(self, href: str, base_url: str) -> str | None:
+    """Resolve a link as found in a page to an in-scope canonical key."""
+
+    if not href or href.startswith("#") or href.startswith(_SKIPPED_SCHEMES):
+      return None
+    if href.startswith("/") and not href.startswith("//") and "/." not in href:
+      # Root-relative links (the common case in sidebars) only need the
+      # base's origin; `urljoin` would re-parse the base for every link.
+      origin = self._origins.get(base_url)
+      if origin is None:
+        parsed = urlparse(base_url)
+        origin = self._origins[base_url] = f"{parsed.scheme}://{parsed.netloc}"
+      return self.scoped_key(origin + href)
+    return self.scoped_key(urljoin(base_url, href))
+
+  def push(self, url: str) -> bool:
+    """Queue `url` unless it was already discovered."""
+
+    key = self.key(url)
+    if key in self.discovered:
+      return False
+    self.discovered.add(key)
+    self.queue.append(url)
+    return True
+
+  def visit(self, url: str) -> bool:
+    """Mark `url` visited; False if it already was."""
+
+    key = self.key(url)
+    if key in self.visited:
+      return False
+    self.visited.add(key)
+    return True
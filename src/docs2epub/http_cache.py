@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+from urllib.parse import urlparse
+
+import requests
+
+from .transport import make_response
+
+
+# Headers that describe the transfer rather than the body. requests has
+# already decoded the body, so replaying them would misdescribe it.
+_DROP_HEADERS = {
+  "connection",
+  "content-encoding",
+  "content-length",
+  "keep-alive",
+  "transfer-encoding",
+  "set-cookie",
+}
+
+_NEGATIVE_STATUSES = {404, 410}
+
+
+class CacheMiss(requests.ConnectionError):
+  """Raised in offline mode for URLs that are not in the cache."""
+
+
+@dataclass
+class HttpCacheStats:
+  downloaded: int = 0
+  revalidated: int = 0
+  offline_hits: int = 0
+  negative_hits: int = 0
+  offline_misses: int = 0
+  unchanged_hits: int = 0
+  _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+  def bump(self, name: str) -> None:
+    with self._lock:
+      setattr(self, name, getattr(self, name) + 1)
+
+
+@dataclass(frozen=True)
+class CachedEntry:
+  url: str
+  status: int
+  headers: dict[str, str]
+  stored_at: float
+  body_file: Path | None
+
+  @property
+  def etag(self) -> str | None:
+    return self.headers.get("etag")
+
+  @property
+  def last_modified(self) -> str | None:
+    return self.headers.get("last-modified")
+
+  def to_response(self, url: str) -> requests.Response:
+    body = self.body_file.read_bytes() if self.body_file is not None else b""
+    return make_response(url, status=self.status, headers=self.headers, body=body)
+
+
+def cache_key(url: str) -> str:
+  parsed = urlparse(url)
+  normalized = parsed._replace(
+    scheme=parsed.scheme.lower(),
+    netloc=parsed.netloc.lower(),
+    path=parsed.path or "/",
+    fragment="",
+  ).geturl()
+  return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def atomic_write(path: Path, data: bytes) -> None:
+  path.parent.mkdir(parents=True, exist_ok=True)
+  fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+  try:
+    with os.fdopen(fd, "wb") as fh:
+      fh.write(data)
+    os.replace(tmp, path)
+  except BaseException:
+    Path(tmp).unlink(missing_ok=True)
+    raise
+
+
+class HttpCache:
+  """Disk-backed HTTP response cache keyed by URL (fragment stripped).
+
+  Successful responses are stored with their headers and revalidated on every
+  use with `If-None-Match`/`If-Modified-Since`. 404/410 responses are cached
+  for `negative_ttl_s`. In `offline` mode the network is never touched.
+  """
+
+  def __init__(
+    self,
+    cache_dir: str | Path,
+    *,
+    negative_ttl_s: float = 24 * 3600,
+    offline: bool = False,
+  ) -> None:
+    self.cache_dir = Path(cache_dir)
+    self.cache_dir.mkdir(parents=True, exist_ok=True)
+    self.negative_ttl_s = negative_ttl_s
+    self.offline = offline
+    self.stats = HttpCacheStats()
+
+  def _paths(self, url: str) -> tuple[Path, Path]:
+    key = cache_key(url)
+    base = self.cache_dir / key[:2] / key
+    return base.with_suffix(".json"), base.with_suffix(".body")
+
+  def lookup(self, url: str) -> CachedEntry | None:
+    meta_file, body_file = self._paths(url)
+    try:
+      meta: dict[str, Any] = json.loads(meta_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+      return None
+    status = int(meta.get("status", 0))
+    has_body = status not in _NEGATIVE_STATUSES and body_file.exists()
+    if status not in _NEGATIVE_STATUSES and not has_body:
+      return None
+    return CachedEntry(
+      url=str(meta.get("url") or url),
+      status=status,
+      headers={str(k).lower(): str(v) for k, v in dict(meta.get("headers") or {}).items()},
+      stored_at=float(meta.get("stored_at", 0.0)),
+      body_file=body_file if has_body else None,
+    )
+
+  def store(self, url: str, response: requests.Response) -> None:
+    meta_file, body_file = self._paths(url)
+    headers = {
+      str(k).lower(): str(v)
+      for k, v in response.headers.items()
+      if str(k).lower() not in _DROP_HEADERS
+    }
+    if response.status_code not in _NEGATIVE_STATUSES:
+      atomic_write(body_file, response.content)
+    meta = {
+      "url": url,
+      "status": response.status_code,
+      "headers": headers,
+      "stored_at": time.time(),
+    }
+    atomic_write(meta_file, json.dumps(meta).encode("utf-8"))
+
+  def touch(self, url: str, entry: CachedEntry, response: requests.Response) -> None:
+    meta_file, _ = self._paths(url)
+    headers = dict(entry.headers)
+    # A 304 may carry refreshed validators.
+    for name in ("etag", "last-modified", "cache-control", "expires"):
+      value = response.headers.get(name)
+      if value:
+        headers[name] = str(value)
+    meta = {"url": url, "status": entry.status, "headers": headers, "stored_at": time.time()}
+    atomic_write(meta_file, json.dumps(meta).encode("utf-8"))
+
+  def response_if_unchanged(self, url: str, modified_at: float) -> requests.Response | None:
+    """Serve a cached body without revalidating if it was stored after `modified_at`.
+
+    Used with sitemap `<lastmod>` dates, which tell us a page has not changed
+    without asking the server.
+    """
+
+    entry = self.lookup(url)
+    if entry is None or entry.status in _NEGATIVE_STATUSES or entry.stored_at < modified_at:
+      return None
+    self.stats.bump("unchanged_hits")
+    return entry.to_response(url)
+
+  def is_negative_fresh(self, entry: CachedEntry) -> bool:
+    return entry.status in _NEGATIVE_STATUSES and time.time() - entry.stored_at < self.negative_ttl_s
+
+
+class CachingSession:
+  """Wraps a `requests.Session` so `get` goes through an `HttpCache`."""
+
+  def __init__(self, session: requests.Session, cache: HttpCache) -> None:
+    self._session = session
+    self.cache = cache
+
+  @property
+  def headers(self) -> Any:
+    return self._session.headers
+
+  def get(self, url: str, timeout: float = 30, **kwargs: Any) -> requests.Response:
+    cache = self.cache
+    entry = cache.lookup(url)
+
+    if entry is not None and entry.status in _NEGATIVE_STATUSES:
+      if cache.offline or cache.is_negative_fresh(entry):
+        cache.stats.bump("negative_hits")
+        return entry.to_response(url)
+      entry = None
+
+    if cache.offline:
+      if entry is not None:
+        cache.stats.bump("offline_hits")
+        return entry.to_response(url)
+      cache.stats.bump("offline_misses")
+      raise CacheMiss(f"{url} is not in the HTTP cache (offline mode)")
+
+    conditional: dict[str, str] = {}
+    if entry is not None:
+      if entry.etag:
+        conditional["If-None-Match"] = entry.etag
+      if entry.last_modified:
+        conditional["If-Modified-Since"] = entry.last_modified
+    if conditional:
+      headers = dict(kwargs.pop("headers", None) or {})
+      headers.update(conditional)
+      kwargs["headers"] = headers
+
+    response = self._session.get(url, timeout=timeout, **kwargs)
+
+    if response.status_code == 304 and entry is not None:
+      cache.touch(url, entry, response)
+      cache.stats.bump("revalidated")
+      return entry.to_response(url)
+
+    if 200 <= response.status_code < 300 or response.status_code in _NEGATIVE_STATUSES:
+      cache.store(url, response)
+    cache.stats.bump("downloaded")
+    return response
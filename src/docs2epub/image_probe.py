@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import io
+import re
+from dataclasses import dataclass
+from typing import Any
+from urllib.parse import urlparse
+
+import requests
+from PIL import Image
+
+
+# Badges, CI status images, trackers and avatars: rarely worth a page in a
+# book. Skipped with `--skip-badges`.
+DEFAULT_DENY_HOSTS: tuple[str, ...] = (
+  "shields.io",
+  "badgen.net",
+  "badge.fury.io",
+  "travis-ci.org",
+  "travis-ci.com",
+  "codecov.io",
+  "coveralls.io",
+  "google-analytics.com",
+  "doubleclick.net",
+  "avatars.githubusercontent.com",
+  "gravatar.com",
+)
+
+_SVG_TAG_RE = re.compile(rb"<svg\b[^>]*>", re.IGNORECASE)
+_SVG_DIM_RE = re.compile(rb"""\b(width|height)\s*=\s*["']\s*([\d.]+)\s*(?:px)?\s*["']""", re.IGNORECASE)
+_CONTENT_RANGE_RE = re.compile(r"/\s*(\d+)\s*$")
+
+
+@dataclass(frozen=True)
+class ProbeOptions:
+  """Which images to skip before downloading them in full.
+
+  Images smaller than `min_pixels` (width x height) or `min_bytes` are
+  dropped, as is everything on `deny_hosts` (and their subdomains). The
+  defaults (`min_pixels=0`, `min_bytes=0`, `deny_hosts=()`) keep every image.
+
+  Sizes come from `width`/`height` attributes in the page; with `network`,
+  images without them are probed first with a `Range` request for their
+  first `probe_bytes`.
+  """
+
+  min_pixels: int = 0
+  min_bytes: int = 0
+  deny_hosts: tuple[str, ...] = ()
+  network: bool = False
+  probe_bytes: int = 16 * 1024
+
+
+@dataclass(frozen=True)
+class ProbeResult:
+  # (width, height), when the header was readable.
+  size: tuple[int, int] | None
+  # Full size of the image, when the server said.
+  total_bytes: int | None
+  read_bytes: int
+
+
+def denied_host(url: str, hosts: tuple[str, ...]) -> bool:
+  host = (urlparse(url).hostname or "").lower()
+  return any(host == denied or host.endswith(f".{denied}") for denied in hosts)
+
+
+def image_size(head: bytes) -> tuple[int, int] | None:
+  """Dimensions from the first bytes of an image (PNG, JPEG, GIF, WebP, SVG...)."""
+
+  svg = _SVG_TAG_RE.search(head)
+  if svg is not None:
+    dims = {name.lower(): value for name, value in _SVG_DIM_RE.findall(svg.group(0))}
+    try:
+      return round(float(dims[b"width"])), round(float(dims[b"height"]))
+    except (KeyError, ValueError):
+      return None
+  try:
+    with Image.open(io.BytesIO(head)) as image:
+      return image.size
+  except Exception:
+    return None
+
+
+def probe_image(session: Any, url: str, *, limit: int, timeout: float = 30) -> ProbeResult | None:
+  """Read the size of the image at `url` from its first `limit` bytes.
+
+  Servers that ignore `Range` answer 200; the body is then abandoned after
+  `limit` bytes. Returns None if the probe itself failed.
+  """
+
+  try:
+    response = session.get(url, timeout=timeout, stream=True, headers={"Range": f"bytes=0-{limit - 1}"})
+  except requests.RequestException:
+    return None
+  try:
+    if response.status_code not in {200, 206}:
+      return None
+    total: int | None = None
+    if response.status_code == 206:
+      match = _CONTENT_RANGE_RE.search(response.headers.get("Content-Range") or "")
+      total = int(match.group(1)) if match else None
+    elif (response.headers.get("Content-Length") or "").isdigit():
+      total = int(response.headers["Content-Length"])
+    head = b""
+    for chunk in response.iter_content(chunk_size=4096):
+      head += chunk
+      if len(head) >= limit:
+        break
+  except requests.RequestException:
+    return None
+  finally:
+    response.close()
+  return ProbeResult(size=image_size(head[:limit]), total_bytes=total, read_bytes=len(head))
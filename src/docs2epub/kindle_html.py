@@ -3,23 +3,48 @@ from __future__ import annotations
 import re
 from collections.abc import Callable
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Tag
+
+
+def parse_fragment(html_fragment: str) -> Tag:
+  """Parse an HTML fragment and return the element holding its content."""
+
+  soup = BeautifulSoup(html_fragment, "lxml")
+  return soup.body or soup
+
+
+_PIXELS_RE = re.compile(r"^\s*(\d+)\s*(?:px)?\s*$")
+
+
+def declared_size(img: Tag) -> tuple[int, int] | None:
+  """The pixel `width` and `height` an `<img>` declares, if it declares both."""
+
+  width = _PIXELS_RE.match(str(img.get("width") or ""))
+  height = _PIXELS_RE.match(str(img.get("height") or ""))
+  if width is None or height is None:
+    return None
+  return int(width.group(1)), int(height.group(1))
 
 
 def clean_html_for_kindle_epub2(
-  html_fragment: str,
+  html_fragment: str | Tag,
   *,
   keep_images: bool,
   base_url: str | None = None,
-  image_rewriter: Callable[[str, str], str | None] | None = None,
+  image_rewriter: Callable[[str, str, tuple[int, int] | None], str | None] | None = None,
 ) -> str:
   """Best-effort HTML cleanup for Kindle-friendly EPUB2.
 
   This is intentionally conservative: it strips known-problematic attributes
   and tags that commonly cause Send-to-Kindle conversion issues.
+
+  `html_fragment` may be an already-parsed tree (e.g. `Chapter.tree`); it is
+  then cleaned in place rather than parsed again. `image_rewriter` gets the
+  `src`, the base URL and the `declared_size` of each `<img>`.
   """
 
-  soup = BeautifulSoup(html_fragment, "lxml")
+  soup = html_fragment if isinstance(html_fragment, Tag) else parse_fragment(html_fragment)
+  tag_factory: BeautifulSoup | None = None
 
   for img in list(soup.find_all("img")):
     src = str(img.get("src") or "")
@@ -36,7 +61,7 @@ def clean_html_for_kindle_epub2(
       img.attrs.pop(attr, None)
 
     if image_rewriter is not None and base_url:
-      rewritten = image_rewriter(src, base_url)
+      rewritten = image_rewriter(src, base_url, declared_size(img))
       if not rewritten:
         img.decompose()
         continue
@@ -44,7 +69,9 @@ def clean_html_for_kindle_epub2(
 
   # EPUB2: <u> tag isn't consistently supported; convert to a span.
   for u in list(soup.find_all("u")):
-    span = soup.new_tag("span")
+    if tag_factory is None:
+      tag_factory = BeautifulSoup("", "lxml")
+    span = tag_factory.new_tag("span")
     span["style"] = "text-decoration: underline;"
     if u.string is None:
       for child in list(u.contents):
@@ -88,6 +115,6 @@ def clean_html_for_kindle_epub2(
         a.attrs.pop("href", None)
 
   # Normalize whitespace a bit (helps keep diffs smaller and reduces odd output).
-  text = str(soup)
+  text = soup.decode_contents()
   text = re.sub(r"\s+", " ", text)
   return text.strip()
@@ -1,13 +1,26 @@
 from __future__ import annotations
 
 import hashlib
+import heapq
 import io
+import json
+import multiprocessing
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable
+from concurrent.futures import BrokenExecutor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Any
 from urllib.parse import urljoin, urlparse
 
 import requests
 from PIL import Image, UnidentifiedImageError
 
+from .http_cache import CachingSession, HttpCache, atomic_write
+from .image_probe import ProbeOptions, denied_host, image_size, probe_image
+from .transport import DownloadBudget, LimitedSession, new_session
+
 
 def _svg_to_png_bytes(raw_svg: bytes) -> bytes:
   import cairosvg
@@ -15,79 +28,650 @@ def _svg_to_png_bytes(raw_svg: bytes) -> bytes:
   return cairosvg.svg2png(bytestring=raw_svg)
 
 
-def _to_kindle_image(raw: bytes, *, media_type: str, ext_hint: str) -> tuple[bytes, str]:
+# Screen sizes in pixels (portrait).
+DEVICE_PROFILES: dict[str, tuple[int, int]] = {
+  "kindle": (1072, 1448),
+  "paperwhite": (1236, 1648),
+  "oasis": (1264, 1680),
+  "scribe": (1860, 2480),
+}
+
+# Images with at most this many distinct colors are diagrams, not photos.
+_FLAT_COLORS = 1024
+
+
+@dataclass(frozen=True)
+class ImageOptions:
+  """How images are converted for the book.
+
+  `max_size` (width, height) shrinks larger images to fit, keeping their
+  aspect ratio; None keeps the full resolution.
+  """
+
+  max_size: tuple[int, int] | None = None
+  jpeg_quality: int = 85
+  grayscale: bool = False
+
+  @property
+  def variant(self) -> str:
+    """Short tag for these settings; converted files differ per variant."""
+
+    size = f"{self.max_size[0]}x{self.max_size[1]}" if self.max_size else "full"
+    return f"{size}-q{self.jpeg_quality}{'-gray' if self.grayscale else ''}"
+
+
+def _fit(size: tuple[int, int], box: tuple[int, int]) -> tuple[int, int] | None:
+  """`size` scaled down to fit in `box`, or None if it already fits."""
+
+  scale = min(box[0] / size[0], box[1] / size[1])
+  if scale >= 1:
+    return None
+  return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+# Source files Kindle can show as they are, by format: usable modes and suffix.
+_KEEPABLE = {
+  "JPEG": ({"L", "RGB"}, ".jpg"),
+  "PNG": ({"1", "L", "LA", "P", "RGB", "RGBA"}, ".png"),
+}
+
+
+def _encode(image: Image.Image, options: ImageOptions, original: bytes) -> tuple[bytes, str]:
+  photo = image.format in {"JPEG", "MPO"}
+  modes, original_suffix = _KEEPABLE.get(image.format or "", (set(), ""))
+  keepable = image.mode in modes and (not options.grayscale or image.mode in {"1", "L", "LA"})
+  target = _fit(image.size, options.max_size) if options.max_size else None
+  if photo and keepable and target is None:
+    # Nothing to change: re-encoding would only lose quality, often for more bytes.
+    return original, original_suffix
+  if photo and target is not None:
+    # Decode JPEGs at a reduced scale (1/2, 1/4, 1/8) when they are far
+    # larger than the screen; much faster than decoding in full.
+    image.draft("L" if options.grayscale else "RGB", target)
+  image.load()
+
+  has_alpha = image.mode in {"RGBA", "LA", "PA"} or "transparency" in image.info
+  flat = not photo and image.getcolors(_FLAT_COLORS) is not None
+  if options.grayscale:
+    image = image.convert("LA" if has_alpha else "L")
+  elif image.mode not in {"RGB", "RGBA", "L", "LA"}:
+    image = image.convert("RGBA" if has_alpha else "RGB")
+
+  if options.max_size:
+    target = _fit(image.size, options.max_size)
+    if target is not None:
+      image = image.resize(target, Image.Resampling.LANCZOS)
+
+  with io.BytesIO() as out:
+    if photo:
+      image.convert("L" if image.mode in {"L", "LA"} else "RGB").save(
+        out, format="JPEG", quality=options.jpeg_quality, optimize=True
+      )
+      suffix = ".jpg"
+    else:
+      if flat and image.mode != "L":
+        # 8-bit palette; resampling may have added colors, so quantize after it.
+        method = Image.Quantize.FASTOCTREE if has_alpha else Image.Quantize.MEDIANCUT
+        image = image.convert("RGBA" if has_alpha else "RGB").quantize(colors=256, method=method)
+      image.save(out, format="PNG")
+      suffix = ".png"
+    encoded = out.getvalue()
+  if keepable and len(encoded) >= len(original):
+    return original, original_suffix
+  return encoded, suffix
+
+
+def _to_kindle_image(
+  raw: bytes, *, media_type: str, ext_hint: str, options: ImageOptions | None = None
+) -> tuple[bytes, str]:
+  """Convert to a format Kindle accepts: JPEG photos stay JPEG, everything
+  else becomes PNG (8-bit for flat images). GIFs are kept as they are, and so
+  are JPEGs and PNGs that no option changes or that re-encoding would not
+  make smaller."""
+
+  options = options or ImageOptions()
   media_type = media_type.lower()
   ext_hint = ext_hint.lower()
 
   if media_type == "image/svg+xml" or ext_hint == ".svg":
-    return _svg_to_png_bytes(raw), ".png"
-
-  if media_type == "image/gif" or ext_hint == ".gif":
+    raw = _svg_to_png_bytes(raw)
+  elif media_type == "image/gif" or ext_hint == ".gif":
     return raw, ".gif"
 
   try:
     with Image.open(io.BytesIO(raw)) as image:
-      image.load()
-      # Kindle accepts PNG/JPEG/GIF. Normalize everything else to PNG.
-      with io.BytesIO() as converted:
-        image.save(converted, format="PNG")
-        return converted.getvalue(), ".png"
+      return _encode(image, options, raw)
   except (UnidentifiedImageError, OSError) as exc:
     raise ValueError("unsupported image content") from exc
 
 
+@dataclass
+class ImageStats:
+  """What happened to the images of a run."""
+
+  converted: int = 0
+  # Downloaded size and converted size of the converted images.
+  original_bytes: int = 0
+  converted_bytes: int = 0
+  # (URL, downloaded bytes, converted bytes) per converted image.
+  sizes: list[tuple[str, int, int]] = field(default_factory=list)
+  # Downloads whose bytes matched an image already converted.
+  deduplicated: int = 0
+  saved_bytes: int = 0
+  # Images that could not be downloaded or converted, and how many later
+  # occurrences of them were answered from memory.
+  failed: int = 0
+  failure_hits: int = 0
+  # Downloads (or 304s) whose converted file was already in the store.
+  reused: int = 0
+  # Skipped by the probe stage: tiny per `width`/`height` attributes, on a
+  # denied host, tiny per a `Range` probe, or tiny once downloaded.
+  skipped_declared: int = 0
+  skipped_host: int = 0
+  skipped_probe: int = 0
+  skipped_small: int = 0
+  probe_requests: int = 0
+  # Bytes not downloaded thanks to probes (where the full size was known).
+  avoided_bytes: int = 0
+  # Re-encoded smaller to meet a book size budget.
+  shrunk: int = 0
+  shrink_saved_bytes: int = 0
+  _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+  def add(self, name: str, amount: int = 1) -> None:
+    with self._lock:
+      setattr(self, name, getattr(self, name) + amount)
+
+  def record(self, url: str, *, before: int, after: int) -> None:
+    with self._lock:
+      self.converted += 1
+      self.original_bytes += before
+      self.converted_bytes += after
+      self.sizes.append((url, before, after))
+
+
+# (scale, JPEG quality, PNG palette colors), mildest first.
+SHRINK_LEVELS: tuple[tuple[float, int, int], ...] = (
+  (1.0, 75, 256),
+  (0.8, 65, 128),
+  (0.65, 55, 64),
+  (0.5, 45, 32),
+  (0.35, 35, 16),
+)
+# Decoded bitmaps `ImageShrinker` keeps between levels; the largest images
+# are stepped down in turn, so a few cover most repeats.
+SHRINK_DECODED_IMAGES = 4
+
+
+class ImageShrinker:
+  """Re-encodes a book's converted images in place, smaller, to fit a budget.
+
+  `shrink` steps the currently largest image to its next `SHRINK_LEVELS`
+  entry until enough bytes are saved. Every level is encoded from the
+  converted file as it was before the first re-encode; the last
+  `SHRINK_DECODED_IMAGES` decoded images are kept, others are decoded again
+  when their turn comes. File names do not change, so chapters keep pointing
+  at them. GIFs are left alone.
+  """
+
+  def __init__(
+    self, assets_dir: Path, *, options: ImageOptions | None = None, stats: ImageStats | None = None
+  ) -> None:
+    self.options = options or ImageOptions()
+    self.stats = stats or ImageStats()
+    self._paths = sorted(path for path in Path(assets_dir).iterdir() if path.suffix in {".jpg", ".png"})
+    self._sizes = {path: path.stat().st_size for path in self._paths}
+    self._levels = {path: -1 for path in self._paths}
+    self._decoded: OrderedDict[Path, Image.Image] = OrderedDict()
+    # Converted files as they were before their first re-encode.
+    self._originals: dict[Path, bytes] = {}
+    self._shrunk: set[Path] = set()
+    self._heap = [(-size, str(path)) for path, size in self._sizes.items()]
+    heapq.heapify(self._heap)
+
+  def shrink(self, need: int) -> int:
+    """Save about `need` bytes, largest images first; returns the bytes saved.
+
+    Returns 0 once every image is at the last level.
+    """
+
+    saved = 0
+    while saved < need and self._heap:
+      _, key = heapq.heappop(self._heap)
+      path = Path(key)
+      level = self._levels[path] + 1
+      self._levels[path] = level
+      data = self._encode(path, SHRINK_LEVELS[level])
+      before = self._sizes[path]
+      if len(data) < before:
+        if path not in self._originals:
+          self._originals[path] = path.read_bytes()
+        path.write_bytes(data)
+        self._sizes[path] = len(data)
+        saved += before - len(data)
+        if path not in self._shrunk:
+          self._shrunk.add(path)
+          self.stats.add("shrunk")
+        self.stats.add("shrink_saved_bytes", before - len(data))
+      if level + 1 < len(SHRINK_LEVELS):
+        heapq.heappush(self._heap, (-self._sizes[path], key))
+      else:
+        self._decoded.pop(path, None)
+        self._originals.pop(path, None)
+    return saved
+
+  def _decoded_image(self, path: Path) -> Image.Image:
+    image = self._decoded.pop(path, None)
+    if image is None:
+      original = self._originals.get(path)
+      with Image.open(io.BytesIO(original) if original is not None else path) as opened:
+        has_alpha = opened.mode in {"RGBA", "LA", "PA"} or "transparency" in opened.info
+        image = opened.convert("RGBA" if has_alpha else "L" if opened.mode == "L" else "RGB")
+    self._decoded[path] = image
+    if len(self._decoded) > SHRINK_DECODED_IMAGES:
+      self._decoded.popitem(last=False)
+    return image
+
+  def _encode(self, path: Path, level: tuple[float, int, int]) -> bytes:
+    scale, quality, colors = level
+    image = self._decoded_image(path)
+    if scale < 1:
+      size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+      image = image.resize(size, Image.Resampling.LANCZOS)
+    with io.BytesIO() as out:
+      if path.suffix == ".jpg":
+        image.save(out, format="JPEG", quality=min(quality, self.options.jpeg_quality), optimize=True)
+      else:
+        method = Image.Quantize.FASTOCTREE if image.mode == "RGBA" else Image.Quantize.MEDIANCUT
+        image.quantize(colors=colors, method=method).save(out, format="PNG")
+      return out.getvalue()
+
+
+@dataclass(frozen=True)
+class StoredUrl:
+  """The stored file an image URL last resolved to, and how to revalidate it."""
+
+  name: str
+  etag: str | None = None
+  last_modified: str | None = None
+
+  def conditional_headers(self) -> dict[str, str]:
+    headers: dict[str, str] = {}
+    if self.etag:
+      headers["If-None-Match"] = self.etag
+    if self.last_modified:
+      headers["If-Modified-Since"] = self.last_modified
+    return headers
+
+
+class ImageStore:
+  """Converted images kept across runs, by the hash of their downloaded bytes.
+
+  Files are named like the book's assets (`img-<hash><suffix>`, the hash
+  covering the bytes and the conversion settings), so each image is
+  converted once per content and settings. `urls.json` maps each image URL
+  to its file and the `ETag`/`Last-Modified` it came with: later runs ask
+  with a conditional request and reuse the file on a `304`, while changed
+  images get a new hash and are converted again. Thread-safe.
+  """
+
+  def __init__(self, cache_dir: str | Path) -> None:
+    self.cache_dir = Path(cache_dir)
+    self.cache_dir.mkdir(parents=True, exist_ok=True)
+    self._lock = threading.Lock()
+    self._names = {path.stem: path.name for path in self.cache_dir.glob("img-*")}
+    self._urls_file = self.cache_dir / "urls.json"
+    try:
+      self._urls: dict[str, dict[str, Any]] = json.loads(self._urls_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+      self._urls = {}
+    self._dirty = False
+
+  def lookup(self, digest: str) -> Path | None:
+    with self._lock:
+      name = self._names.get(f"img-{digest}")
+    if name is None:
+      return None
+    path = self.cache_dir / name
+    return path if path.is_file() else None
+
+  def put(self, asset: Path) -> None:
+    path = self.cache_dir / asset.name
+    if not path.exists():
+      atomic_write(path, asset.read_bytes())
+    with self._lock:
+      self._names[asset.stem] = asset.name
+
+  def url(self, url: str, variant: str) -> StoredUrl | None:
+    """What `url` resolved to with the conversion settings `variant`, if still stored."""
+
+    with self._lock:
+      entry = self._urls.get(url)
+    if entry is None or entry.get("variant") != variant or not (self.cache_dir / entry["name"]).is_file():
+      return None
+    return StoredUrl(name=entry["name"], etag=entry.get("etag"), last_modified=entry.get("last_modified"))
+
+  def remember(self, url: str, variant: str, name: str, headers: Any) -> None:
+    entry = {
+      "name": name,
+      "variant": variant,
+      "etag": headers.get("ETag") or headers.get("etag"),
+      "last_modified": headers.get("Last-Modified") or headers.get("last-modified"),
+    }
+    with self._lock:
+      if self._urls.get(url) != entry:
+        self._urls[url] = entry
+        self._dirty = True
+
+  def save(self) -> None:
+    """Persist the URL map (processors call this on `close`)."""
+
+    with self._lock:
+      if not self._dirty:
+        return
+      data = json.dumps(self._urls, sort_keys=True).encode("utf-8")
+      self._dirty = False
+    atomic_write(self._urls_file, data)
+
+
 class KindleImageProcessor:
+  """Downloads images and rewrites their `src` to Kindle-safe local copies.
+
+  `rewrite` works on its own, one image at a time. Calling `prefetch` first
+  with the image URLs of upcoming chapters downloads them on `workers`
+  threads and runs the conversions in up to `processes` worker processes
+  (0 converts on the download threads), so `rewrite` only waits for a
+  result that is usually ready. The output is the same either way. `pool`
+  and `convert_pool` replace those with executors shared by several
+  processors (one per book of a batch); `close` leaves them running.
+
+  Assets are named by a hash of the downloaded bytes, so the same image
+  under several URLs is converted and embedded once. Failed URLs are
+  remembered for the rest of the run.
+
+  With `probe`, images on denied hosts are dropped before they are
+  downloaded, and so is each `<img>` whose declared size is too small (see
+  `rewrite`). `probe_session` is used for the
+  optional `Range` probes; it must not cache or record responses, and images
+  already in `http_cache` are not probed.
+  """
+
   def __init__(
     self,
     *,
     assets_dir: Path,
-    session: requests.Session | None = None,
+    session: requests.Session | LimitedSession | CachingSession | None = None,
     timeout_s: int = 30,
+    workers: int = 0,
+    processes: int = 0,
+    store: ImageStore | None = None,
+    stats: ImageStats | None = None,
+    options: ImageOptions | None = None,
+    probe: ProbeOptions | None = None,
+    probe_session: Any = None,
+    http_cache: HttpCache | None = None,
+    pool: ThreadPoolExecutor | None = None,
+    convert_pool: ProcessPoolExecutor | None = None,
   ) -> None:
     self.assets_dir = Path(assets_dir)
     self.assets_dir.mkdir(parents=True, exist_ok=True)
-    self._session = session or requests.Session()
+    self._session = session or LimitedSession(new_session(), DownloadBudget(), kind="image")
     self._timeout_s = timeout_s
+    self._workers = workers
+    self._processes = processes
+    self._store = store
+    self.options = options or ImageOptions()
+    self.stats = stats or ImageStats()
+    self._probe = probe
+    self._probe_session = probe_session
+    self._http_cache = http_cache
+    self._lock = threading.Lock()
+    # URLs some `<img>` gives a usable size; they need no `Range` probe.
+    self._sized: set[str] = set()
+    self._skipped: set[str] = set()
+    # URL -> asset path, None for failures.
     self._cache: dict[str, str | None] = {}
+    # Hash of the downloaded bytes -> asset name, None if conversion failed.
+    self._by_digest: dict[str, str | None] = {}
+    self._pending: dict[str, Future[str | None]] = {}
+    self._shared = (pool, convert_pool)
+    self._pool = pool
+    self._convert_pool = convert_pool
 
-  def rewrite(self, src: str, base_url: str) -> str | None:
-    raw_src = src.strip()
-    if not raw_src:
-      return None
-    if raw_src.startswith(("data:", "cid:")):
-      return None
+  def __enter__(self) -> KindleImageProcessor:
+    return self
+
+  def __exit__(self, *exc: object) -> None:
+    self.close()
 
-    abs_url = urljoin(base_url, raw_src)
-    parsed = urlparse(abs_url)
-    if parsed.scheme not in {"http", "https"}:
+  def close(self) -> None:
+    with self._lock:
+      pool, self._pool = self._pool, None
+      convert_pool, self._convert_pool = self._convert_pool, None
+      pending = list(self._pending.values())
+      self._pending.clear()
+    for future in pending:
+      future.cancel()
+    # Shared pools keep running, so wait for this processor's own downloads.
+    wait(pending)
+    if pool is not None and pool is not self._shared[0]:
+      pool.shutdown(wait=True)
+    if convert_pool is not None and convert_pool is not self._shared[1]:
+      convert_pool.shutdown(wait=True)
+    if self._store is not None:
+      self._store.save()
+
+  def too_small(self, size: tuple[int, int] | None) -> bool:
+    """Whether an `<img>` declaring `size` (width, height) is dropped unfetched."""
+
+    return self._probe is not None and size is not None and _too_small(None, size, self._probe)
+
+  def declare(self, src: str, base_url: str, size: tuple[int, int] | None) -> None:
+    """Note the `width`/`height` an `<img>` declares, before it is fetched.
+
+    Only decides whether a `Range` probe is needed; whether an `<img>` is
+    dropped depends on its own size alone (see `rewrite`).
+    """
+
+    abs_url = _resolve(src, base_url)
+    if abs_url is None or size is None or self.too_small(size):
+      return
+    with self._lock:
+      self._sized.add(abs_url)
+
+  def prefetch(self, srcs: Iterable[str], base_url: str) -> None:
+    """Start downloading and converting `srcs` in the background."""
+
+    if self._workers <= 0:
+      return
+    for src in srcs:
+      abs_url = _resolve(src, base_url)
+      if abs_url is None:
+        continue
+      with self._lock:
+        if abs_url in self._cache or abs_url in self._pending:
+          continue
+        if self._pool is None:
+          self._pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="docs2epub-images")
+        self._pending[abs_url] = self._pool.submit(self._download_and_convert, abs_url)
+
+  def rewrite(self, src: str, base_url: str, size: tuple[int, int] | None = None) -> str | None:
+    """The local path for `src`, or None to drop the `<img>`.
+
+    `size` is the `width`/`height` this `<img>` declares; a small one drops
+    this occurrence only, other uses of the same URL are kept.
+    """
+
+    abs_url = _resolve(src, base_url)
+    if abs_url is None:
+      return None
+    if self.too_small(size):
+      self.stats.add("skipped_declared")
       return None
 
-    cached = self._cache.get(abs_url)
-    if cached is not None:
+    with self._lock:
+      known = abs_url in self._cache
+      cached = self._cache.get(abs_url)
+      future = self._pending.pop(abs_url, None)
+    if known:
+      if cached is None and abs_url not in self._skipped:
+        self.stats.add("failure_hits")
       return cached
 
-    rel = self._download_and_convert(abs_url)
-    self._cache[abs_url] = rel
+    rel = future.result() if future is not None else self._download_and_convert(abs_url)
+    with self._lock:
+      self._cache[abs_url] = rel
     return rel
 
   def _download_and_convert(self, abs_url: str) -> str | None:
+    if self._probe is not None and self._skip_before_download(abs_url, self._probe):
+      return None
+
+    stored = self._store.url(abs_url, self.options.variant) if self._store is not None else None
     try:
-      response = self._session.get(abs_url, timeout=self._timeout_s)
+      if stored is not None:
+        response = self._session.get(abs_url, timeout=self._timeout_s, headers=stored.conditional_headers())
+        if response.status_code == 304:
+          self.stats.add("reused")
+          return f"{self.assets_dir.name}/{self._use_stored(self._store.cache_dir / stored.name)}"
+      else:
+        response = self._session.get(abs_url, timeout=self._timeout_s)
       response.raise_for_status()
+      raw = response.content
     except requests.RequestException:
+      self.stats.add("failed")
       return None
 
+    name = self._asset(abs_url, raw, response)
+    if name is None:
+      return None
+    if self._store is not None:
+      self._store.remember(abs_url, self.options.variant, name, response.headers)
+    return f"{self.assets_dir.name}/{name}"
+
+  def _asset(self, abs_url: str, raw: bytes, response: requests.Response) -> str | None:
+    """The asset name for downloaded bytes: deduplicated, from the store, or converted."""
+
+    if self._probe is not None and _too_small(len(raw), image_size(raw), self._probe):
+      self._skip(abs_url, "skipped_small")
+      return None
+
+    digest = hashlib.sha256(self.options.variant.encode("utf-8") + b"\0" + raw).hexdigest()[:16]
+    with self._lock:
+      seen = digest in self._by_digest
+      name = self._by_digest.get(digest)
+    if seen:
+      if name is None:
+        self.stats.add("failed")
+        return None
+      asset = self.assets_dir / name
+      self.stats.add("deduplicated")
+      self.stats.add("saved_bytes", asset.stat().st_size)
+      return name
+
+    stored = self._store.lookup(digest) if self._store is not None else None
+    if stored is not None:
+      self.stats.add("reused")
+      return self._use_stored(stored)
+
     media_type = str(response.headers.get("content-type") or "").split(";", 1)[0].strip()
     ext_hint = Path(urlparse(abs_url).path).suffix
 
     try:
-      converted, suffix = _to_kindle_image(response.content, media_type=media_type, ext_hint=ext_hint)
+      converted, suffix = self._convert(raw, media_type=media_type, ext_hint=ext_hint)
     except Exception:
+      with self._lock:
+        self._by_digest[digest] = None
+      self.stats.add("failed")
       return None
 
-    digest = hashlib.sha256(abs_url.encode("utf-8")).hexdigest()[:16]
     name = f"img-{digest}{suffix}"
     out_file = self.assets_dir / name
     if not out_file.exists():
       out_file.write_bytes(converted)
-    return f"{self.assets_dir.name}/{name}"
+    with self._lock:
+      self._by_digest[digest] = name
+    self.stats.record(abs_url, before=len(raw), after=len(converted))
+    if self._store is not None:
+      self._store.put(out_file)
+    return name
+
+  def _use_stored(self, stored: Path) -> str:
+    """Copy a converted file from the store into the book's assets; its name."""
+
+    out_file = self.assets_dir / stored.name
+    if not out_file.exists():
+      out_file.write_bytes(stored.read_bytes())
+    with self._lock:
+      self._by_digest[stored.stem.removeprefix("img-")] = stored.name
+    return stored.name
+
+  def _skip(self, abs_url: str, reason: str) -> None:
+    with self._lock:
+      self._skipped.add(abs_url)
+    self.stats.add(reason)
+
+  def _skip_before_download(self, abs_url: str, probe: ProbeOptions) -> bool:
+    if denied_host(abs_url, probe.deny_hosts):
+      self._skip(abs_url, "skipped_host")
+      return True
+    with self._lock:
+      sized = abs_url in self._sized
+    if sized or not probe.network or self._probe_session is None:
+      return False
+    if self._http_cache is not None and self._http_cache.lookup(abs_url) is not None:
+      return False
+    result = probe_image(self._probe_session, abs_url, limit=probe.probe_bytes, timeout=self._timeout_s)
+    self.stats.add("probe_requests")
+    if result is None or not _too_small(result.total_bytes, result.size, probe):
+      return False
+    self._skip(abs_url, "skipped_probe")
+    if result.total_bytes is not None:
+      self.stats.add("avoided_bytes", max(0, result.total_bytes - result.read_bytes))
+    return True
+
+  def _convert(self, raw: bytes, *, media_type: str, ext_hint: str) -> tuple[bytes, str]:
+    pool = self._converter()
+    if pool is None:
+      return _to_kindle_image(raw, media_type=media_type, ext_hint=ext_hint, options=self.options)
+    try:
+      return pool.submit(
+        _to_kindle_image, raw, media_type=media_type, ext_hint=ext_hint, options=self.options
+      ).result()
+    except BrokenExecutor:
+      return _to_kindle_image(raw, media_type=media_type, ext_hint=ext_hint, options=self.options)
+
+  def _converter(self) -> ProcessPoolExecutor | None:
+    if self._processes <= 0:
+      return None
+    with self._lock:
+      if self._convert_pool is None:
+        self._convert_pool = conversion_pool(self._processes)
+      return self._convert_pool
+
+
+def conversion_pool(processes: int) -> ProcessPoolExecutor:
+  """Worker processes for `_to_kindle_image`."""
+
+  # Spawned, not forked: the parent already runs download threads.
+  return ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _too_small(size_bytes: int | None, size: tuple[int, int] | None, probe: ProbeOptions) -> bool:
+  if size_bytes is not None and size_bytes < probe.min_bytes:
+    return True
+  return size is not None and size[0] * size[1] < probe.min_pixels
+
+
+def _resolve(src: str, base_url: str) -> str | None:
+  raw_src = src.strip()
+  if not raw_src:
+    return None
+  if raw_src.startswith(("data:", "cid:")):
+    return None
+
+  abs_url = urljoin(base_url, raw_src)
+  parsed = urlparse(abs_url)
+  if parsed.scheme not in {"http", "https"}:
+    return None
+  return abs_url
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import mimetypes
+import posixpath
+import zipfile
+from pathlib import Path
+from typing import Any
+from urllib.parse import unquote, urlparse
+
+import requests
+
+from .transport import make_response
+
+
+def site_root_url(start_url: str) -> str:
+  """Default URL of an export's root: the start URL's origin."""
+
+  parsed = urlparse(start_url)
+  return f"{parsed.scheme}://{parsed.netloc}/"
+
+
+class LocalSiteSession:
+  """Serves a built static site (a directory or .zip) in place of HTTP.
+
+  URLs under `site_url` map to files under the export's root, the way a
+  static web server would: `/docs/intro` is tried as `docs/intro`,
+  `docs/intro.html` and `docs/intro/index.html`. Everything else, including
+  images on other hosts, is a 404, so builds never touch the network.
+
+  A zip whose entries all sit under one top-level directory (`build/...`)
+  is served from that directory. Each process must open its own session.
+  """
+
+  def __init__(self, source: str | Path, *, site_url: str) -> None:
+    self.source = Path(source).expanduser()
+    parsed = urlparse(site_url)
+    self._origin = parsed.netloc.lower()
+    self._prefix = (parsed.path or "/").rstrip("/") + "/"
+    self.headers: dict[str, str] = {}
+    self._zip: zipfile.ZipFile | None = None
+    self._zip_names: set[str] = set()
+    self._zip_root = ""
+    if self.source.is_file():
+      self._zip = zipfile.ZipFile(self.source)
+      names = [name for name in self._zip.namelist() if not name.endswith("/")]
+      tops = {name.split("/", 1)[0] for name in names}
+      if len(tops) == 1 and all("/" in name for name in names):
+        self._zip_root = f"{tops.pop()}/"
+      self._zip_names = set(names)
+    elif not self.source.is_dir():
+      raise FileNotFoundError(f"{self.source} is neither a directory nor a zip archive")
+
+  def close(self) -> None:
+    if self._zip is not None:
+      self._zip.close()
+
+  def get(self, url: str, timeout: float = 30, **kwargs: Any) -> requests.Response:
+    for rel in self._candidates(url):
+      body = self._read(rel)
+      if body is not None:
+        media_type = mimetypes.guess_type(rel)[0] or "application/octet-stream"
+        return make_response(url, status=200, body=body, headers=_headers(body, media_type))
+    return make_response(url, status=404, body=b"Not found", headers=_headers(b"Not found", "text/plain"))
+
+  def _candidates(self, url: str) -> list[str]:
+    parsed = urlparse(url)
+    path = unquote(parsed.path or "/")
+    if parsed.netloc.lower() != self._origin or not (path + "/").startswith(self._prefix):
+      return []
+    rel = path[len(self._prefix) :] if len(path) >= len(self._prefix) else ""
+    if rel == "" or rel.endswith("/"):
+      candidates = [f"{rel}index.html"]
+    else:
+      candidates = [rel, f"{rel}.html", f"{rel}/index.html"]
+    # Never serve files outside the export.
+    return [
+      norm
+      for norm in (posixpath.normpath(candidate) for candidate in candidates)
+      if not norm.startswith("../") and norm != ".." and not norm.startswith("/")
+    ]
+
+  def _read(self, rel: str) -> bytes | None:
+    if self._zip is not None:
+      name = self._zip_root + rel
+      return self._zip.read(name) if name in self._zip_names else None
+    file = self.source / rel
+    return file.read_bytes() if file.is_file() else None
+
+
+def _headers(body: bytes, media_type: str) -> dict[str, str]:
+  return {"Content-Type": media_type, "Content-Length": str(len(body))}
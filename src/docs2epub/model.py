@@ -1,6 +1,49 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Any
+
+from bs4 import Tag
+
+
+class LazyHtml:
+  """Dataclass field holding HTML markup, or serializing `tree` on access.
+
+  Left unset (None), the field reads as `tree.decode_contents()` whenever a
+  string is actually needed (caches, checkpoints), so a page parsed by the
+  crawler is not serialized up front nor kept twice in memory. The string is
+  kept after the first access; whoever transforms the tree in place calls
+  `forget` so the next access reads the result.
+  """
+
+  def __set_name__(self, owner: type, name: str) -> None:
+    self._attr = f"_{name}"
+    self._serialized = f"_{name}_serialized"
+
+  def __get__(self, obj: Any, owner: type | None = None) -> str | None:
+    if obj is None:
+      # The dataclass default.
+      return None
+    html = obj.__dict__.get(self._attr)
+    if html is not None or obj.tree is None:
+      return html
+    serialized = obj.__dict__.get(self._serialized)
+    if serialized is None:
+      serialized = obj.__dict__[self._serialized] = obj.tree.decode_contents()
+    return serialized
+
+  def __set__(self, obj: Any, value: str | None) -> None:
+    obj.__dict__[self._attr] = value
+
+  def forget(self, obj: Any) -> None:
+    obj.__dict__.pop(self._serialized, None)
+
+  def share(self, source: Any, obj: Any) -> None:
+    """Let `obj` reuse what `source`, holding the same tree, serialized."""
+
+    serialized = source.__dict__.get(self._serialized)
+    if serialized is not None and source.tree is obj.tree:
+      obj.__dict__[self._serialized] = serialized
 
 
 @dataclass(frozen=True)
@@ -8,4 +51,17 @@ class Chapter:
   index: int
   title: str
   url: str
-  html: str
+  # Serialized from `tree` on access when not given (see `LazyHtml`).
+  html: str = LazyHtml()  # type: ignore[assignment]
+  image_urls: tuple[str, ...] = ()
+  # The page's `chapter_cache.artifact_key`, when the chapter cache is on.
+  key: str | None = None
+  # The crawler's already-cleaned article tree, when it still has one.
+  # Builders transform it in place instead of parsing `html` again, then
+  # call `tree_changed`; it is None for chapters restored from a cache.
+  tree: Tag | None = field(default=None, compare=False, repr=False)
+
+  def tree_changed(self) -> None:
+    """Drop the `html` serialized from `tree` before it was transformed."""
+
+    vars(Chapter)["html"].forget(self)
@@ -1,15 +1,32 @@
 from __future__ import annotations
 
+import os
 import shutil
 import subprocess
 import tempfile
-from dataclasses import dataclass
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, replace
 from pathlib import Path
-from typing import Iterable
+from typing import Callable, Iterable
 
-from .kindle_html import clean_html_for_kindle_epub2
-from .kindle_images import KindleImageProcessor
+import requests
+
+from .chapter_cache import ChapterCache, CleanedChapter, artifact_key
+from .http_cache import CachingSession, HttpCache
+from .image_probe import ProbeOptions
+from .kindle_html import clean_html_for_kindle_epub2, declared_size, parse_fragment
+from .kindle_images import (
+  ImageOptions,
+  ImageShrinker,
+  ImageStats,
+  ImageStore,
+  KindleImageProcessor,
+  conversion_pool,
+)
 from .model import Chapter
+from .transport import DownloadBudget, LimitedSession, new_session
+from .warc import RecordingSession, WarcWriter
 
 
 @dataclass(frozen=True)
@@ -18,6 +35,114 @@ class PandocEpub2Options:
   toc_depth: int = 2
   split_level: int = 1
   keep_images: bool = True
+  images: ImageOptions = ImageOptions()
+  probe: ProbeOptions = ProbeOptions()
+  # Target size of the EPUB; images are re-encoded smaller until it fits.
+  max_bytes: int | None = None
+  # Images download on threads and convert in processes (None: up to 4, by CPU count).
+  image_workers: int = 8
+  image_processes: int | None = None
+  # Chapters read ahead so their images are fetched while earlier ones are cleaned.
+  image_lookahead: int = 8
+
+
+def _image_processes(opts: PandocEpub2Options) -> int:
+  if opts.image_processes is not None:
+    return opts.image_processes
+  return min(4, os.cpu_count() or 1)
+
+
+def shared_image_pools(opts: PandocEpub2Options) -> tuple[ThreadPoolExecutor | None, ProcessPoolExecutor | None]:
+  """Image download and conversion pools for several builds at once.
+
+  Pass them to each `build_epub2_with_pandoc` call so `image_workers` and
+  `image_processes` bound all of the builds together; the caller shuts them
+  down.
+  """
+
+  if not opts.keep_images:
+    return None, None
+  pool = None
+  if opts.image_workers > 0:
+    pool = ThreadPoolExecutor(max_workers=opts.image_workers, thread_name_prefix="docs2epub-images")
+  processes = _image_processes(opts)
+  return pool, conversion_pool(processes) if processes > 0 else None
+
+
+# Bump whenever `clean_html_for_kindle_epub2` output changes so cached
+# chapter bodies are not reused across incompatible versions.
+KINDLE_PIPELINE_VERSION = "1"
+
+
+def _read_ahead(
+  chapters: Iterable[Chapter],
+  image_processor: KindleImageProcessor | None,
+  lookahead: int,
+  cached: Callable[[Chapter], CleanedChapter | None] | None = None,
+) -> Iterable[tuple[Chapter, CleanedChapter | None]]:
+  """Yield `chapters` in order, prefetching images up to `lookahead` chapters ahead.
+
+  Each comes with its `cached` body, if any. Other chapters without a tree
+  are parsed here (once; cleaning reuses the tree) so the `width`/`height`
+  of each image is known before it is fetched.
+  """
+
+  window: deque[tuple[Chapter, CleanedChapter | None]] = deque()
+  for ch in chapters:
+    cleaned = cached(ch) if cached is not None else None
+    if image_processor is not None:
+      if cleaned is not None:
+        images = [(src, size) for src, size, _ in cleaned.images]
+      else:
+        if ch.tree is None:
+          ch = replace(ch, tree=parse_fragment(ch.html))
+        images = [(str(img.get("src") or ""), declared_size(img)) for img in ch.tree.find_all("img")]
+      srcs: list[str] = []
+      for src, size in images:
+        if not src:
+          continue
+        image_processor.declare(src, ch.url, size)
+        if not image_processor.too_small(size):
+          srcs.append(src)
+      image_processor.prefetch(srcs, ch.url)
+    window.append((ch, cleaned))
+    if len(window) > lookahead:
+      yield window.popleft()
+  yield from window
+
+
+def _clean_chapter(
+  ch: Chapter,
+  cached: CleanedChapter | None,
+  *,
+  keep_images: bool,
+  image_processor: KindleImageProcessor | None,
+) -> CleanedChapter:
+  """The chapter's Kindle XHTML: `cached` if its images still resolve the same."""
+
+  if cached is not None:
+    if image_processor is None:
+      if not cached.images:
+        return cached
+    elif all(image_processor.rewrite(src, ch.url, size) == out for src, size, out in cached.images):
+      return cached
+
+  images: list[tuple[str, tuple[int, int] | None, str | None]] = []
+
+  def rewrite(src: str, base_url: str, size: tuple[int, int] | None = None) -> str | None:
+    out = image_processor.rewrite(src, base_url, size)
+    images.append((src, size, out))
+    return out
+
+  xhtml = clean_html_for_kindle_epub2(
+    ch.tree if ch.tree is not None else ch.html,
+    keep_images=keep_images,
+    base_url=ch.url,
+    image_rewriter=rewrite if image_processor is not None else None,
+  )
+  if ch.tree is not None:
+    ch.tree_changed()
+  return CleanedChapter(xhtml=xhtml, images=tuple(images))
 
 
 def _wrap_html(title: str, body_html: str) -> str:
@@ -56,6 +181,29 @@ def _summarize_pandoc_warnings(stderr: str) -> str:
   return "\n".join(parts)
 
 
+def _run_pandoc(cmd: list[str], *, cwd: Path, verbose: bool, report: bool = True) -> None:
+  proc = subprocess.run(
+    cmd,
+    stdout=subprocess.PIPE,
+    stderr=subprocess.PIPE,
+    text=True,
+    cwd=cwd,
+  )
+
+  if proc.returncode != 0:
+    # On failure, always show stderr.
+    raise RuntimeError(f"pandoc failed (exit {proc.returncode}):\n{proc.stderr.strip()}")
+
+  if not report:
+    return
+  if verbose and proc.stderr.strip():
+    print(proc.stderr.strip())
+  elif proc.stderr.strip():
+    summary = _summarize_pandoc_warnings(proc.stderr)
+    if summary:
+      print(summary)
+
+
 def build_epub2_with_pandoc(
   *,
   chapters: Iterable[Chapter],
@@ -67,6 +215,15 @@ def build_epub2_with_pandoc(
   identifier: str | None,
   verbose: bool,
   options: PandocEpub2Options | None = None,
+  http_cache: HttpCache | None = None,
+  session: requests.Session | None = None,
+  budget: DownloadBudget | None = None,
+  warc: WarcWriter | None = None,
+  image_store: ImageStore | None = None,
+  image_stats: ImageStats | None = None,
+  image_pool: ThreadPoolExecutor | None = None,
+  convert_pool: ProcessPoolExecutor | None = None,
+  chapter_cache: ChapterCache | None = None,
 ) -> Path:
   pandoc = shutil.which("pandoc")
   if not pandoc:
@@ -81,20 +238,59 @@ def build_epub2_with_pandoc(
 
   with tempfile.TemporaryDirectory(prefix="docs2epub-pandoc-") as tmp:
     tmp_path = Path(tmp)
-    image_processor = KindleImageProcessor(assets_dir=tmp_path / "assets") if opts.keep_images else None
+    image_processor = None
+    if opts.keep_images:
+      session = session or new_session()
+      # Probes bypass the cache and the WARC: a partial body is not the image.
+      probe_session = session if isinstance(session, requests.Session) else None
+      # Bodies are capped before the cache stores them.
+      session = LimitedSession(session, budget or DownloadBudget(), kind="image")
+      if http_cache is not None:
+        session = CachingSession(session, http_cache)
+      if warc is not None:
+        session = RecordingSession(session, warc)
+      image_processor = KindleImageProcessor(
+        assets_dir=tmp_path / "assets",
+        session=session,
+        workers=opts.image_workers,
+        processes=_image_processes(opts),
+        store=image_store,
+        stats=image_stats,
+        options=opts.images,
+        probe=opts.probe,
+        probe_session=probe_session,
+        http_cache=http_cache,
+        pool=image_pool,
+        convert_pool=convert_pool,
+      )
 
-    html_files: list[str] = []
-    for ch in chapters:
-      cleaned = clean_html_for_kindle_epub2(
-        ch.html,
-        keep_images=opts.keep_images,
-        base_url=ch.url,
-        image_rewriter=image_processor.rewrite if image_processor is not None else None,
+    def cache_key(ch: Chapter) -> str | None:
+      if chapter_cache is None or ch.key is None:
+        return None
+      return artifact_key(
+        ch.key.encode("ascii"),
+        pipeline_version=KINDLE_PIPELINE_VERSION,
+        context=("epub2", str(opts.keep_images)),
       )
-      html_doc = _wrap_html(ch.title, cleaned)
-      fp = tmp_path / f"chapter_{ch.index:04d}.html"
-      fp.write_text(html_doc, encoding="utf-8")
-      html_files.append(fp.name)
+
+    def cached(ch: Chapter) -> CleanedChapter | None:
+      key = cache_key(ch)
+      return chapter_cache.get_cleaned(key) if chapter_cache is not None and key is not None else None
+
+    html_files: list[str] = []
+    try:
+      for ch, hit in _read_ahead(chapters, image_processor, opts.image_lookahead, cached):
+        cleaned = _clean_chapter(ch, hit, keep_images=opts.keep_images, image_processor=image_processor)
+        key = cache_key(ch)
+        if chapter_cache is not None and key is not None and cleaned is not hit:
+          chapter_cache.put_cleaned(key, cleaned)
+        html_doc = _wrap_html(ch.title, cleaned.xhtml)
+        fp = tmp_path / f"chapter_{ch.index:04d}.html"
+        fp.write_text(html_doc, encoding="utf-8")
+        html_files.append(fp.name)
+    finally:
+      if image_processor is not None:
+        image_processor.close()
 
     cmd: list[str] = [
       pandoc,
@@ -127,23 +323,19 @@ def build_epub2_with_pandoc(
     cmd.extend(["-o", str(out_path)])
     cmd.extend(html_files)
 
-    proc = subprocess.run(
-      cmd,
-      stdout=subprocess.PIPE,
-      stderr=subprocess.PIPE,
-      text=True,
-      cwd=tmp_path,
-    )
-
-    if proc.returncode != 0:
-      # On failure, always show stderr.
-      raise RuntimeError(f"pandoc failed (exit {proc.returncode}):\n{proc.stderr.strip()}")
+    _run_pandoc(cmd, cwd=tmp_path, verbose=verbose)
 
-    if verbose and proc.stderr.strip():
-      print(proc.stderr.strip())
-    elif proc.stderr.strip():
-      summary = _summarize_pandoc_warnings(proc.stderr)
-      if summary:
-        print(summary)
+    if opts.max_bytes is not None and image_processor is not None:
+      shrinker = ImageShrinker(tmp_path / "assets", options=opts.images, stats=image_processor.stats)
+      size = out_path.stat().st_size
+      while size > opts.max_bytes and shrinker.shrink(size - opts.max_bytes):
+        # Same warnings as the first run.
+        _run_pandoc(cmd, cwd=tmp_path, verbose=verbose, report=False)
+        size = out_path.stat().st_size
+      if size > opts.max_bytes:
+        print(
+          f"EPUB is {size / (1024 * 1024):.2f} MB, over the {opts.max_bytes / (1024 * 1024):.2f} MB "
+          "budget even with images at the lowest quality"
+        )
 
   return out_path
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+
+# Rate (requests/s) a host drops to when it throttles us while unlimited.
+_BACKOFF_START_RATE = 2.0
+_MAX_RETRY_AFTER_S = 120.0
+
+
+@dataclass
+class _HostState:
+  rate: float
+  cap: float
+  tokens: float = 1.0
+  refilled_at: float = 0.0
+  blocked_until: float = 0.0
+  requests: int = 0
+  throttled: int = 0
+  first_request_at: float | None = None
+  last_request_at: float | None = None
+
+
+@dataclass(frozen=True)
+class HostRateSummary:
+  host: str
+  requests: int
+  throttled: int
+  effective_rate: float
+  final_rate: float
+
+
+@dataclass
+class HostRateLimiter:
+  """Per-host token bucket with AIMD rate adaptation.
+
+  Each host starts at `initial_rate` requests/s (`math.inf` for no delay).
+  Fast responses grow the rate additively up to `max_rate` (or the host's
+  robots.txt `Crawl-delay`); 429/503 responses halve it and pause the host
+  for `Retry-After` seconds.
+  """
+
+  initial_rate: float = 2.0
+  max_rate: float | None = 8.0
+  min_rate: float = 0.1
+  additive_step: float = 0.5
+  decrease_factor: float = 0.5
+  latency_target_s: float = 1.0
+  robots_loader: Callable[[str], float | None] | None = None
+  clock: Callable[[], float] = time.monotonic
+  sleep: Callable[[float], None] = time.sleep
+  _hosts: dict[str, _HostState] = field(default_factory=dict, init=False, repr=False)
+  _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+  def _state(self, host: str) -> _HostState:
+    state = self._hosts.get(host)
+    if state is not None:
+      return state
+
+    cap = self.max_rate if self.max_rate is not None else math.inf
+    rate = min(self.initial_rate, cap)
+    state = _HostState(rate=rate, cap=cap, refilled_at=self.clock())
+    self._hosts[host] = state
+    return state
+
+  def _load_crawl_delay(self, host: str, url: str) -> None:
+    if self.robots_loader is None:
+      return
+    parsed = urlparse(url)
+    delay = self.robots_loader(f"{parsed.scheme}://{parsed.netloc}/robots.txt")
+    if delay is None or delay <= 0:
+      return
+    with self._lock:
+      state = self._state(host)
+      state.cap = min(state.cap, 1.0 / delay)
+      state.rate = min(state.rate, state.cap)
+
+  def acquire(self, url: str) -> None:
+    host = urlparse(url).netloc.lower()
+    with self._lock:
+      is_new = host not in self._hosts
+      self._state(host)
+    if is_new:
+      self._load_crawl_delay(host, url)
+
+    while True:
+      with self._lock:
+        state = self._hosts[host]
+        now = self.clock()
+        if math.isinf(state.rate):
+          wait = state.blocked_until - now
+        else:
+          elapsed = max(0.0, now - state.refilled_at)
+          state.tokens = min(1.0, state.tokens + elapsed * state.rate)
+          state.refilled_at = now
+          wait = max(state.blocked_until - now, (1.0 - state.tokens) / state.rate)
+        if wait <= 0:
+          if not math.isinf(state.rate):
+            state.tokens -= 1.0
+          state.requests += 1
+          if state.first_request_at is None:
+            state.first_request_at = now
+          state.last_request_at = now
+          return
+      self.sleep(wait)
+
+  def record(
+    self,
+    url: str,
+    *,
+    latency_s: float,
+    throttled: bool = False,
+    retry_after_s: float | None = None,
+  ) -> None:
+    host = urlparse(url).netloc.lower()
+    with self._lock:
+      state = self._state(host)
+      if throttled:
+        state.throttled += 1
+        if math.isinf(state.rate):
+          state.rate = min(_BACKOFF_START_RATE, state.cap)
+        else:
+          state.rate = max(self.min_rate, state.rate * self.decrease_factor)
+        pause = retry_after_s if retry_after_s is not None else 1.0 / state.rate
+        state.blocked_until = max(state.blocked_until, self.clock() + min(pause, _MAX_RETRY_AFTER_S))
+        state.tokens = min(state.tokens, 0.0)
+        return
+      if latency_s <= self.latency_target_s and not math.isinf(state.rate):
+        state.rate = min(state.cap, state.rate + self.additive_step)
+
+  def summaries(self) -> list[HostRateSummary]:
+    with self._lock:
+      out: list[HostRateSummary] = []
+      for host, state in sorted(self._hosts.items()):
+        span = 0.0
+        if state.first_request_at is not None and state.last_request_at is not None:
+          span = state.last_request_at - state.first_request_at
+        effective = (state.requests - 1) / span if span > 0 else 0.0
+        out.append(
+          HostRateSummary(
+            host=host,
+            requests=state.requests,
+            throttled=state.throttled,
+            effective_rate=effective,
+            final_rate=state.rate,
+          )
+        )
+      return out
+
+
+def parse_retry_after(value: str | None, *, now: datetime | None = None) -> float | None:
+  if not value:
+    return None
+  value = value.strip()
+  try:
+    return max(0.0, float(value))
+  except ValueError:
+    pass
+  try:
+    when = parsedate_to_datetime(value)
+  except (TypeError, ValueError):
+    return None
+  if when.tzinfo is None:
+    when = when.replace(tzinfo=timezone.utc)
+  current = now or datetime.now(timezone.utc)
+  return max(0.0, (when - current).total_seconds())
+
+
+def parse_crawl_delay(robots_txt: str, *, user_agent: str) -> float | None:
+  parser = RobotFileParser()
+  parser.parse(robots_txt.splitlines())
+  delay = parser.crawl_delay(user_agent)
+  if delay is None:
+    return None
+  return float(delay)
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import gzip
+import io
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from urllib.parse import urljoin, urlparse
+
+from lxml import etree
+
+
+_MAX_SITEMAP_BYTES = 50 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class SitemapEntry:
+  url: str
+  lastmod: datetime | None = None
+
+
+def _local_name(tag: object) -> str:
+  if not isinstance(tag, str):
+    return ""
+  return tag.rsplit("}", 1)[-1].lower()
+
+
+def parse_lastmod(value: str | None) -> datetime | None:
+  if not value:
+    return None
+  text = value.strip()
+  if text.endswith("Z"):
+    text = f"{text[:-1]}+00:00"
+  try:
+    parsed = datetime.fromisoformat(text)
+  except ValueError:
+    return None
+  if parsed.tzinfo is None:
+    parsed = parsed.replace(tzinfo=timezone.utc)
+  return parsed
+
+
+def parse_sitemap(raw: bytes) -> tuple[list[SitemapEntry], list[str]]:
+  """Parse a sitemap or sitemap index.
+
+  Returns the page entries and the URLs of child sitemaps. Gzipped input is
+  detected by its magic bytes, since servers rarely label `.xml.gz` correctly.
+  """
+
+  if raw[:2] == b"\x1f\x8b":
+    with gzip.GzipFile(fileobj=io.BytesIO(raw)) as fh:
+      raw = fh.read(_MAX_SITEMAP_BYTES + 1)
+    if len(raw) > _MAX_SITEMAP_BYTES:
+      raise ValueError("sitemap exceeds size limit")
+
+  parser = etree.XMLParser(resolve_entities=False, no_network=True, recover=True)
+  try:
+    root = etree.fromstring(raw, parser=parser)
+  except etree.XMLSyntaxError:
+    return [], []
+  if root is None:
+    return [], []
+
+  entries: list[SitemapEntry] = []
+  children: list[str] = []
+  kind = _local_name(root.tag)
+  for node in root:
+    name = _local_name(node.tag)
+    if name not in {"url", "sitemap"}:
+      continue
+    loc = None
+    lastmod = None
+    for field in node:
+      field_name = _local_name(field.tag)
+      if field_name == "loc":
+        loc = (field.text or "").strip()
+      elif field_name == "lastmod":
+        lastmod = parse_lastmod(field.text)
+    if not loc:
+      continue
+    if kind == "sitemapindex" or name == "sitemap":
+      children.append(loc)
+    else:
+      entries.append(SitemapEntry(url=loc, lastmod=lastmod))
+  return entries, children
+
+
+def sitemap_candidates(start_url: str, *, root_path: str, robots_txt: str | None) -> list[str]:
+  parsed = urlparse(start_url)
+  origin = f"{parsed.scheme}://{parsed.netloc}"
+  candidates: list[str] = []
+  for line in (robots_txt or "").splitlines():
+    key, _, value = line.partition(":")
+    if key.strip().lower() == "sitemap" and value.strip():
+      candidates.append(urljoin(origin, value.strip()))
+  if root_path and root_path != "/":
+    candidates.append(f"{origin}{root_path.rstrip('/')}/sitemap.xml")
+  candidates.append(f"{origin}/sitemap.xml")
+
+  out: list[str] = []
+  for candidate in candidates:
+    if candidate not in out:
+      out.append(candidate)
+  return out
+
+
+def discover_sitemap_entries(
+  fetch_bytes: Callable[[str], bytes | None],
+  candidates: list[str],
+  *,
+  max_sitemaps: int = 50,
+) -> list[SitemapEntry]:
+  """Walk sitemap candidates (and nested indexes) until one yields pages.
+
+  `fetch_bytes` returns None for sitemaps that cannot be fetched.
+  """
+
+  for candidate in candidates:
+    entries: list[SitemapEntry] = []
+    pending = [candidate]
+    seen: set[str] = set()
+    while pending and len(seen) < max_sitemaps:
+      sitemap_url = pending.pop(0)
+      if sitemap_url in seen:
+        continue
+      seen.add(sitemap_url)
+      raw = fetch_bytes(sitemap_url)
+      if not raw:
+        continue
+      try:
+        found, children = parse_sitemap(raw)
+      except (OSError, EOFError, ValueError):
+        continue
+      entries.extend(found)
+      pending.extend(children)
+    if entries:
+      return entries
+  return []
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, field
+
+from .chapter_cache import ChapterCacheStats
+from .http_cache import HttpCacheStats
+from .kindle_images import ImageStats
+from .ratelimit import HostRateSummary
+from .transport import DownloadBudget, TransportStats
+
+
+@dataclass
+class PageParseStats:
+  """Per-page charset resolution and parse timings from the crawler.
+
+  `charset_s` is choosing the encoding only; the bytes are decoded by the
+  parser, so that cost is part of `parse_s`.
+  """
+
+  pages: int = 0
+  detected: int = 0
+  charset_s: float = 0.0
+  parse_s: float = 0.0
+  slowest_charset_s: float = 0.0
+  slowest_charset_url: str | None = None
+  _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+  def record(self, url: str, *, charset_s: float, parse_s: float, detected: bool) -> None:
+    with self._lock:
+      self.pages += 1
+      self.detected += int(detected)
+      self.charset_s += charset_s
+      self.parse_s += parse_s
+      if charset_s >= self.slowest_charset_s:
+        self.slowest_charset_s = charset_s
+        self.slowest_charset_url = url
+
+  def merge(self, other: PageParseStats) -> None:
+    """Add the timings of a worker process."""
+
+    with self._lock:
+      self.pages += other.pages
+      self.detected += other.detected
+      self.charset_s += other.charset_s
+      self.parse_s += other.parse_s
+      if other.slowest_charset_url is not None and other.slowest_charset_s >= self.slowest_charset_s:
+        self.slowest_charset_s = other.slowest_charset_s
+        self.slowest_charset_url = other.slowest_charset_url
+
+
+@dataclass
+class PrefetchStats:
+  """Speculative fetches in the Next-button crawl."""
+
+  issued: int = 0
+  hits: int = 0
+  discarded: int = 0
+
+
+@dataclass
+class RunStats:
+  """Counters collected during a run and printed by the CLI at the end."""
+
+  host_rates: list[HostRateSummary] = field(default_factory=list)
+  http_cache: HttpCacheStats | None = None
+  chapter_cache: ChapterCacheStats | None = None
+  page_parse: PageParseStats | None = None
+  prefetch: PrefetchStats | None = None
+  transport: TransportStats | None = None
+  downloads: DownloadBudget | None = None
+  images: ImageStats | None = None
+  # Pages extracted by each crawl worker process (process mode only).
+  worker_pages: dict[int, int] = field(default_factory=dict)
+  # (dropped URL, URL of the earlier chapter it duplicates)
+  duplicates: list[tuple[str, str]] = field(default_factory=list)
+
+  def summary_lines(self) -> list[str]:
+    lines: list[str] = []
+    for rate in self.host_rates:
+      line = (
+        f"{rate.host}: {rate.requests} requests, "
+        f"{rate.effective_rate:.2f} req/s effective"
+      )
+      if rate.throttled:
+        line += f", throttled {rate.throttled}x"
+      lines.append(line)
+    transport = self.transport
+    if transport is not None and transport.requests:
+      line = (
+        f"HTTP: {transport.requests} responses from {len(transport.hosts)} hosts, "
+        f"{transport.elapsed_s / transport.requests * 1000:.0f} ms average"
+      )
+      if transport.slowest_url:
+        line += f", slowest {transport.slowest_s * 1000:.0f} ms ({transport.slowest_url})"
+      if transport.retries:
+        line += f", {transport.retries} retried"
+      if transport.errors:
+        line += f", {transport.errors} server errors"
+      lines.append(line)
+    downloads = self.downloads
+    if downloads is not None and (downloads.downloaded_bytes or downloads.skipped):
+      line = f"Downloaded: {downloads.downloaded_bytes / (1024 * 1024):.2f} MB"
+      if downloads.skipped:
+        skipped = ", ".join(f"{count} {kind}s" for kind, count in sorted(downloads.skipped.items()))
+        line += f", skipped as too large: {skipped}"
+      lines.append(line)
+    images = self.images
+    skipped = images.skipped_declared + images.skipped_host + images.skipped_probe if images is not None else 0
+    if images is not None and (
+      images.converted or images.failed or images.reused or skipped or images.skipped_small
+    ):
+      line = (
+        f"Images: {images.converted} converted, {images.original_bytes / (1024 * 1024):.2f} MB "
+        f"-> {images.converted_bytes / (1024 * 1024):.2f} MB"
+      )
+      if images.deduplicated:
+        line += (
+          f", {images.deduplicated} duplicates merged "
+          f"(saved {images.saved_bytes / (1024 * 1024):.2f} MB)"
+        )
+      if images.reused:
+        line += f", {images.reused} reused from cache"
+      if images.failed:
+        line += f", {images.failed} failed"
+        if images.failure_hits:
+          line += f" ({images.failure_hits} repeat occurrences not retried)"
+      lines.append(line)
+      if skipped or images.skipped_small:
+        line = (
+          f"Image probe: {skipped} downloads avoided ({images.skipped_declared} by width/height, "
+          f"{images.skipped_host} on denied hosts, {images.skipped_probe} after probing)"
+        )
+        if images.probe_requests:
+          line += f", {images.probe_requests} probe requests"
+        if images.avoided_bytes:
+          line += f", {images.avoided_bytes / (1024 * 1024):.2f} MB not downloaded"
+        if images.skipped_small:
+          line += f", {images.skipped_small} tiny images dropped after download"
+        lines.append(line)
+      if images.shrunk:
+        lines.append(
+          f"Size budget: {images.shrunk} images re-encoded smaller, "
+          f"saving {images.shrink_saved_bytes / (1024 * 1024):.2f} MB"
+        )
+    cache = self.http_cache
+    if cache is not None:
+      line = f"HTTP cache: {cache.revalidated} not modified, {cache.downloaded} downloaded"
+      if cache.offline_hits or cache.offline_misses:
+        line += f", {cache.offline_hits} offline hits, {cache.offline_misses} offline misses"
+      if cache.negative_hits:
+        line += f", {cache.negative_hits} cached 404/410"
+      if cache.unchanged_hits:
+        line += f", {cache.unchanged_hits} unchanged per sitemap lastmod"
+      lines.append(line)
+    chapters = self.chapter_cache
+    if chapters is not None:
+      line = f"Chapter cache: {chapters.hits} hits, {chapters.misses} misses"
+      if chapters.cleaned_hits or chapters.cleaned_misses:
+        line += f"; cleaned XHTML {chapters.cleaned_hits} hits, {chapters.cleaned_misses} misses"
+      lines.append(line)
+    if self.worker_pages:
+      counts = ", ".join(str(count) for _, count in sorted(self.worker_pages.items()))
+      lines.append(f"Worker processes: {len(self.worker_pages)} ({counts} pages)")
+    if self.duplicates:
+      lines.append(f"Duplicate pages skipped: {len(self.duplicates)}")
+      lines.extend(f"  {dropped} (same as {kept})" for dropped, kept in self.duplicates)
+    prefetch = self.prefetch
+    if prefetch is not None and prefetch.issued:
+      lines.append(
+        f"Prefetch: {prefetch.issued} speculative fetches, {prefetch.hits} used, "
+        f"{prefetch.discarded} discarded"
+      )
+    parse = self.page_parse
+    if parse is not None and parse.pages:
+      line = (
+        f"Page parsing: {parse.pages} pages, "
+        f"{parse.charset_s / parse.pages * 1000:.2f} ms/page charset, "
+        f"{parse.parse_s / parse.pages * 1000:.1f} ms/page decode+parse"
+      )
+      if parse.slowest_charset_url:
+        line += f", slowest charset {parse.slowest_charset_s * 1000:.2f} ms ({parse.slowest_charset_url})"
+      if parse.detected:
+        line += f", {parse.detected} needed encoding detection"
+      lines.append(line)
+    return lines
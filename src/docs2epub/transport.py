@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import io
+import threading
+from collections import Counter
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from typing import Any
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util import Retry, make_headers
+
+
+# 429 and 503 are left to the crawler's rate limiter, which backs off per host
+# and honours Retry-After; retrying them here as well would hammer the host.
+_RETRY_STATUSES = frozenset({500, 502, 504})
+_CHUNK_BYTES = 64 * 1024
+
+
+@dataclass(frozen=True)
+class TransportOptions:
+  """Connection pooling and retry policy for every HTTP request of a run."""
+
+  # Connections kept alive per host; should be at least the crawl concurrency.
+  pool_maxsize: int = 8
+  # Distinct hosts with a pool (pages, image CDNs, ...).
+  pool_hosts: int = 16
+  # Retries for connection errors and 500/502/504, with exponential backoff.
+  retries: int = 3
+  backoff_factor: float = 0.5
+  backoff_jitter: float = 0.5
+  backoff_max_s: float = 30.0
+
+
+@dataclass(frozen=True)
+class DownloadLimits:
+  """Byte caps on response bodies; None disables a cap."""
+
+  # Sitemaps may legitimately reach 50 MB uncompressed.
+  max_page_bytes: int | None = 50 * 1024 * 1024
+  max_image_bytes: int | None = 16 * 1024 * 1024
+  # All downloads of the run together (cache hits do not count).
+  max_total_bytes: int | None = None
+
+
+class ResourceTooLarge(requests.RequestException):
+  """A body exceeded its per-resource cap or the run's remaining budget."""
+
+
+@dataclass(frozen=True)
+class RequestTiming:
+  url: str
+  status: int
+  elapsed_s: float
+  retries: int
+
+
+@dataclass
+class TransportStats:
+  """Per-request timings collected through the session's response hook."""
+
+  requests: int = 0
+  retries: int = 0
+  errors: int = 0
+  elapsed_s: float = 0.0
+  slowest_s: float = 0.0
+  slowest_url: str | None = None
+  hosts: set[str] = field(default_factory=set)
+  _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+  def record(self, timing: RequestTiming) -> None:
+    with self._lock:
+      self.requests += 1
+      self.retries += timing.retries
+      self.errors += int(timing.status >= 500)
+      self.elapsed_s += timing.elapsed_s
+      self.hosts.add(urlparse(timing.url).netloc.lower())
+      if timing.elapsed_s >= self.slowest_s:
+        self.slowest_s = timing.elapsed_s
+        self.slowest_url = timing.url
+
+
+class DownloadBudget:
+  """Enforces `DownloadLimits` while bodies stream in, and counts skips.
+
+  Bodies are read in chunks into a buffer that never grows past the cap: a
+  declared `Content-Length` over the cap aborts before reading, otherwise the
+  running count does. `kind` is "page" or "image". `share` splits the total
+  budget between worker processes. Thread-safe.
+  """
+
+  def __init__(self, limits: DownloadLimits | None = None, *, share: int = 1) -> None:
+    self.limits = limits or DownloadLimits()
+    total = self.limits.max_total_bytes
+    self._total = total // share if total is not None else None
+    self.downloaded_bytes = 0
+    self.skipped: Counter[str] = Counter()
+    self._lock = threading.Lock()
+
+  def max_bytes(self, kind: str) -> int | None:
+    return self.limits.max_image_bytes if kind == "image" else self.limits.max_page_bytes
+
+  def read(self, response: requests.Response, *, kind: str) -> requests.Response:
+    """The streamed `response` with its body loaded, or raise `ResourceTooLarge`."""
+
+    if not isinstance(response, requests.Response):
+      return response
+    cap = self.max_bytes(kind)
+    try:
+      declared = int(response.headers.get("Content-Length") or -1)
+    except ValueError:
+      declared = -1
+    if cap is not None and declared > cap:
+      self._skip(response, kind, f"{declared} bytes declared, cap is {cap}")
+
+    if response.raw is None:
+      # Built in memory (tests, replays): nothing to stream, only to count.
+      size = len(response.content or b"")
+      if cap is not None and size > cap:
+        self._skip(response, kind, f"more than {cap} bytes")
+      if not self._reserve(size):
+        self._skip(response, kind, "total download budget exhausted")
+      return response
+
+    body = bytearray()
+    for chunk in response.iter_content(_CHUNK_BYTES):
+      body += chunk
+      if cap is not None and len(body) > cap:
+        self._skip(response, kind, f"more than {cap} bytes")
+      if not self._reserve(len(chunk)):
+        self._skip(response, kind, "total download budget exhausted")
+    # Hand the drained connection back to the pool; the copy serves the body.
+    response.close()
+    loaded = make_response(
+      response.url,
+      status=response.status_code,
+      body=bytes(body),
+      headers=dict(response.headers),
+      reason=response.reason,
+    )
+    loaded.encoding = response.encoding
+    loaded.history = response.history
+    loaded.request = response.request
+    loaded.elapsed = response.elapsed
+    loaded.cookies = response.cookies
+    return loaded
+
+  def merge(self, downloaded_bytes: int, skipped: dict[str, int]) -> None:
+    """Count what a worker process's own budget let through and skipped."""
+
+    with self._lock:
+      self.downloaded_bytes += downloaded_bytes
+      self.skipped.update(skipped)
+
+  def _reserve(self, size: int) -> bool:
+    with self._lock:
+      if self._total is not None and self.downloaded_bytes + size > self._total:
+        return False
+      self.downloaded_bytes += size
+      return True
+
+  def _skip(self, response: requests.Response, kind: str, reason: str) -> None:
+    response.close()
+    with self._lock:
+      self.skipped[kind] += 1
+    raise ResourceTooLarge(f"{response.url}: {reason}", response=response)
+
+
+class LimitedSession:
+  """Wraps a session so every `get` streams its body through a `DownloadBudget`."""
+
+  def __init__(self, session: requests.Session, budget: DownloadBudget, *, kind: str) -> None:
+    self._session = session
+    self.budget = budget
+    self.kind = kind
+
+  @property
+  def headers(self) -> Any:
+    return self._session.headers
+
+  def get(self, url: str, timeout: float = 30, **kwargs: Any) -> requests.Response:
+    response = self._session.get(url, timeout=timeout, stream=True, **kwargs)
+    return self.budget.read(response, kind=self.kind)
+
+
+def make_response(
+  url: str,
+  *,
+  status: int,
+  body: bytes,
+  headers: dict[str, str] | None = None,
+  reason: str | None = None,
+) -> requests.Response:
+  """A `requests.Response` for a body that did not come off the wire (cache, WARC, local files)."""
+
+  resp = requests.Response()
+  resp.url = url
+  resp.status_code = status
+  if reason is None:
+    try:
+      reason = HTTPStatus(status).phrase
+    except ValueError:
+      reason = ""
+  resp.reason = reason
+  resp.headers = CaseInsensitiveDict(headers or {})
+  resp.raw = io.BytesIO(body)
+  return resp
+
+
+def accept_encoding() -> str:
+  """gzip/deflate, plus br (and zstd) when urllib3 can decode them."""
+
+  return make_headers(accept_encoding=True)["accept-encoding"]
+
+
+def _timing_hook(on_request: Callable[[RequestTiming], None]) -> Callable[..., requests.Response]:
+  def hook(response: requests.Response, *args: Any, **kwargs: Any) -> requests.Response:
+    retries = getattr(getattr(response.raw, "retries", None), "history", ()) or ()
+    on_request(
+      RequestTiming(
+        url=response.url,
+        status=response.status_code,
+        elapsed_s=response.elapsed.total_seconds(),
+        retries=len(retries),
+      )
+    )
+    return response
+
+  return hook
+
+
+def new_session(
+  options: TransportOptions | None = None,
+  *,
+  user_agent: str | None = None,
+  on_request: Callable[[RequestTiming], None] | None = None,
+) -> requests.Session:
+  """A `requests.Session` with sized keep-alive pools, retries and compression.
+
+  One session is meant to be shared by the crawler and the image pipeline so
+  they reuse the same connections. `on_request` is called once per response
+  (after retries) with its timing; `elapsed_s` is the time to the headers.
+  """
+
+  options = options or TransportOptions()
+  retry = Retry(
+    total=options.retries,
+    connect=options.retries,
+    read=options.retries,
+    status=options.retries,
+    other=0,
+    allowed_methods=frozenset({"GET", "HEAD"}),
+    status_forcelist=_RETRY_STATUSES,
+    backoff_factor=options.backoff_factor,
+    backoff_jitter=options.backoff_jitter,
+    backoff_max=options.backoff_max_s,
+    raise_on_status=False,
+    respect_retry_after_header=True,
+  )
+  adapter = HTTPAdapter(
+    pool_connections=options.pool_hosts,
+    pool_maxsize=options.pool_maxsize,
+    max_retries=retry,
+  )
+
+  session = requests.Session()
+  session.mount("http://", adapter)
+  session.mount("https://", adapter)
+  session.headers["Accept-Encoding"] = accept_encoding()
+  if user_agent:
+    session.headers["User-Agent"] = user_agent
+  if on_request is not None:
+    session.hooks["response"].append(_timing_hook(on_request))
+  return session
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import gzip
+import mmap
+import threading
+import uuid
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import requests
+
+from . import __version__
+from .transport import make_response
+
+
+# Bodies are stored decoded, so these no longer describe them.
+_DROP_HEADERS = frozenset({"content-encoding", "transfer-encoding", "content-length", "connection"})
+_SCAN_CHUNK = 256 * 1024
+
+
+def _is_gzip(path: Path) -> bool:
+  return path.name.endswith(".gz")
+
+
+class WarcWriter:
+  """Appends HTTP responses to a WARC 1.1 file as `response` records.
+
+  Bodies are written decoded (no Content-Encoding). A `.warc.gz` path gets
+  one gzip member per record, as WARC tools expect. Thread-safe.
+  """
+
+  def __init__(self, path: str | Path) -> None:
+    self.path = Path(path)
+    self.path.parent.mkdir(parents=True, exist_ok=True)
+    self.records = 0
+    self._lock = threading.Lock()
+    self._file = self.path.open("wb")
+    info = f"software: docs2epub/{__version__}\r\nformat: WARC File Format 1.1\r\n".encode("utf-8")
+    self._write("warcinfo", {"WARC-Filename": self.path.name, "Content-Type": "application/warc-fields"}, info)
+
+  def __enter__(self) -> WarcWriter:
+    return self
+
+  def __exit__(self, *exc: object) -> None:
+    self.close()
+
+  def close(self) -> None:
+    with self._lock:
+      self._file.close()
+
+  def record(self, response: requests.Response, *, url: str | None = None) -> None:
+    """Write `response` under `url` (the URL asked for, before redirects)."""
+
+    reason = response.reason or ""
+    lines = [f"HTTP/1.1 {response.status_code} {reason}".rstrip()]
+    body = response.content
+    for name, value in response.headers.items():
+      if name.lower() not in _DROP_HEADERS:
+        lines.append(f"{name}: {value}")
+    lines.append(f"Content-Length: {len(body)}")
+    payload = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1", errors="replace") + body
+    self._write(
+      "response",
+      {"WARC-Target-URI": url or response.url, "Content-Type": "application/http;msgtype=response"},
+      payload,
+    )
+    with self._lock:
+      self.records += 1
+
+  def _write(self, kind: str, fields: dict[str, str], payload: bytes) -> None:
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    header = [
+      "WARC/1.1",
+      f"WARC-Type: {kind}",
+      f"WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>",
+      f"WARC-Date: {now}",
+      *(f"{name}: {value}" for name, value in fields.items()),
+      f"Content-Length: {len(payload)}",
+    ]
+    block = ("\r\n".join(header) + "\r\n\r\n").encode("utf-8") + payload + b"\r\n\r\n"
+    if _is_gzip(self.path):
+      block = gzip.compress(block, compresslevel=6)
+    with self._lock:
+      self._file.write(block)
+
+
+class RecordingSession:
+  """Wraps a session so every response it returns is written to a WARC."""
+
+  def __init__(self, session: Any, writer: WarcWriter) -> None:
+    self._session = session
+    self.writer = writer
+
+  @property
+  def headers(self) -> Any:
+    return self._session.headers
+
+  def get(self, url: str, timeout: float = 30, **kwargs: Any) -> requests.Response:
+    response = self._session.get(url, timeout=timeout, **kwargs)
+    self.writer.record(response, url=url)
+    return response
+
+
+class WarcArchive:
+  """Read-only index of the `response` records in a WARC file.
+
+  Opening the archive scans record headers once and maps each target URI to
+  where its HTTP message lives (the last record wins). Uncompressed files
+  are memory-mapped and the scan skips over bodies; `.warc.gz` members are
+  inflated during the scan and again on each read.
+  """
+
+  def __init__(self, path: str | Path) -> None:
+    self.path = Path(path)
+    self._file = self.path.open("rb")
+    self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.path.stat().st_size else b""
+    self._gzip = _is_gzip(self.path)
+    self._index: dict[str, tuple[int, int]] = {}
+    if self._gzip:
+      self._scan_gzip()
+    else:
+      self._scan(self._map)
+
+  def __len__(self) -> int:
+    return len(self._index)
+
+  def __contains__(self, url: str) -> bool:
+    return url in self._index
+
+  def close(self) -> None:
+    if isinstance(self._map, mmap.mmap):
+      self._map.close()
+    self._file.close()
+
+  def response(self, url: str) -> requests.Response | None:
+    location = self._index.get(url)
+    if location is None:
+      return None
+    start, length = location
+    if self._gzip:
+      record = zlib.decompressobj(31).decompress(self._map[start : start + length])
+      head_end = record.index(b"\r\n\r\n")
+      size = int(_parse_fields(record[:head_end]).get("content-length", "0"))
+      message = record[head_end + 4 : head_end + 4 + size]
+    else:
+      message = self._map[start : start + length]
+    return _parse_http_response(url, bytes(message))
+
+  def _scan(self, data: Any, *, member: tuple[int, int] | None = None) -> None:
+    pos = 0
+    size = len(data)
+    while pos < size:
+      head_end = data.find(b"\r\n\r\n", pos)
+      if head_end < 0:
+        break
+      fields = _parse_fields(bytes(data[pos:head_end]))
+      start = head_end + 4
+      length = int(fields.get("content-length", "0"))
+      uri = fields.get("warc-target-uri")
+      if fields.get("warc-type") == "response" and uri:
+        self._index[uri] = member if member is not None else (start, length)
+      pos = start + length + 4
+
+  def _scan_gzip(self) -> None:
+    data = self._map
+    size = len(data)
+    offset = 0
+    while offset < size:
+      inflater = zlib.decompressobj(31)
+      parts: list[bytes] = []
+      pos = offset
+      while not inflater.eof and pos < size:
+        chunk = data[pos : pos + _SCAN_CHUNK]
+        parts.append(inflater.decompress(chunk))
+        pos += len(chunk)
+      used = pos - len(inflater.unused_data) - offset
+      self._scan(b"".join(parts), member=(offset, used))
+      offset += used
+
+
+class WarcReplaySession:
+  """Serves responses from a `WarcArchive`; URLs it lacks are 404s."""
+
+  def __init__(self, archive: WarcArchive | str | Path) -> None:
+    self.archive = archive if isinstance(archive, WarcArchive) else WarcArchive(archive)
+    self.headers: dict[str, str] = {}
+    self.misses = 0
+
+  def get(self, url: str, timeout: float = 30, **kwargs: Any) -> requests.Response:
+    response = self.archive.response(url)
+    if response is None:
+      self.misses += 1
+      response = make_response(url, status=404, body=b"")
+    return response
+
+
+def _parse_fields(block: bytes) -> dict[str, str]:
+  fields: dict[str, str] = {}
+  for line in block.split(b"\r\n")[1:]:
+    name, sep, value = line.partition(b":")
+    if sep:
+      fields[name.strip().decode("latin-1").lower()] = value.strip().decode("utf-8", errors="replace")
+  return fields
+
+
+def _parse_http_response(url: str, message: bytes) -> requests.Response:
+  head, _, body = message.partition(b"\r\n\r\n")
+  status_line, *header_lines = head.decode("latin-1").split("\r\n")
+  parts = status_line.split(" ", 2)
+  headers: dict[str, str] = {}
+  for line in header_lines:
+    name, sep, value = line.partition(":")
+    if sep:
+      headers[name.strip()] = value.strip()
+  return make_response(url, status=int(parts[1]), body=body, headers=headers, reason=parts[2] if len(parts) > 2 else "")
@@ -0,0 +1,63 @@
+"""In-memory sessions for the crawl tests."""
+
+import threading
+import time
+
+import requests
+
+
+class DummyResponse:
+  def __init__(self, url: str, status_code: int, text: str, headers: dict[str, str] | None = None) -> None:
+    self.url = url
+    self.status_code = status_code
+    self.text = text
+    self.content = text.encode("utf-8")
+    self.headers = dict(headers or {})
+
+  def raise_for_status(self) -> None:
+    if self.status_code >= 400:
+      raise requests.HTTPError(
+        f"{self.status_code} Client Error",
+        response=self,
+      )
+
+
+def make_session_with_status(
+  pages: dict[str, tuple[int, str] | list[tuple[int, str]]],
+  *,
+  headers: dict[str, str] | None = None,
+  missing: tuple[int, str] | None = None,
+  calls: list[str] | None = None,
+  delays: dict[str, float] | None = None,
+):
+  """A session class serving `pages`: URL -> (status, text).
+
+  A list of responses is served in turn, the last one repeating. Other URLs
+  get `missing`, or fail the test. `calls` records the requested URLs and
+  `delays` slows some of them down (seconds).
+  """
+
+  lock = threading.Lock()
+
+  class DummySession:
+    def __init__(self) -> None:
+      self.headers = {}
+
+    def get(self, url: str, timeout: int = 30, **kwargs) -> DummyResponse:
+      entry = pages.get(url, missing)
+      if entry is None:
+        raise AssertionError(f"unexpected url fetch: {url}")
+      with lock:
+        if calls is not None:
+          calls.append(url)
+        if isinstance(entry, list):
+          entry = entry.pop(0) if len(entry) > 1 else entry[0]
+      time.sleep((delays or {}).get(url, 0))
+      status_code, text = entry
+      return DummyResponse(url, status_code, text, headers)
+
+  return DummySession
+
+
+def make_session(pages: dict[str, str], **kwargs):
+  return make_session_with_status({url: (200, text) for url, text in pages.items()}, **kwargs)
@@ -0,0 +1,157 @@
+from pathlib import Path
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from docs2epub.batch import BatchJob, load_manifest, run_batch, summary_table
+from docs2epub.cli import main
+from docs2epub.warc import WarcWriter
+
+
+def test_manifest_reads_toml_books(tmp_path):
+  manifest = tmp_path / "books.toml"
+  manifest.write_text(
+    """
+[[book]]
+url = "https://example.com/docs/intro"
+out = "dist/example.epub"
+title = "Example"
+
+[[book]]
+url = "https://other.dev/guide/"
+author = "Other"
+""",
+    encoding="utf-8",
+  )
+
+  jobs = load_manifest(manifest, out_dir=tmp_path / "out")
+
+  assert jobs == [
+    BatchJob(start_url="https://example.com/docs/intro", out=tmp_path / "dist/example.epub", title="Example"),
+    BatchJob(start_url="https://other.dev/guide/", out=tmp_path / "out/other.dev-guide.epub", author="Other"),
+  ]
+
+
+def test_manifest_reads_url_lists(tmp_path):
+  manifest = tmp_path / "ROADMAP.md"
+  manifest.write_text(
+    "Sites to convert:\n- https://example.com/docs/\nhttps://rlhfbook.com/\n\nnotes without links\n",
+    encoding="utf-8",
+  )
+
+  jobs = load_manifest(manifest, out_dir=tmp_path)
+
+  assert [(job.start_url, job.out.name) for job in jobs] == [
+    ("https://example.com/docs/", "example.com-docs.epub"),
+    ("https://rlhfbook.com/", "rlhfbook.com.epub"),
+  ]
+
+
+def test_run_batch_keeps_order_and_isolates_failures(tmp_path):
+  jobs = [BatchJob(start_url=f"https://example.com/{name}", out=tmp_path / f"{name}.epub") for name in ("a", "b", "c")]
+
+  def build(job: BatchJob) -> tuple[int, Path]:
+    if job.start_url.endswith("/b"):
+      raise RuntimeError("boom")
+    job.out.write_bytes(b"x" * 10)
+    return 3, job.out
+
+  results = run_batch(jobs, build, max_jobs=2)
+
+  assert [result.job for result in results] == jobs
+  assert [result.error for result in results] == [None, "boom", None]
+  assert results[0].pages == 3
+  assert results[0].size_bytes == 10
+  table = summary_table(results)
+  assert table[0].split()[:2] == ["Book", "Pages"]
+  assert "failed: boom" in table[2]
+
+
+def test_cli_batch_rejects_worker_processes(tmp_path):
+  manifest = tmp_path / "books.txt"
+  manifest.write_text("https://example.com/docs/\n", encoding="utf-8")
+
+  with pytest.raises(SystemExit, match="--processes"):
+    main(["--batch", str(manifest), "--processes", "2"])
+
+
+def _record(writer: WarcWriter, url: str, html: str) -> None:
+  resp = requests.Response()
+  resp.url = url
+  resp.status_code = 200
+  resp.reason = "OK"
+  resp.headers = CaseInsensitiveDict({"Content-Type": "text/html; charset=utf-8"})
+  resp._content = html.encode("utf-8")
+  writer.record(resp)
+
+
+def test_cli_batch_builds_books_from_manifest(tmp_path, capsys):
+  warc = tmp_path / "sites.warc"
+  writer = WarcWriter(warc)
+  for host in ("one.example", "two.example"):
+    sidebar = '<nav class="menu"><a href="/docs/intro">Intro</a><a href="/docs/next">Next</a></nav>'
+    for slug in ("intro", "next"):
+      _record(
+        writer,
+        f"https://{host}/docs/{slug}",
+        f"<html><body>{sidebar}<article><h1>{host} {slug}</h1><p>Text for {host}/{slug}</p></article></body></html>",
+      )
+  writer.close()
+  manifest = tmp_path / "books.toml"
+  manifest.write_text(
+    '[[book]]\nurl = "https://one.example/docs/intro"\ntitle = "One"\n\n'
+    '[[book]]\nurl = "https://two.example/docs/intro"\n\n'
+    '[[book]]\nurl = "https://missing.example/docs/intro"\n',
+    encoding="utf-8",
+  )
+
+  code = main(
+    [
+      "--batch",
+      str(manifest),
+      "--out-dir",
+      str(tmp_path / "out"),
+      "--replay-warc",
+      str(warc),
+      "--format",
+      "epub3",
+      "--sleep-s",
+      "0",
+    ]
+  )
+
+  assert code == 1
+  assert (tmp_path / "out/one.example-docs-intro.epub").exists()
+  assert (tmp_path / "out/two.example-docs-intro.epub").exists()
+  output = capsys.readouterr().out
+  assert "Built 2 of 3 books" in output
+  assert "failed:" in output
+  # Crawl stats add up across the books.
+  assert "Page parsing: 4 pages" in output
+
+
+def test_cli_batch_shares_a_temporary_image_store(tmp_path, monkeypatch):
+  warc = tmp_path / "sites.warc"
+  writer = WarcWriter(warc)
+  for host in ("one.example", "two.example"):
+    _record(writer, f"https://{host}/docs/intro", f"<html><body><article><h1>{host}</h1></article></body></html>")
+  writer.close()
+  manifest = tmp_path / "books.txt"
+  manifest.write_text("https://one.example/docs/intro\nhttps://two.example/docs/intro\n", encoding="utf-8")
+  stores = []
+
+  def fake_build(*, chapters, out_file, image_store, **kwargs):
+    list(chapters)
+    stores.append(image_store)
+    Path(out_file).parent.mkdir(parents=True, exist_ok=True)
+    Path(out_file).write_bytes(b"epub")
+    return Path(out_file)
+
+  monkeypatch.setattr("docs2epub.cli.build_epub2_with_pandoc", fake_build)
+
+  code = main(["--batch", str(manifest), "--out-dir", str(tmp_path / "out"), "--replay-warc", str(warc), "--sleep-s", "0"])
+
+  assert code == 0
+  assert len(stores) == 2
+  assert stores[0] is not None and stores[0] is stores[1]
@@ -9,3 +9,17 @@ def test_cli_keeps_images_by_default():
 def test_cli_allows_disabling_images():
   args = _build_parser().parse_args(["https://example.com/docs", "book.epub", "--no-images"])
   assert args.keep_images is False
+
+
+def test_cli_parses_max_size_units():
+  parser = _build_parser()
+
+  assert parser.parse_args(["https://example.com/docs", "book.epub", "--max-size", "45MB"]).max_size == 45 * 1024**2
+  assert parser.parse_args(["https://example.com/docs", "book.epub", "--max-size", "800kb"]).max_size == 800 * 1024
+  assert parser.parse_args(["https://example.com/docs", "book.epub"]).max_size is None
+
+
+def test_cli_skips_no_images_by_size_or_host_by_default():
+  args = _build_parser().parse_args(["https://example.com/docs", "book.epub"])
+
+  assert (args.min_image_pixels, args.min_image_kb, args.skip_badges, args.skip_image_host) == (0, 0, False, [])
@@ -0,0 +1,52 @@
+from docs2epub.chapter_cache import ChapterArtifact
+from docs2epub.crawl_store import CrawlStore
+
+
+def test_store_claims_in_order_and_queues_links_on_completion(tmp_path):
+  store = CrawlStore(tmp_path / "frontier.sqlite")
+  store.add([("https://example.com/a", "https://example.com/a/"), ("https://example.com/b", "https://example.com/b")])
+  store.add([("https://example.com/a", "https://example.com/a")])
+
+  assert store.claim(1) == ("https://example.com/a", "https://example.com/a/")
+  assert store.claim(2) == ("https://example.com/b", "https://example.com/b")
+  assert store.claim(1) is None
+  assert not store.finished()
+
+  artifact = ChapterArtifact(title="A", html="<p>A</p>", links=("https://example.com/c", "https://example.com/b"))
+  store.complete("https://example.com/a", artifact, worker=1)
+  store.fail("https://example.com/b", "HTTPError: 500")
+
+  assert store.result("https://example.com/a").artifact == artifact
+  assert store.result("https://example.com/b").error == "HTTPError: 500"
+  assert store.claim(2) == ("https://example.com/c", "https://example.com/c")
+  store.complete("https://example.com/c", None, worker=2)
+
+  assert store.finished()
+  assert store.pages_per_worker() == {1: 1, 2: 1}
+
+
+def test_store_stop_is_visible_to_other_connections(tmp_path):
+  path = tmp_path / "frontier.sqlite"
+  parent = CrawlStore(path)
+  worker = CrawlStore(path)
+  parent.add([("https://example.com/a", "https://example.com/a")])
+
+  assert not worker.finished()
+  parent.stop()
+  assert worker.finished()
+
+
+def test_gated_store_claims_only_released_pages(tmp_path):
+  path = tmp_path / "frontier.sqlite"
+  parent = CrawlStore(path)
+  worker = CrawlStore(path)
+  parent.add([(f"https://example.com/{name}", f"https://example.com/{name}") for name in "abc"])
+  parent.gate()
+
+  assert worker.claim(1) is None
+  parent.release(["https://example.com/b"])
+  assert worker.claim(1) == ("https://example.com/b", "https://example.com/b")
+  assert worker.claim(1) is None
+
+  worker.save_worker_stats(1, {"pages": 1})
+  assert parent.worker_stats() == [{"pages": 1}]
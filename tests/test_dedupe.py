@@ -0,0 +1,39 @@
+from docs2epub.dedupe import DuplicateDetector, fingerprint_text
+
+
+ARTICLE = " ".join(
+  f"Step {i}: configure the widget factory so that sprockets rotate in phase with gear {i}." for i in range(20)
+)
+
+
+def test_fingerprint_ignores_case_punctuation_and_whitespace():
+  a = fingerprint_text("Install  the CLI.\nThen run it!")
+  b = fingerprint_text("install the cli then run it")
+
+  assert a.digest == b.digest
+  assert a.simhash is None
+  assert fingerprint_text("   ").digest is None
+
+
+def test_detector_flags_exact_and_near_duplicates():
+  detector = DuplicateDetector()
+
+  assert detector.check("https://example.com/docs/intro", fingerprint_text(ARTICLE)) is None
+  assert detector.check("https://example.com/docs", fingerprint_text(ARTICLE)) == "https://example.com/docs/intro"
+
+  # Same article with a version banner and an edited footer.
+  near = "Version 2.0 " + ARTICLE + " Last updated yesterday."
+  assert detector.check("https://example.com/docs/v2/intro", fingerprint_text(near)) == (
+    "https://example.com/docs/intro"
+  )
+
+  other = " ".join(f"Chapter {i} explains how routing tables propagate across regions {i}." for i in range(20))
+  assert detector.check("https://example.com/docs/routing", fingerprint_text(other)) is None
+
+
+def test_detector_never_collapses_empty_pages():
+  detector = DuplicateDetector()
+  empty = fingerprint_text("")
+
+  assert detector.check("https://example.com/a", empty) is None
+  assert detector.check("https://example.com/b", empty) is None
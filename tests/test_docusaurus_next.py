@@ -1,5 +1,7 @@
 from docs2epub.docusaurus_next import DocusaurusNextOptions, iter_docusaurus_next
 
+from sessions import make_session
+
 
 def test_iter_docusaurus_next_falls_back_to_main_when_no_article(monkeypatch):
   html = """
@@ -16,27 +18,273 @@ def test_iter_docusaurus_next_falls_back_to_main_when_no_article(monkeypatch):
   </html>
   """
 
-  class DummyResponse:
-    text = html
+  session = make_session({"https://example.com/docs": html}, missing=(404, ""))
+  monkeypatch.setattr("docs2epub.docusaurus_next.new_session", lambda *args, **kwargs: session())
+
+  options = DocusaurusNextOptions(start_url="https://example.com/docs", sleep_s=0)
+  chapters = list(iter_docusaurus_next(options))
+
+  assert len(chapters) == 1
+  assert chapters[0].title == "Overview"
+  assert "Hello world" in chapters[0].html
 
-    def raise_for_status(self) -> None:
-      return None
 
-  class DummySession:
-    def __init__(self) -> None:
-      self.headers = {}
+def test_strip_heavy_elements_drops_scripts_and_styles():
+  from docs2epub.docusaurus_next import _strip_heavy_elements
 
-    def get(self, url: str, timeout: int = 30) -> DummyResponse:
-      return DummyResponse()
+  html = (
+    '<head><script id="__NEXT_DATA__" type="application/json">{"html": "<div>x</div>"}</script>'
+    "<style>a > b { color: red }</style><script src='/app.js'/></head>"
+    '<body><noscript><img src="pixel.gif"></noscript>'
+    '<a title="a > b" href="/docs/next">Next</a></body>'
+  )
 
-  monkeypatch.setattr(
-    "docs2epub.docusaurus_next.requests.Session",
-    lambda: DummySession(),
+  # `/>` does not close a <script> in HTML; the parser is left to end it.
+  assert _strip_heavy_elements(html.encode("utf-8")) == (
+    b"<head><script src='/app.js'/></head><body>"
+    b'<a title="a > b" href="/docs/next">Next</a></body>'
   )
 
-  options = DocusaurusNextOptions(start_url="https://example.com/docs", sleep_s=0)
-  chapters = iter_docusaurus_next(options)
 
-  assert len(chapters) == 1
-  assert chapters[0].title == "Overview"
-  assert "Hello world" in chapters[0].html
+def test_strip_heavy_elements_keeps_custom_elements_and_svg():
+  from docs2epub.docusaurus_next import _strip_heavy_elements
+
+  html = (
+    b"<script-loader src='/x.js'>Loading</script-loader><svg-icon name='a'></svg-icon>"
+    b"<svg><svg><rect/></svg><text>Label</text></svg>"
+  )
+
+  assert _strip_heavy_elements(html) == html
+
+
+def test_strip_heavy_elements_never_starts_inside_attributes_comments_or_cdata():
+  from docs2epub.docusaurus_next import _strip_heavy_elements
+
+  kept = (
+    b'<article><a title="<script>" href="/x">Link</a><p>One</p>'
+    b"<!-- <style> --><p>Two</p>"
+    b'<svg><script href="/icon.js"/></svg><p>Three</p>'
+    b'<svg><script><![CDATA[ s = "</script>"; ]]></script></svg><p>Four</p>'
+    b"<pre>a &lt;script&gt; b</pre></article>"
+  )
+  html = kept + b"<script>x = 1</script><p>Five</p>"
+
+  assert _strip_heavy_elements(html) == kept + b"<p>Five</p>"
+
+
+def test_parse_article_region_keeps_article_and_pager_only():
+  from docs2epub.docusaurus_next import _extract_next_url, _page_markup, _parse_article_region
+
+  class Response:
+    headers = {}
+    content = (
+      b"<html><body><header><a href='/'>Home</a></header>"
+      b"<div class='sidebar'><a href='/docs/a'>A</a></div>"
+      b"<main><article><h1>Title</h1><p>Body</p></article>"
+      b'<nav aria-label="Docs pages"><a href="/docs/b">Next</a></nav></main>'
+      b"</body></html>"
+    )
+
+  soup = _parse_article_region(_page_markup(Response()))
+
+  assert soup.find("header") is None
+  assert soup.find("div", class_="sidebar") is None
+  assert soup.find("article").h1.get_text() == "Title"
+  assert _extract_next_url(soup, "https://example.com/docs/a") == "https://example.com/docs/b"
+
+
+def test_parse_article_region_falls_back_to_full_parse():
+  from docs2epub.docusaurus_next import _page_markup, _parse_article_region
+
+  class Response:
+    headers = {}
+    content = b"<html><body><div id='content'><h1>Title</h1></div></body></html>"
+
+  soup = _parse_article_region(_page_markup(Response()))
+
+  assert soup.select_one("div#content") is not None
+
+
+def test_page_markup_prefers_header_then_meta_then_utf8():
+  from docs2epub.docusaurus_next import _page_markup, _parse_page
+
+  class Response:
+    def __init__(self, content: bytes, content_type: str = "text/html") -> None:
+      self.content = content
+      self.headers = {"content-type": content_type}
+
+  latin1 = "<html><head><meta charset='iso-8859-1'></head><body><p>Café</p></body></html>"
+  declared = _page_markup(Response(latin1.encode("latin-1")))
+  assert (declared.encoding, declared.detect) == (None, False)
+  assert _parse_page(declared).p.get_text() == "Café"
+
+  header = _page_markup(Response("<p>Café</p>".encode("cp1252"), "text/html; charset=windows-1252"))
+  assert header.encoding == "windows-1252"
+  assert _parse_page(header).p.get_text() == "Café"
+
+  plain = _page_markup(Response("<p>Café</p>".encode("utf-8")))
+  assert (plain.encoding, plain.detect) == ("utf-8", False)
+  assert _parse_page(plain).p.get_text() == "Café"
+
+  undeclared = _page_markup(Response("<p>Café</p>".encode("latin-1")))
+  assert (undeclared.encoding, undeclared.detect) == (None, True)
+
+
+def test_sidebar_prefers_rule_matches_over_earlier_keyword_containers():
+  from bs4 import BeautifulSoup
+
+  from docs2epub.docusaurus_next import _extract_sidebar_urls
+  from docs2epub.frontier import UrlFrontier
+
+  soup = BeautifulSoup(
+    "<body>"
+    '<div class="docs-list"><a href="/docs/x">X</a><a href="/docs/y">Y</a></div>'
+    '<nav class="menu"><a href="/docs/a">A</a><a href="/docs/b">B</a></nav>'
+    "</body>",
+    "lxml",
+  )
+
+  urls = _extract_sidebar_urls(
+    soup,
+    base_url="https://example.com/docs/a",
+    frontier=UrlFrontier("https://example.com/docs/a"),
+  )
+
+  assert urls == ["https://example.com/docs/a", "https://example.com/docs/b"]
+
+
+def test_sidebar_counts_links_of_nested_candidates():
+  from bs4 import BeautifulSoup
+
+  from docs2epub.docusaurus_next import _extract_sidebar_urls
+  from docs2epub.frontier import UrlFrontier
+
+  soup = BeautifulSoup(
+    "<body>"
+    '<aside class="sidebar"><div class="toc"><a href="/docs/a">A</a></div><a href="/docs/b">B</a></aside>'
+    '<nav aria-label="Docs pages"><a href="/docs/c">Next</a><a href="/docs/d">x</a><a href="/docs/e">y</a></nav>'
+    "</body>",
+    "lxml",
+  )
+
+  urls = _extract_sidebar_urls(
+    soup,
+    base_url="https://example.com/docs/a",
+    frontier=UrlFrontier("https://example.com/docs/a"),
+  )
+
+  assert urls == ["https://example.com/docs/a", "https://example.com/docs/b"]
+
+
+def test_prefetch_hints_rank_next_links_before_prefetch_hints():
+  from docs2epub.docusaurus_next import _prefetch_hints
+
+  raw = (
+    b'<html><head><link rel="prefetch" href="/docs/guess">'
+    b'<link rel="stylesheet" href="/styles.css"><link rel="next" href="/docs/two"></head>'
+    b'<body><a href="/docs/zero" class="pagination-nav__link pagination-nav__link--prev">Previous</a>'
+    b"<a class='pagination-nav__link pagination-nav__link--next' href='/docs/three'>Next</a></body></html>"
+  )
+
+  assert _prefetch_hints(raw) == ["/docs/two", "/docs/three", "/docs/guess"]
+
+
+def test_prefetch_hints_follow_the_generic_next_anchor_of_the_pager():
+  from bs4 import BeautifulSoup
+
+  from docs2epub.docusaurus_next import _extract_next_url, _prefetch_hints
+
+  raw = (
+    b'<html><head><link rel="prefetch" href="/docs/guess"></head><body><article>'
+    b'<a href="/docs/other">Next steps</a></article>'
+    b'<nav class="pager" aria-label="Docs pages">'
+    b'<a href="/docs/a">Previous</a>'
+    b'<a href="/docs/c?x=1&amp;y=2"><span>Next</span>\n  <b>Chapter C</b></a>'
+    b"</nav></body></html>"
+  )
+
+  hints = _prefetch_hints(raw)
+  next_url = _extract_next_url(BeautifulSoup(raw, "lxml"), "https://example.com/docs/b")
+  assert hints == ["/docs/c?x=1&y=2", "/docs/guess"]
+  assert next_url == "https://example.com" + hints[0]
+
+
+def test_process_context_does_not_fork_while_threads_run():
+  import threading
+
+  from docs2epub.docusaurus_next import _process_context
+
+  release = threading.Event()
+  thread = threading.Thread(target=release.wait)
+  thread.start()
+  try:
+    assert _process_context().get_start_method() != "fork"
+  finally:
+    release.set()
+    thread.join()
+
+
+def test_rate_limiter_share_splits_crawl_delay():
+  from docs2epub.docusaurus_next import build_rate_limiter
+
+  session = make_session({"https://example.com/robots.txt": "User-agent: *\nCrawl-delay: 2\n"})
+  options = DocusaurusNextOptions(start_url="https://example.com/docs", sleep_s=0.5, max_rate=8.0)
+  limiter = build_rate_limiter(options, session(), share=4)
+
+  assert limiter.robots_loader("https://example.com/robots.txt") == 8.0
+  assert (limiter.initial_rate, limiter.max_rate) == (0.5, 2.0)
+
+
+def test_chapters_are_serialized_once_by_the_builder(monkeypatch, tmp_path):
+  from bs4 import Tag
+
+  from docs2epub.epub import EpubMetadata, build_epub
+
+  page = "<html><body><article><h1>Overview</h1><p>Hello world</p></article></body></html>"
+  session = make_session({"https://example.com/docs": page}, missing=(404, ""))
+  monkeypatch.setattr("docs2epub.docusaurus_next.new_session", lambda *args, **kwargs: session())
+  serialized: list[str] = []
+  decode_contents = Tag.decode_contents
+
+  def counting_decode_contents(self, *args, **kwargs):
+    serialized.append(self.name)
+    return decode_contents(self, *args, **kwargs)
+
+  monkeypatch.setattr(Tag, "decode_contents", counting_decode_contents)
+
+  options = DocusaurusNextOptions(start_url="https://example.com/docs", sleep_s=0, respect_robots=False)
+  chapters = list(iter_docusaurus_next(options))
+  assert serialized == []
+
+  build_epub(chapters=chapters, out_file=tmp_path / "book.epub", meta=EpubMetadata(title="T", author="A"))
+  assert serialized == ["article"]
+
+
+def test_chapter_cache_and_checkpoint_share_one_serialization(monkeypatch, tmp_path):
+  from bs4 import Tag
+
+  from docs2epub.chapter_cache import ChapterCache
+  from docs2epub.checkpoint import CrawlCheckpoint
+
+  page = "<html><body><article><h1>Overview</h1><p>Hello world</p></article></body></html>"
+  session = make_session({"https://example.com/docs": page}, missing=(404, ""))
+  monkeypatch.setattr("docs2epub.docusaurus_next.new_session", lambda *args, **kwargs: session())
+  serialized: list[str] = []
+  decode_contents = Tag.decode_contents
+
+  def counting_decode_contents(self, *args, **kwargs):
+    serialized.append(self.name)
+    return decode_contents(self, *args, **kwargs)
+
+  monkeypatch.setattr(Tag, "decode_contents", counting_decode_contents)
+
+  options = DocusaurusNextOptions(start_url="https://example.com/docs", sleep_s=0, respect_robots=False)
+  (chapter,) = iter_docusaurus_next(
+    options, chapter_cache=ChapterCache(tmp_path / "chapters"), checkpoint=CrawlCheckpoint(tmp_path / "state")
+  )
+  assert "Hello world" in chapter.html
+  assert serialized == ["article"]
+
+  chapter.tree.p.decompose()
+  chapter.tree_changed()
+  assert "Hello world" not in chapter.html
@@ -0,0 +1,38 @@
+from docs2epub.frontier import UrlFrontier, is_probable_doc_link, path_suffix
+
+
+def test_path_suffix_only_reads_last_segment():
+  assert path_suffix("/docs/logo.PNG") == ".png"
+  assert path_suffix("/docs/archive.tar.gz") == ".gz"
+  assert path_suffix("/docs/v1.2/intro") == ""
+  assert path_suffix("/docs/intro/") == ""
+  assert is_probable_doc_link("https://example.com/docs/intro")
+  assert not is_probable_doc_link("https://example.com/docs/bundle.js?v=1")
+
+
+def test_frontier_scope_and_interned_keys():
+  frontier = UrlFrontier("https://Example.com/docs/intro")
+
+  assert frontier.root_path == "/docs"
+  first = frontier.resolve("/docs/install/?tab=1#top", "https://example.com/docs/intro")
+  second = frontier.key("HTTPS://EXAMPLE.COM/docs/install")
+  assert first == "https://example.com/docs/install"
+  assert first is second
+
+  assert frontier.resolve("#anchor", "https://example.com/docs/intro") is None
+  assert frontier.resolve("mailto:a@example.com", "https://example.com/docs/intro") is None
+  assert frontier.resolve("/blog/post", "https://example.com/docs/intro") is None
+  assert frontier.resolve("https://other.com/docs/a", "https://example.com/docs/intro") is None
+  assert frontier.resolve("/docs/img/logo.svg", "https://example.com/docs/intro") is None
+
+
+def test_frontier_push_and_visit_dedupe_by_key():
+  frontier = UrlFrontier("https://example.com/docs/intro")
+
+  assert frontier.push("https://example.com/docs/intro")
+  assert not frontier.push("https://example.com/docs/intro/#top")
+  assert frontier.push("https://example.com/docs/install")
+  assert frontier.queue == ["https://example.com/docs/intro", "https://example.com/docs/install"]
+
+  assert frontier.visit("https://example.com/docs/install?x=1")
+  assert not frontier.visit("https://example.com/docs/install")
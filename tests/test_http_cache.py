@@ -0,0 +1,110 @@
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from docs2epub.http_cache import CacheMiss, CachingSession, HttpCache
+
+
+def _response(url: str, status: int, body: bytes = b"", headers: dict[str, str] | None = None):
+  resp = requests.Response()
+  resp.url = url
+  resp.status_code = status
+  resp.headers = CaseInsensitiveDict(headers or {})
+  resp._content = body
+  return resp
+
+
+class DummySession:
+  def __init__(self, handler) -> None:
+    self.headers = {}
+    self.calls: list[tuple[str, dict[str, str]]] = []
+    self._handler = handler
+
+  def get(self, url: str, timeout: int = 30, headers: dict[str, str] | None = None):
+    self.calls.append((url, dict(headers or {})))
+    return self._handler(url, headers or {})
+
+
+def test_cache_revalidates_with_etag_and_serves_body_on_304(tmp_path):
+  url = "https://example.com/docs/intro"
+
+  def handler(target, headers):
+    if headers.get("If-None-Match") == '"v1"':
+      return _response(target, 304)
+    return _response(target, 200, b"<h1>Intro</h1>", {"ETag": '"v1"', "Content-Type": "text/html"})
+
+  session = DummySession(handler)
+  cached = CachingSession(session, HttpCache(tmp_path))
+
+  first = cached.get(url, timeout=30)
+  second = cached.get(url, timeout=30)
+
+  assert first.content == second.content == b"<h1>Intro</h1>"
+  assert second.status_code == 200
+  assert session.calls[1][1] == {"If-None-Match": '"v1"'}
+  assert cached.cache.stats.revalidated == 1
+
+
+def test_cache_sends_if_modified_since(tmp_path):
+  url = "https://example.com/a.png"
+  stamp = "Mon, 01 Jan 2024 00:00:00 GMT"
+  session = DummySession(lambda target, headers: _response(target, 200, b"png", {"Last-Modified": stamp}))
+  cached = CachingSession(session, HttpCache(tmp_path))
+
+  cached.get(url)
+  cached.get(url)
+
+  assert session.calls[1][1] == {"If-Modified-Since": stamp}
+
+
+def test_cache_remembers_404_within_ttl(tmp_path):
+  url = "https://example.com/docs/missing"
+  session = DummySession(lambda target, headers: _response(target, 404))
+  cached = CachingSession(session, HttpCache(tmp_path))
+
+  cached.get(url)
+  again = cached.get(url)
+
+  assert again.status_code == 404
+  with pytest.raises(requests.HTTPError):
+    again.raise_for_status()
+  assert len(session.calls) == 1
+
+
+def test_cache_refetches_404_after_ttl(tmp_path):
+  url = "https://example.com/docs/missing"
+  session = DummySession(lambda target, headers: _response(target, 404))
+  cached = CachingSession(session, HttpCache(tmp_path, negative_ttl_s=0))
+
+  cached.get(url)
+  cached.get(url)
+
+  assert len(session.calls) == 2
+
+
+def test_cache_only_mode_never_touches_the_network(tmp_path):
+  url = "https://example.com/docs/intro"
+  online = CachingSession(
+    DummySession(lambda target, headers: _response(target, 200, b"cached")),
+    HttpCache(tmp_path),
+  )
+  online.get(url)
+
+  def fail(target, headers):
+    raise AssertionError("network used in offline mode")
+
+  offline = CachingSession(DummySession(fail), HttpCache(tmp_path, offline=True))
+
+  assert offline.get(url).content == b"cached"
+  with pytest.raises(CacheMiss):
+    offline.get("https://example.com/docs/other")
+
+
+def test_cache_serves_pages_unchanged_since_lastmod_without_network(tmp_path):
+  url = "https://example.com/docs/intro"
+  cache = HttpCache(tmp_path)
+  CachingSession(DummySession(lambda target, headers: _response(target, 200, b"body")), cache).get(url)
+
+  assert cache.response_if_unchanged(url, 0.0).content == b"body"
+  assert cache.response_if_unchanged(url, 4_000_000_000.0) is None
+  assert cache.stats.unchanged_hits == 1
@@ -0,0 +1,179 @@
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from PIL import Image
+
+from docs2epub.image_probe import DEFAULT_DENY_HOSTS, ProbeOptions, denied_host, image_size, probe_image
+from docs2epub.kindle_images import ImageStats, KindleImageProcessor
+from docs2epub.pandoc_epub2 import PandocEpub2Options
+
+
+def _png(size: tuple[int, int]) -> bytes:
+  with io.BytesIO() as out:
+    Image.effect_noise(size, 40).save(out, format="PNG")
+    return out.getvalue()
+
+
+@pytest.fixture
+def server():
+  images = {"/pixel.png": _png((1, 1)), "/diagram.png": _png((800, 600))}
+  seen: list[tuple[str, str | None]] = []
+
+  class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+      body = images[self.path]
+      seen.append((self.path, self.headers.get("Range")))
+      first, last = 0, len(body) - 1
+      if self.headers.get("Range"):
+        start, _, end = self.headers["Range"].removeprefix("bytes=").partition("-")
+        first, last = int(start), min(int(end), len(body) - 1)
+        self.send_response(206)
+        self.send_header("Content-Range", f"bytes {first}-{last}/{len(body)}")
+      else:
+        self.send_response(200)
+      self.send_header("Content-Type", "image/png")
+      self.send_header("Content-Length", str(last - first + 1))
+      self.end_headers()
+      self.wfile.write(body[first : last + 1])
+
+    def log_message(self, *args):
+      pass
+
+  httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+  thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+  thread.start()
+  try:
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", images, seen
+  finally:
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_image_size_reads_headers_only():
+  assert image_size(_png((640, 480))[:64]) == (640, 480)
+  assert image_size(b'<?xml version="1.0"?><svg xmlns="http://www.w3.org/2000/svg" width="90" height="20px">') == (90, 20)
+  assert image_size(b"<svg viewBox='0 0 10 10'>") is None
+  assert image_size(b"not an image") is None
+
+
+def test_denied_host_matches_subdomains():
+  hosts = ("shields.io",)
+  assert denied_host("https://img.shields.io/badge/build-passing-green.svg", hosts)
+  assert denied_host("https://shields.io/x.svg", hosts)
+  assert not denied_host("https://notshields.io/x.svg", hosts)
+
+
+def test_probe_image_uses_range_request(server):
+  base_url, images, seen = server
+
+  result = probe_image(requests.Session(), f"{base_url}/diagram.png", limit=1024)
+
+  assert result is not None
+  assert result.size == (800, 600)
+  assert result.total_bytes == len(images["/diagram.png"])
+  assert result.read_bytes <= 1024
+  assert seen == [("/diagram.png", "bytes=0-1023")]
+
+
+def test_processor_probes_and_skips_tiny_images(server, tmp_path):
+  base_url, images, seen = server
+  session = requests.Session()
+  stats = ImageStats()
+  processor = KindleImageProcessor(
+    assets_dir=tmp_path / "assets",
+    session=session,
+    stats=stats,
+    probe=ProbeOptions(min_pixels=64, network=True, probe_bytes=64),
+    probe_session=session,
+  )
+
+  assert processor.rewrite("/pixel.png", base_url=f"{base_url}/docs/") is None
+  assert processor.rewrite("/diagram.png", base_url=f"{base_url}/docs/") is not None
+  assert processor.rewrite("/pixel.png", base_url=f"{base_url}/docs/other") is None
+
+  assert seen == [("/pixel.png", "bytes=0-63"), ("/diagram.png", "bytes=0-63"), ("/diagram.png", None)]
+  assert stats.skipped_probe == 1
+  assert stats.probe_requests == 2
+  assert stats.avoided_bytes == len(images["/pixel.png"]) - 64
+  assert stats.failure_hits == 0
+
+
+def test_default_probe_options_keep_every_image(tmp_path):
+  class Response:
+    content = _png((1, 1))
+    headers = {"content-type": "image/png"}
+
+    def raise_for_status(self):
+      return None
+
+  class Session:
+    headers = {}
+
+    def get(self, url, timeout=30, **kwargs):
+      return Response()
+
+  processor = KindleImageProcessor(
+    assets_dir=tmp_path / "assets", session=Session(), probe=PandocEpub2Options().probe
+  )
+
+  assert processor.rewrite("/img/pixel.png", "https://example.com/docs/", (1, 1)) is not None
+  assert processor.rewrite("https://img.shields.io/badge/ci-passing-green.png", "https://example.com/") is not None
+  assert processor.rewrite("https://avatars.githubusercontent.com/u/1", "https://example.com/") is not None
+  stats = processor.stats
+  assert stats.skipped_declared + stats.skipped_host + stats.skipped_probe + stats.skipped_small == 0
+
+
+def test_processor_skips_declared_sizes_and_denied_hosts_without_requests(tmp_path):
+  class NoNetwork:
+    headers = {}
+
+    def get(self, url, timeout=30, **kwargs):
+      raise AssertionError(f"unexpected fetch: {url}")
+
+  stats = ImageStats()
+  processor = KindleImageProcessor(
+    assets_dir=tmp_path / "assets",
+    session=NoNetwork(),
+    stats=stats,
+    probe=ProbeOptions(min_pixels=256, deny_hosts=DEFAULT_DENY_HOSTS),
+  )
+
+  assert processor.rewrite("/img/avatar.png", "https://example.com/docs/", (12, 12)) is None
+  assert processor.rewrite("https://img.shields.io/badge/ci-passing-green.svg", base_url="https://example.com/") is None
+  assert stats.skipped_declared == 1
+  assert stats.skipped_host == 1
+
+
+def test_declared_size_drops_only_that_img(tmp_path):
+  class Response:
+    content = _png((300, 200))
+    headers = {"content-type": "image/png"}
+
+    def raise_for_status(self):
+      return None
+
+  class Session:
+    headers = {}
+
+    def get(self, url, timeout=30, **kwargs):
+      return Response()
+
+  processor = KindleImageProcessor(
+    assets_dir=tmp_path / "assets", session=Session(), workers=2, probe=ProbeOptions(min_pixels=256)
+  )
+  # A small use first, then a full-size one, with the download already running.
+  processor.declare("/img/logo.png", "https://example.com/docs/", (12, 12))
+  processor.prefetch(["/img/logo.png"], "https://example.com/docs/")
+
+  assert processor.rewrite("/img/logo.png", "https://example.com/docs/", (12, 12)) is None
+  assert processor.rewrite("/img/logo.png", "https://example.com/docs/", None) is not None
+  assert processor.rewrite("/img/logo.png", "https://example.com/docs/", (12, 12)) is None
+  assert processor.rewrite("/img/logo.png", "https://example.com/docs/", (300, 200)) is not None
+  processor.close()
+  assert processor.stats.skipped_declared == 2
+  assert processor.stats.failed == 0
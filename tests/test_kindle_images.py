@@ -1,6 +1,20 @@
 import base64
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-from docs2epub.kindle_images import KindleImageProcessor
+import requests
+from PIL import Image
+
+from docs2epub.kindle_images import (
+  DEVICE_PROFILES,
+  ImageOptions,
+  ImageShrinker,
+  ImageStats,
+  ImageStore,
+  KindleImageProcessor,
+  _to_kindle_image,
+)
 
 
 PNG_1X1 = base64.b64decode(
@@ -9,22 +23,35 @@ PNG_1X1 = base64.b64decode(
 
 
 class DummyResponse:
-  def __init__(self, *, content: bytes, content_type: str) -> None:
+  def __init__(self, *, content: bytes, content_type: str, status_code: int = 200, etag: str | None = None) -> None:
     self.content = content
+    self.status_code = status_code
     self.headers = {"content-type": content_type}
+    if etag is not None:
+      self.headers["ETag"] = etag
 
   def raise_for_status(self) -> None:
     return None
 
 
+class MissingResponse(DummyResponse):
+  def __init__(self) -> None:
+    super().__init__(content=b"Not found", content_type="text/plain")
+
+  def raise_for_status(self) -> None:
+    raise requests.HTTPError("404 Client Error")
+
+
 class DummySession:
   def __init__(self, responses: dict[str, DummyResponse]) -> None:
     self.headers = {}
     self._responses = responses
     self.calls: list[str] = []
+    self.sent_headers: list[dict[str, str]] = []
 
-  def get(self, url: str, timeout: int = 30) -> DummyResponse:
+  def get(self, url: str, timeout: int = 30, headers: dict[str, str] | None = None) -> DummyResponse:
     self.calls.append(url)
+    self.sent_headers.append(dict(headers or {}))
     response = self._responses.get(url)
     if response is None:
       raise AssertionError(f"unexpected url fetch: {url}")
@@ -88,3 +115,311 @@ def test_kindle_image_processor_caches_downloaded_assets(tmp_path):
 
   assert a == b
   assert session.calls == ["https://example.com/docs/images/cover.png"]
+
+
+def test_kindle_image_processor_prefetch_matches_sequential_output(tmp_path):
+  responses = {
+    f"https://example.com/img/{name}": DummyResponse(content=PNG_1X1, content_type="image/png")
+    for name in ("a.png", "b.png", "c.png")
+  }
+  sequential = KindleImageProcessor(assets_dir=tmp_path / "seq" / "assets", session=DummySession(responses))
+  expected = [sequential.rewrite(f"/img/{name}", "https://example.com/docs/") for name in ("a.png", "b.png", "c.png")]
+
+  session = DummySession(responses)
+  with KindleImageProcessor(assets_dir=tmp_path / "par" / "assets", session=session, workers=3) as processor:
+    processor.prefetch(["/img/a.png", "/img/b.png", "/img/c.png", "/img/a.png"], "https://example.com/docs/")
+    actual = [processor.rewrite(f"/img/{name}", "https://example.com/docs/") for name in ("a.png", "b.png", "c.png")]
+
+  assert actual == expected
+  assert sorted(session.calls) == sorted(responses)
+  for rel in actual:
+    assert (tmp_path / "par" / rel).read_bytes() == (tmp_path / "seq" / rel).read_bytes()
+
+
+def test_kindle_image_processors_share_one_download_pool(tmp_path):
+  responses = {
+    f"https://example.com/img/{name}": DummyResponse(content=PNG_1X1, content_type="image/png")
+    for name in ("a.png", "b.png")
+  }
+  threads: list[str] = []
+
+  class Session(DummySession):
+    def get(self, url: str, timeout: int = 30) -> DummyResponse:
+      threads.append(threading.current_thread().name)
+      return super().get(url, timeout)
+
+  pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared")
+  try:
+    books = [
+      KindleImageProcessor(assets_dir=tmp_path / book / "assets", session=Session(responses), workers=8, pool=pool)
+      for book in ("one", "two")
+    ]
+    for book, name in zip(books, ("a.png", "b.png")):
+      book.prefetch([f"/img/{name}"], "https://example.com/docs/")
+    books[0].close()
+    # Closing one book leaves the shared pool to the others.
+    assert books[1].rewrite("/img/b.png", "https://example.com/docs/") is not None
+    books[1].close()
+  finally:
+    pool.shutdown()
+
+  assert threads and all(name.startswith("shared") for name in threads)
+
+
+def test_kindle_image_processor_converts_in_worker_processes(tmp_path):
+  url = "https://example.com/img/cover.png"
+  session = DummySession({url: DummyResponse(content=PNG_1X1, content_type="image/png")})
+
+  with KindleImageProcessor(assets_dir=tmp_path / "assets", session=session, workers=2, processes=1) as processor:
+    processor.prefetch([url], "https://example.com/docs/")
+    src = processor.rewrite(url, "https://example.com/docs/")
+    assert processor._convert_pool is not None
+
+  assert src is not None and src.endswith(".png")
+  assert (tmp_path / src).exists()
+
+
+def test_kindle_image_processor_stores_identical_bytes_once(tmp_path):
+  session = DummySession(
+    responses={
+      "https://example.com/img/logo.png": DummyResponse(content=PNG_1X1, content_type="image/png"),
+      "https://cdn.example.com/logo.png?v=2": DummyResponse(content=PNG_1X1, content_type="image/png"),
+    }
+  )
+  stats = ImageStats()
+  processor = KindleImageProcessor(assets_dir=tmp_path / "assets", session=session, stats=stats)
+
+  a = processor.rewrite("/img/logo.png", base_url="https://example.com/docs/intro")
+  b = processor.rewrite("https://cdn.example.com/logo.png?v=2", base_url="https://example.com/docs/intro")
+
+  assert a == b
+  assert len(list((tmp_path / "assets").iterdir())) == 1
+  assert stats.converted == 1
+  assert stats.deduplicated == 1
+  assert stats.saved_bytes == (tmp_path / a).stat().st_size
+
+
+def test_kindle_image_processor_remembers_failed_downloads(tmp_path):
+  session = DummySession(responses={"https://example.com/img/broken.png": MissingResponse()})
+  stats = ImageStats()
+  processor = KindleImageProcessor(assets_dir=tmp_path / "assets", session=session, stats=stats)
+
+  assert processor.rewrite("/img/broken.png", base_url="https://example.com/docs/a") is None
+  assert processor.rewrite("/img/broken.png", base_url="https://example.com/docs/b") is None
+
+  assert session.calls == ["https://example.com/img/broken.png"]
+  assert stats.failed == 1
+  assert stats.failure_hits == 1
+
+
+def test_image_store_revalidates_stored_urls_across_runs(tmp_path):
+  url = "https://example.com/img/cover.png"
+  first = KindleImageProcessor(
+    assets_dir=tmp_path / "run1" / "assets",
+    session=DummySession({url: DummyResponse(content=PNG_1X1, content_type="image/png", etag='"v1"')}),
+    store=ImageStore(tmp_path / "images"),
+  )
+  expected = first.rewrite(url, base_url="https://example.com/docs/")
+  first.close()
+
+  session = DummySession({url: DummyResponse(content=b"", content_type="image/png", status_code=304)})
+  stats = ImageStats()
+  second = KindleImageProcessor(
+    assets_dir=tmp_path / "run2" / "assets",
+    session=session,
+    store=ImageStore(tmp_path / "images"),
+    stats=stats,
+  )
+
+  assert second.rewrite(url, base_url="https://example.com/docs/") == expected
+  assert (tmp_path / "run2" / expected).read_bytes() == (tmp_path / "run1" / expected).read_bytes()
+  # One conditional request; the 304 reuses the stored file as is.
+  assert session.sent_headers == [{"If-None-Match": '"v1"'}]
+  assert (stats.reused, stats.converted) == (1, 0)
+
+
+def test_image_store_reuses_conversions_of_identical_bytes(tmp_path):
+  url = "https://example.com/img/cover.png"
+  first = KindleImageProcessor(
+    assets_dir=tmp_path / "run1" / "assets",
+    session=DummySession({url: DummyResponse(content=PNG_1X1, content_type="image/png")}),
+    store=ImageStore(tmp_path / "images"),
+  )
+  expected = first.rewrite(url, base_url="https://example.com/docs/")
+  first.close()
+
+  # Same bytes under another URL, without validators: downloaded, not converted.
+  other = "https://cdn.example.com/cover.png?v=2"
+  stats = ImageStats()
+  second = KindleImageProcessor(
+    assets_dir=tmp_path / "run2" / "assets",
+    session=DummySession({other: DummyResponse(content=PNG_1X1, content_type="image/png")}),
+    store=ImageStore(tmp_path / "images"),
+    stats=stats,
+  )
+
+  assert second.rewrite(other, base_url="https://example.com/docs/") == expected
+  assert (stats.reused, stats.converted) == (1, 0)
+
+
+def test_image_store_refreshes_images_changed_at_the_same_url(tmp_path):
+  url = "https://example.com/img/cover.png"
+  first = KindleImageProcessor(
+    assets_dir=tmp_path / "run1" / "assets",
+    session=DummySession({url: DummyResponse(content=PNG_1X1, content_type="image/png", etag='"v1"')}),
+    store=ImageStore(tmp_path / "images"),
+  )
+  old = first.rewrite(url, base_url="https://example.com/docs/")
+  first.close()
+
+  changed = _encoded(Image.new("RGB", (40, 30), "red"), "PNG")
+  second = KindleImageProcessor(
+    assets_dir=tmp_path / "run2" / "assets",
+    session=DummySession({url: DummyResponse(content=changed, content_type="image/png", etag='"v2"')}),
+    store=ImageStore(tmp_path / "images"),
+  )
+
+  new = second.rewrite(url, base_url="https://example.com/docs/")
+  assert new is not None and new != old
+  with Image.open(tmp_path / "run2" / new) as image:
+    assert image.size == (40, 30)
+  assert second.stats.reused == 0
+
+
+def _encoded(image: Image.Image, fmt: str) -> bytes:
+  with io.BytesIO() as out:
+    image.save(out, format=fmt)
+    return out.getvalue()
+
+
+def test_to_kindle_image_keeps_jpeg_and_fits_device_screen():
+  photo = Image.effect_noise((4000, 3000), 60).convert("RGB")
+  raw = _encoded(photo, "JPEG")
+
+  converted, suffix = _to_kindle_image(
+    raw,
+    media_type="image/jpeg",
+    ext_hint=".jpg",
+    options=ImageOptions(max_size=DEVICE_PROFILES["paperwhite"], jpeg_quality=70),
+  )
+
+  assert suffix == ".jpg"
+  assert len(converted) < len(raw)
+  with Image.open(io.BytesIO(converted)) as image:
+    assert image.format == "JPEG"
+    assert image.size == (1236, 927)
+
+
+def test_to_kindle_image_keeps_original_jpeg_when_nothing_changes():
+  photo = Image.effect_noise((800, 600), 60).convert("RGB")
+  with io.BytesIO() as out:
+    photo.save(out, format="JPEG", quality=50)
+    raw = out.getvalue()
+
+  assert _to_kindle_image(raw, media_type="image/jpeg", ext_hint=".jpg") == (raw, ".jpg")
+  # Fits the screen already, so the device profile changes nothing either.
+  options = ImageOptions(max_size=DEVICE_PROFILES["kindle"])
+  assert _to_kindle_image(raw, media_type="image/jpeg", ext_hint=".jpg", options=options) == (raw, ".jpg")
+
+
+def test_to_kindle_image_keeps_original_png_when_reencoding_is_larger():
+  gradient = Image.new("RGB", (256, 256))
+  gradient.putdata([(x, y, (x * y) % 256) for y in range(256) for x in range(256)])
+  with io.BytesIO() as out:
+    gradient.save(out, format="PNG", optimize=True)
+    raw = out.getvalue()
+
+  converted, suffix = _to_kindle_image(raw, media_type="image/png", ext_hint=".png")
+
+  assert (converted, suffix) == (raw, ".png")
+
+
+def test_to_kindle_image_palettizes_flat_diagrams():
+  diagram = Image.new("RGB", (2400, 1200), "white")
+  diagram.paste((30, 90, 200), (100, 100, 1200, 600))
+  diagram.paste((220, 40, 40), (1300, 700, 2300, 1100))
+
+  converted, suffix = _to_kindle_image(
+    _encoded(diagram, "PNG"), media_type="image/png", ext_hint=".png", options=ImageOptions(max_size=(1200, 1600))
+  )
+
+  assert suffix == ".png"
+  with Image.open(io.BytesIO(converted)) as image:
+    assert image.mode == "P"
+    assert image.size == (1200, 600)
+
+
+def test_to_kindle_image_converts_to_grayscale():
+  photo = Image.effect_noise((64, 64), 60).convert("RGB")
+
+  converted, suffix = _to_kindle_image(
+    _encoded(photo, "JPEG"), media_type="image/jpeg", ext_hint=".jpg", options=ImageOptions(grayscale=True)
+  )
+
+  assert suffix == ".jpg"
+  with Image.open(io.BytesIO(converted)) as image:
+    assert image.mode == "L"
+
+
+def test_kindle_image_processor_reports_sizes_per_image(tmp_path):
+  url = "https://example.com/img/photo.jpg"
+  raw = _encoded(Image.effect_noise((2000, 1500), 60).convert("RGB"), "JPEG")
+  stats = ImageStats()
+  processor = KindleImageProcessor(
+    assets_dir=tmp_path / "assets",
+    session=DummySession({url: DummyResponse(content=raw, content_type="image/jpeg")}),
+    stats=stats,
+    options=ImageOptions(max_size=DEVICE_PROFILES["kindle"]),
+  )
+
+  src = processor.rewrite(url, base_url="https://example.com/docs/")
+
+  assert src is not None and src.endswith(".jpg")
+  assert stats.sizes == [(url, len(raw), (tmp_path / src).stat().st_size)]
+  assert stats.converted_bytes < stats.original_bytes
+
+
+def test_image_shrinker_shrinks_largest_images_first(monkeypatch, tmp_path):
+  assets = tmp_path / "assets"
+  assets.mkdir()
+  (assets / "img-big.jpg").write_bytes(_encoded(Image.effect_noise((1200, 900), 60).convert("RGB"), "JPEG"))
+  (assets / "img-small.jpg").write_bytes(_encoded(Image.effect_noise((200, 150), 60).convert("RGB"), "JPEG"))
+  small = (assets / "img-small.jpg").read_bytes()
+  opened: list[str] = []
+  real_open = Image.open
+  monkeypatch.setattr(Image, "open", lambda fp, *a, **k: opened.append(str(fp)) or real_open(fp, *a, **k))
+  stats = ImageStats()
+  shrinker = ImageShrinker(assets, stats=stats)
+
+  saved = shrinker.shrink(10_000)
+
+  assert saved >= 10_000
+  assert (assets / "img-small.jpg").read_bytes() == small
+  assert stats.shrunk == 1
+  assert stats.shrink_saved_bytes == saved
+
+  # Further levels reuse the decoded image.
+  while shrinker.shrink(10**9):
+    pass
+  assert opened == [str(assets / "img-big.jpg"), str(assets / "img-small.jpg")]
+  with real_open(assets / "img-big.jpg") as image:
+    assert image.format == "JPEG"
+    assert image.size == (420, 315)
+
+
+def test_image_shrinker_keeps_few_decoded_images(monkeypatch, tmp_path):
+  images = [_encoded(Image.effect_noise((300 + 40 * i, 200), 60).convert("RGB"), "JPEG") for i in range(4)]
+
+  def shrink_all(assets, kept):
+    monkeypatch.setattr("docs2epub.kindle_images.SHRINK_DECODED_IMAGES", kept)
+    assets.mkdir()
+    for index, raw in enumerate(images):
+      (assets / f"img-{index}.jpg").write_bytes(raw)
+    shrinker = ImageShrinker(assets)
+    while shrinker.shrink(20_000):
+      assert len(shrinker._decoded) <= kept
+    return {path.name: path.read_bytes() for path in assets.iterdir()}
+
+  # Images evicted between levels are decoded again from their originals,
+  # so every level comes out the same.
+  assert shrink_all(tmp_path / "bounded", 1) == shrink_all(tmp_path / "cached", 4)
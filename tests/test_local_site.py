@@ -0,0 +1,93 @@
+import io
+import zipfile
+
+from PIL import Image
+
+from docs2epub.docusaurus_next import DocusaurusNextOptions, iter_docusaurus_next
+from docs2epub.kindle_images import KindleImageProcessor
+from docs2epub.local_site import LocalSiteSession
+from docs2epub.stats import RunStats
+
+
+def _png() -> bytes:
+  with io.BytesIO() as out:
+    Image.new("RGB", (2, 2), "white").save(out, format="PNG")
+    return out.getvalue()
+
+
+def _write_site(root):
+  sidebar = """
+  <nav class="menu">
+    <a class="menu__link" href="/docs/intro">Intro</a>
+    <a class="menu__link" href="/docs/install">Install</a>
+  </nav>
+  """
+  (root / "docs" / "install").mkdir(parents=True)
+  (root / "img").mkdir()
+  (root / "docs" / "intro.html").write_text(
+    f'<html><body>{sidebar}<article><h1>Intro</h1><img src="/img/logo.png"></article></body></html>',
+    encoding="utf-8",
+  )
+  (root / "docs" / "install" / "index.html").write_text(
+    f"<html><body>{sidebar}<article><h1>Install</h1><p>pip install</p></article></body></html>",
+    encoding="utf-8",
+  )
+  (root / "img" / "logo.png").write_bytes(_png())
+
+
+def test_local_site_maps_urls_like_a_static_server(tmp_path):
+  _write_site(tmp_path)
+  session = LocalSiteSession(tmp_path, site_url="https://example.com/")
+
+  assert session.get("https://example.com/docs/intro").content.startswith(b"<html>")
+  assert session.get("https://example.com/docs/install/").status_code == 200
+  assert session.get("https://example.com/img/logo.png").headers["Content-Type"] == "image/png"
+  assert session.get("https://example.com/docs/missing").status_code == 404
+  assert session.get("https://cdn.example.com/img/logo.png").status_code == 404
+  assert session.get("https://example.com/../etc/passwd").status_code == 404
+
+
+def test_local_site_serves_zip_with_top_level_directory(tmp_path):
+  site = tmp_path / "site"
+  _write_site(site)
+  archive = tmp_path / "site.zip"
+  with zipfile.ZipFile(archive, "w") as zf:
+    for file in site.rglob("*"):
+      if file.is_file():
+        zf.write(file, f"build/{file.relative_to(site).as_posix()}")
+
+  session = LocalSiteSession(archive, site_url="https://example.com/project/")
+
+  assert session.get("https://example.com/project/docs/intro").status_code == 200
+  assert session.get("https://example.com/docs/intro").status_code == 404
+
+
+def test_iter_crawls_local_export_without_http(tmp_path, monkeypatch):
+  _write_site(tmp_path / "build")
+
+  def no_http(*args, **kwargs):
+    raise AssertionError("local builds must not open an HTTP session")
+
+  monkeypatch.setattr("docs2epub.docusaurus_next.new_session", no_http)
+  options = DocusaurusNextOptions(
+    start_url="https://example.com/docs/intro",
+    source=tmp_path / "build",
+  )
+
+  stats = RunStats()
+  chapters = list(iter_docusaurus_next(options, stats=stats))
+
+  assert [c.title for c in chapters] == ["Intro", "Install"]
+  # No host was contacted, so none is reported with "0 requests".
+  assert stats.host_rates == []
+
+
+def test_images_are_read_from_local_export(tmp_path):
+  _write_site(tmp_path / "build")
+  session = LocalSiteSession(tmp_path / "build", site_url="https://example.com/")
+  processor = KindleImageProcessor(assets_dir=tmp_path / "assets", session=session)
+
+  rel = processor.rewrite("/img/logo.png", "https://example.com/docs/intro")
+
+  assert rel is not None
+  assert (tmp_path / rel).exists()
@@ -1,7 +1,11 @@
+import io
 from pathlib import Path
 
+from PIL import Image
+
+from docs2epub.chapter_cache import ChapterCache
 from docs2epub.model import Chapter
-from docs2epub.pandoc_epub2 import PandocEpub2Options, build_epub2_with_pandoc
+from docs2epub.pandoc_epub2 import PandocEpub2Options, _read_ahead, build_epub2_with_pandoc
 
 
 def test_build_epub2_sets_resource_path_and_cwd(monkeypatch, tmp_path):
@@ -84,3 +88,165 @@ def test_build_epub2_uses_absolute_output_path(monkeypatch, tmp_path):
   assert isinstance(cmd, list)
   out_idx = cmd.index("-o")
   assert cmd[out_idx + 1] == str((tmp_path / "book.epub").resolve())
+
+
+def test_read_ahead_prefetches_images_of_upcoming_chapters():
+  prefetched: list[tuple[str, ...]] = []
+
+  class Processor:
+    def declare(self, src, base_url, size):
+      pass
+
+    def too_small(self, size):
+      return False
+
+    def prefetch(self, srcs, base_url):
+      prefetched.append(tuple(srcs))
+
+  chapters = [
+    Chapter(index=i, title=str(i), url=f"https://example.com/docs/{i}", html=f'<img src="/img/{i}.png">')
+    for i in range(1, 5)
+  ]
+  seen: list[int] = []
+  for ch, _ in _read_ahead(chapters, Processor(), 2):
+    seen.append(ch.index)
+    # Images of the next two chapters are already on their way.
+    assert len(prefetched) == min(4, ch.index + 2)
+
+  assert seen == [1, 2, 3, 4]
+  assert prefetched == [(f"/img/{i}.png",) for i in range(1, 5)]
+
+
+def test_build_epub2_reuses_cleaned_chapters_from_the_cache(monkeypatch, tmp_path):
+  monkeypatch.setattr("docs2epub.pandoc_epub2.shutil.which", lambda _: "/usr/bin/pandoc")
+  written: list[str] = []
+
+  class Proc:
+    returncode = 0
+    stderr = ""
+    stdout = ""
+
+  def fake_run(cmd, **kwargs):
+    html = (kwargs["cwd"] / "chapter_0001.html").read_text(encoding="utf-8")
+    # The image the body points at is in the book either way.
+    (asset,) = (kwargs["cwd"] / "assets").iterdir()
+    assert f'src="assets/{asset.name}"' in html
+    written.append(html)
+    Path(cmd[cmd.index("-o") + 1]).write_bytes(b"epub")
+    return Proc()
+
+  monkeypatch.setattr("docs2epub.pandoc_epub2.subprocess.run", fake_run)
+
+  class Response:
+    headers = {"content-type": "image/png"}
+
+    def __init__(self, content):
+      self.content = content
+
+    def raise_for_status(self):
+      return None
+
+  class Session:
+    headers = {}
+
+    def get(self, url, timeout=30, **kwargs):
+      with io.BytesIO() as out:
+        Image.new("RGB", (400, 300), "navy").save(out, format="PNG")
+        return Response(out.getvalue())
+
+  cache = ChapterCache(tmp_path / "chapters")
+
+  def build() -> None:
+    chapter = Chapter(
+      index=1,
+      title="One",
+      url="https://example.com/docs/",
+      html='<p tabindex="1">body</p><img src="/img/a.png">',
+      key="a" * 64,
+    )
+    build_epub2_with_pandoc(
+      chapters=[chapter],
+      out_file=tmp_path / "out.epub",
+      title="Book",
+      author="Author",
+      language="en",
+      publisher=None,
+      identifier=None,
+      verbose=False,
+      options=PandocEpub2Options(image_workers=0, image_processes=0),
+      session=Session(),
+      chapter_cache=cache,
+    )
+
+  build()
+
+  def fail(*args, **kwargs):
+    raise AssertionError("cached chapter parsed or cleaned again")
+
+  monkeypatch.setattr("docs2epub.pandoc_epub2.parse_fragment", fail)
+  monkeypatch.setattr("docs2epub.pandoc_epub2.clean_html_for_kindle_epub2", fail)
+  build()
+
+  assert written[0] == written[1]
+  assert "tabindex" not in written[1]
+  assert (cache.stats.cleaned_hits, cache.stats.cleaned_misses) == (1, 1)
+
+
+def test_build_epub2_reencodes_images_until_book_fits(monkeypatch, tmp_path):
+  monkeypatch.setattr("docs2epub.pandoc_epub2.shutil.which", lambda _: "/usr/bin/pandoc")
+  runs: list[int] = []
+
+  class Proc:
+    returncode = 0
+    stderr = ""
+    stdout = ""
+
+  def fake_run(cmd, **kwargs):
+    # Stand-in for pandoc: the book is as large as its images.
+    size = sum(path.stat().st_size for path in (kwargs["cwd"] / "assets").iterdir())
+    runs.append(size)
+    Path(cmd[cmd.index("-o") + 1]).write_bytes(b"x" * size)
+    return Proc()
+
+  monkeypatch.setattr("docs2epub.pandoc_epub2.subprocess.run", fake_run)
+
+  def photo(sigma: int) -> bytes:
+    with io.BytesIO() as out:
+      Image.effect_noise((1000, 800), sigma).convert("RGB").save(out, format="JPEG", quality=90)
+      return out.getvalue()
+
+  class Response:
+    headers = {"content-type": "image/jpeg"}
+
+    def __init__(self, content):
+      self.content = content
+
+    def raise_for_status(self):
+      return None
+
+  class Session:
+    headers = {}
+
+    def get(self, url, timeout=30, **kwargs):
+      return Response(photo(40 + int(url[-5])))
+
+  chapters = [
+    Chapter(index=i, title=str(i), url="https://example.com/docs/", html=f'<p>x</p><img src="/img/{i}.jpg">')
+    for i in range(1, 4)
+  ]
+  out_file = build_epub2_with_pandoc(
+    chapters=chapters,
+    out_file=tmp_path / "out.epub",
+    title="Book",
+    author="Author",
+    language="en",
+    publisher=None,
+    identifier=None,
+    verbose=False,
+    options=PandocEpub2Options(image_workers=0, image_processes=0, max_bytes=400_000),
+    session=Session(),
+  )
+
+  assert len(runs) >= 2
+  assert runs[0] > 400_000
+  assert out_file.stat().st_size <= 400_000
@@ -0,0 +1,90 @@
+from datetime import datetime, timezone
+
+from docs2epub.ratelimit import HostRateLimiter, parse_crawl_delay, parse_retry_after
+
+
+class FakeClock:
+  def __init__(self) -> None:
+    self.now = 0.0
+    self.sleeps: list[float] = []
+
+  def __call__(self) -> float:
+    return self.now
+
+  def sleep(self, seconds: float) -> None:
+    self.sleeps.append(seconds)
+    self.now += seconds
+
+
+def _limiter(clock: FakeClock, **kwargs) -> HostRateLimiter:
+  return HostRateLimiter(clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def test_limiter_spaces_requests_to_the_same_host():
+  clock = FakeClock()
+  limiter = _limiter(clock, initial_rate=2.0, additive_step=0.0)
+
+  for _ in range(3):
+    limiter.acquire("https://example.com/docs/a")
+
+  assert clock.now == 1.0
+  assert limiter.summaries()[0].requests == 3
+
+
+def test_limiter_tracks_hosts_independently():
+  clock = FakeClock()
+  limiter = _limiter(clock, initial_rate=1.0)
+
+  limiter.acquire("https://a.example.com/")
+  limiter.acquire("https://b.example.com/")
+
+  assert clock.sleeps == []
+
+
+def test_limiter_increases_rate_additively_on_fast_responses():
+  clock = FakeClock()
+  limiter = _limiter(clock, initial_rate=1.0, max_rate=2.0, additive_step=0.5)
+
+  for _ in range(4):
+    limiter.record("https://example.com/", latency_s=0.1)
+
+  assert limiter.summaries()[0].final_rate == 2.0
+
+
+def test_limiter_halves_rate_and_honors_retry_after_on_throttle():
+  clock = FakeClock()
+  limiter = _limiter(clock, initial_rate=4.0)
+
+  limiter.acquire("https://example.com/")
+  limiter.record("https://example.com/", latency_s=0.1, throttled=True, retry_after_s=5.0)
+  limiter.acquire("https://example.com/")
+
+  summary = limiter.summaries()[0]
+  assert summary.throttled == 1
+  assert summary.final_rate == 2.0
+  assert clock.now >= 5.0
+
+
+def test_limiter_caps_rate_with_crawl_delay():
+  clock = FakeClock()
+  limiter = _limiter(clock, initial_rate=float("inf"), robots_loader=lambda url: 2.0)
+
+  limiter.acquire("https://example.com/")
+  limiter.acquire("https://example.com/")
+
+  assert clock.now == 2.0
+  assert limiter.summaries()[0].final_rate == 0.5
+
+
+def test_parse_retry_after_accepts_seconds_and_dates():
+  now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+  assert parse_retry_after("7") == 7.0
+  assert parse_retry_after("Mon, 01 Jan 2024 00:00:30 GMT", now=now) == 30.0
+  assert parse_retry_after("soon") is None
+  assert parse_retry_after(None) is None
+
+
+def test_parse_crawl_delay_matches_user_agent():
+  robots = "User-agent: docs2epub\nCrawl-delay: 3\n\nUser-agent: *\nCrawl-delay: 1\n"
+  assert parse_crawl_delay(robots, user_agent="docs2epub/0.1 (+https://x)") == 3.0
+  assert parse_crawl_delay(robots, user_agent="other") == 1.0
@@ -1,53 +1,13 @@
+import pytest
 import requests
 
+from docs2epub.chapter_cache import ChapterCache
+from docs2epub.checkpoint import CrawlCheckpoint
 from docs2epub.docusaurus_next import DocusaurusNextOptions, iter_docusaurus_next
+from docs2epub.stats import RunStats
+from docs2epub.transport import make_response
 
-
-def _make_session(pages: dict[str, str]):
-  class DummyResponse:
-    def __init__(self, text: str) -> None:
-      self.text = text
-
-    def raise_for_status(self) -> None:
-      return None
-
-  class DummySession:
-    def __init__(self) -> None:
-      self.headers = {}
-
-    def get(self, url: str, timeout: int = 30) -> DummyResponse:
-      if url not in pages:
-        raise AssertionError(f"unexpected url fetch: {url}")
-      return DummyResponse(pages[url])
-
-  return DummySession
-
-
-def _make_session_with_status(pages: dict[str, tuple[int, str]]):
-  class DummyResponse:
-    def __init__(self, url: str, status_code: int, text: str) -> None:
-      self.url = url
-      self.status_code = status_code
-      self.text = text
-
-    def raise_for_status(self) -> None:
-      if self.status_code >= 400:
-        raise requests.HTTPError(
-          f"{self.status_code} Client Error",
-          response=self,
-        )
-
-  class DummySession:
-    def __init__(self) -> None:
-      self.headers = {}
-
-    def get(self, url: str, timeout: int = 30) -> DummyResponse:
-      if url not in pages:
-        raise AssertionError(f"unexpected url fetch: {url}")
-      status_code, text = pages[url]
-      return DummyResponse(url, status_code, text)
-
-  return DummySession
+from sessions import make_session, make_session_with_status
 
 
 def test_iter_uses_gitbook_sidebar_links(monkeypatch):
@@ -64,12 +24,12 @@ def test_iter_uses_gitbook_sidebar_links(monkeypatch):
   }
 
   monkeypatch.setattr(
-    "docs2epub.docusaurus_next.requests.Session",
-    lambda: _make_session(pages)(),
+    "docs2epub.docusaurus_next.new_session",
+    lambda *args, **kwargs: make_session(pages)(),
   )
 
   options = DocusaurusNextOptions(start_url=start_url, sleep_s=0)
-  chapters = iter_docusaurus_next(options)
+  chapters = list(iter_docusaurus_next(options))
 
   assert [c.title for c in chapters] == ["Intro", "Chapter 1"]
 
@@ -88,12 +48,12 @@ def test_iter_uses_docusaurus_menu_sidebar(monkeypatch):
   }
 
   monkeypatch.setattr(
-    "docs2epub.docusaurus_next.requests.Session",
-    lambda: _make_session(pages)(),
+    "docs2epub.docusaurus_next.new_session",
+    lambda *args, **kwargs: make_session(pages)(),
   )
 
   options = DocusaurusNextOptions(start_url=start_url, sleep_s=0)
-  chapters = iter_docusaurus_next(options)
+  chapters = list(iter_docusaurus_next(options))
 
   assert [c.title for c in chapters] == ["Intro", "Install"]
 
@@ -121,12 +81,12 @@ def test_iter_expands_links_from_index_pages(monkeypatch):
   }
 
   monkeypatch.setattr(
-    "docs2epub.docusaurus_next.requests.Session",
-    lambda: _make_session(pages)(),
+    "docs2epub.docusaurus_next.new_session",
+    lambda *args, **kwargs: make_session(pages)(),
   )
 
   options = DocusaurusNextOptions(start_url=start_url, sleep_s=0)
-  chapters = iter_docusaurus_next(options)
+  chapters = list(iter_docusaurus_next(options))
 
   assert [c.title for c in chapters] == ["Intro", "Getting Started", "One", "Two"]
 
@@ -153,12 +113,12 @@ def test_iter_skips_sidebar_links_that_404(monkeypatch):
   }
 
   monkeypatch.setattr(
-    "docs2epub.docusaurus_next.requests.Session",
-    lambda: _make_session_with_status(pages)(),
+    "docs2epub.docusaurus_next.new_session",
+    lambda *args, **kwargs: make_session_with_status(pages)(),
   )
 
   options = DocusaurusNextOptions(start_url=start_url, sleep_s=0)
-  chapters = iter_docusaurus_next(options)
+  chapters = list(iter_docusaurus_next(options))
 
   assert [c.title for c in chapters] == ["Intro", "Other"]
 
@@ -202,12 +162,12 @@ def test_iter_resolves_links_against_canonical(monkeypatch):
   }
 
   monkeypatch.setattr(
-    "docs2epub.docusaurus_next.requests.Session",
-    lambda: _make_session_with_status(pages)(),
+    "docs2epub.docusaurus_next.new_session",
+    lambda *args, **kwargs: make_session_with_status(pages)(),
   )
 
   options = DocusaurusNextOptions(start_url=start_url, sleep_s=0)
-  chapters = iter_docusaurus_next(options)
+  chapters = list(iter_docusaurus_next(options))
 
   assert [c.title for c in chapters] == ["Home", "Quickstart", "Install"]
 
@@ -239,12 +199,12 @@ def test_iter_refetches_canonical_for_sidebar(monkeypatch):
   }
 
   monkeypatch.setattr(
-    "docs2epub.docusaurus_next.requests.Session",
-    lambda: _make_session_with_status(pages)(),
+    "docs2epub.docusaurus_next.new_session",
+    lambda *args, **kwargs: make_session_with_status(pages)(),
   )
 
   options = DocusaurusNextOptions(start_url=start_url, sleep_s=0)
-  chapters = iter_docusaurus_next(options)
+  chapters = list(iter_docusaurus_next(options))
 
   assert [c.title for c in chapters] == ["Home", "One"]
 
@@ -271,12 +231,12 @@ def test_iter_skips_pages_without_article(monkeypatch):
   }
 
   monkeypatch.setattr(
-    "docs2epub.docusaurus_next.requests.Session",
-    lambda: _make_session_with_status(pages)(),
+    "docs2epub.docusaurus_next.new_session",
+    lambda *args, **kwargs: make_session_with_status(pages)(),
   )
 
   options = DocusaurusNextOptions(start_url=start_url, sleep_s=0)
-  chapters = iter_docusaurus_next(options)
+  chapters = list(iter_docusaurus_next(options))
 
   assert [c.title for c in chapters] == ["Intro", "Other"]
 
@@ -291,12 +251,12 @@ def test_iter_falls_back_to_body_when_no_article(monkeypatch):
   }
 
   monkeypatch.setattr(
-    "docs2epub.docusaurus_next.requests.Session",
-    lambda: _make_session_with_status(pages)(),
+    "docs2epub.docusaurus_next.new_session",
+    lambda *args, **kwargs: make_session_with_status(pages)(),
   )
 
   options = DocusaurusNextOptions(start_url=start_url, sleep_s=0)
-  chapters = iter_docusaurus_next(options)
+  chapters = list(iter_docusaurus_next(options))
 
   assert [c.title for c in chapters] == ["Book"]
 
@@ -315,12 +275,420 @@ def test_iter_resolves_relative_image_sources_against_page_url(monkeypatch):
   }
 
   monkeypatch.setattr(
-    "docs2epub.docusaurus_next.requests.Session",
-    lambda: _make_session_with_status(pages)(),
+    "docs2epub.docusaurus_next.new_session",
+    lambda *args, **kwargs: make_session_with_status(pages)(),
   )
 
   options = DocusaurusNextOptions(start_url=start_url, sleep_s=0)
-  chapters = iter_docusaurus_next(options)
+  chapters = list(iter_docusaurus_next(options))
 
   assert len(chapters) == 1
   assert 'src="https://example.com/docs/images/diagram.png"' in chapters[0].html
+
+
+def _concurrent_site() -> tuple[str, dict[str, str], dict[str, float]]:
+  start_url = "https://example.com/docs/intro"
+  names = ["intro", "alpha", "beta", "gamma", "delta"]
+  sidebar = "<nav class=\"menu\">" + "".join(
+    f'<a class="menu__link" href="/docs/{name}">{name}</a>' for name in names
+  ) + "</nav>"
+  pages: dict[str, str] = {}
+  for name in names:
+    extra = '<a href="/docs/alpha-extra">More</a>' if name == "alpha" else ""
+    extra += '<a href="/docs/gamma-extra">More</a>' if name == "gamma" else ""
+    pages[f"https://example.com/docs/{name}"] = (
+      f"<html><body>{sidebar}<article><h1>{name.title()}</h1>{extra}</article></body></html>"
+    )
+  for name in ["alpha-extra", "gamma-extra"]:
+    pages[f"https://example.com/docs/{name}"] = (
+      f"<html><body><article><h1>{name.title()}</h1></article></body></html>"
+    )
+  # Earlier pages are slower so completion order is the reverse of queue order.
+  delays = {
+    "https://example.com/docs/alpha": 0.08,
+    "https://example.com/docs/beta": 0.05,
+    "https://example.com/docs/gamma": 0.02,
+  }
+  return start_url, pages, delays
+
+
+def test_iter_concurrent_crawl_keeps_discovery_order(monkeypatch):
+  start_url, pages, delays = _concurrent_site()
+  calls: list[str] = []
+
+  monkeypatch.setattr(
+    "docs2epub.docusaurus_next.new_session",
+    lambda *args, **kwargs: make_session(pages, delays=delays, calls=calls)(),
+  )
+
+  options = DocusaurusNextOptions(start_url=start_url, sleep_s=0, concurrency=4)
+  chapters = list(iter_docusaurus_next(options))
+
+  assert [c.title for c in chapters] == [
+    "Intro",
+    "Alpha",
+    "Beta",
+    "Gamma",
+    "Delta",
+    "Alpha-Extra",
+    "Gamma-Extra",
+  ]
+  assert [c.index for c in chapters] == list(range(1, 8))
+
+
+def test_iter_concurrent_crawl_honors_max_pages(monkeypatch):
+  start_url, pages, delays = _concurrent_site()
+  calls: list[str] = []
+
+  monkeypatch.setattr(
+    "docs2epub.docusaurus_next.new_session",
+    lambda *args, **kwargs: make_session(pages, delays=delays, calls=calls)(),
+  )
+
+  options = DocusaurusNextOptions(start_url=start_url, sleep_s=0, max_pages=3, concurrency=4)
+  chapters = list(iter_docusaurus_next(options))
+
+  assert [c.title for c in chapters] == ["Intro", "Alpha", "Beta"]
+  assert len(calls) == len(set(calls))
+  # Pages past the limit are never requested.
+  assert sorted(calls) == sorted([start_url, "https://example.com/docs/alpha", "https://example.com/docs/beta"])
+
+
+def test_iter_retries_throttled_pages(monkeypatch):
+  start_url = "https://example.com/docs/intro"
+  sidebar = """
+  <nav class="menu">
+    <a class="menu__link" href="/docs/intro">Intro</a>
+    <a class="menu__link" href="/docs/busy">Busy</a>
+  </nav>
+  """
+  responses = {
+    start_url: [(200, f"<html><body>{sidebar}<article><h1>Intro</h1></article></body></html>")],
+    "https://example.com/docs/busy": [
+      (429, "Slow down"),
+      (200, f"<html><body>{sidebar}<article><h1>Busy</h1></article></body></html>"),
+    ],
+  }
+
+  monkeypatch.setattr(
+    "docs2epub.docusaurus_next.new_session",
+    lambda *args, **kwargs: make_session_with_status(responses, headers={"Retry-After": "0"})(),
+  )
+
+  stats = RunStats()
+  options = DocusaurusNextOptions(start_url=start_url, sleep_s=0)
+  chapters = list(iter_docusaurus_next(options, stats=stats))
+
+  assert [c.title for c in chapters] == ["Intro", "Busy"]
+  assert stats.host_rates[0].throttled == 1
+  assert (stats.page_parse.pages, stats.page_parse.detected) == (2, 0)
+  assert any(line.startswith("Page parsing: 2 pages") for line in stats.summary_lines())
+
+
+def test_iter_reuses_cached_chapter_artifacts(monkeypatch, tmp_path):
+  start_url = "https://example.com/docs/intro"
+  sidebar = """
+  <nav class="menu">
+    <a class="menu__link" href="/docs/intro">Intro</a>
+    <a class="menu__link" href="/docs/install">Install</a>
+  </nav>
+  """
+  pages = {
+    start_url: f"<html><body>{sidebar}<article><h1>Intro</h1><img src=\"a.png\" /></article></body></html>",
+    "https://example.com/docs/install": f"<html><body>{sidebar}<article><h1>Install</h1></article></body></html>",
+  }
+
+  monkeypatch.setattr(
+    "docs2epub.docusaurus_next.new_session",
+    lambda *args, **kwargs: make_session(pages)(),
+  )
+
+  options = DocusaurusNextOptions(start_url=start_url, sleep_s=0)
+  first = list(iter_docusaurus_next(options, chapter_cache=ChapterCache(tmp_path)))
+
+  def fail(*args, **kwargs):
+    raise AssertionError("unchanged page was re-extracted")
+
+  monkeypatch.setattr("docs2epub.docusaurus_next._extract_artifact", fail)
+  cache = ChapterCache(tmp_path)
+  second = list(iter_docusaurus_next(options, chapter_cache=cache))
+
+  assert second == first
+  assert second[0].image_urls == ("https://example.com/docs/a.png",)
+  assert (cache.stats.hits, cache.stats.misses) == (2, 0)
+
+
+def test_iter_sitemap_discovery_orders_by_sidebar(monkeypatch):
+  start_url = "https://example.com/docs/intro"
+  sidebar = """
+  <nav class="menu">
+    <a class="menu__link" href="/docs/intro">Intro</a>
+    <a class="menu__link" href="/docs/install">Install</a>
+  </nav>
+  """
+  sitemap = """<?xml version="1.0"?>
+  <urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+    <url><loc>https://example.com/docs/hidden</loc></url>
+    <url><loc>https://example.com/docs/install</loc></url>
+    <url><loc>https://example.com/blog/post</loc></url>
+    <url><loc>https://example.com/docs/intro</loc></url>
+  </urlset>
+  """
+  pages = {
+    "https://example.com/sitemap.xml": (200, sitemap),
+    start_url: (200, f"<html><body>{sidebar}<article><h1>Intro</h1></article></body></html>"),
+    "https://example.com/docs/install": (200, "<html><body><article><h1>Install</h1></article></body></html>"),
+    "https://example.com/docs/hidden": (200, "<html><body><article><h1>Hidden</h1></article></body></html>"),
+  }
+
+  monkeypatch.setattr(
+    "docs2epub.docusaurus_next.new_session",
+    lambda *args, **kwargs: make_session_with_status(pages, missing=(404, "Not found"))(),
+  )
+
+  options = DocusaurusNextOptions(start_url=start_url, sleep_s=0, discovery="sitemap")
+  chapters = list(iter_docusaurus_next(options))
+
+  assert [c.title for c in chapters] == ["Intro", "Install", "Hidden"]
+
+
+def test_iter_yields_chapters_before_the_crawl_finishes(monkeypatch):
+  start_url, pages, _ = _concurrent_site()
+  calls: list[str] = []
+
+  monkeypatch.setattr(
+    "docs2epub.docusaurus_next.new_session",
+    lambda *args, **kwargs: make_session(pages, calls=calls)(),
+  )
+
+  options = DocusaurusNextOptions(start_url=start_url, sleep_s=0, concurrency=1)
+  crawl = iter_docusaurus_next(options)
+  assert calls == []
+
+  first = next(crawl)
+
+  assert first.title == "Intro"
+  assert calls == [start_url]
+  assert [c.title for c in crawl][-1] == "Gamma-Extra"
+
+
+def test_iter_resumes_sidebar_crawl_from_checkpoint(monkeypatch, tmp_path):
+  start_url = "https://example.com/docs/intro"
+  sidebar = """
+  <nav class="menu">
+    <a class="menu__link" href="/docs/intro">Intro</a>
+    <a class="menu__link" href="/docs/a">A</a>
+    <a class="menu__link" href="/docs/b">B</a>
+    <a class="menu__link" href="/docs/c">C</a>
+  </nav>
+  """
+  pages = {
+    start_url: (200, f"<html><body>{sidebar}<article><h1>Intro</h1></article></body></html>"),
+    "https://example.com/docs/a": (200, "<html><body><article><h1>A</h1></article></body></html>"),
+    "https://example.com/docs/b": (500, "Server error"),
+    "https://example.com/docs/c": (200, "<html><body><article><h1>C</h1></article></body></html>"),
+  }
+  calls: list[str] = []
+  monkeypatch.setattr(
+    "docs2epub.docusaurus_next.new_session",
+    lambda *args, **kwargs: make_session_with_status(pages, calls=calls)(),
+  )
+  options = DocusaurusNextOptions(start_url=start_url, sleep_s=0, concurrency=1, respect_robots=False)
+
+  crawled: list[str] = []
+  with pytest.raises(requests.HTTPError):
+    for chapter in iter_docusaurus_next(options, checkpoint=CrawlCheckpoint(tmp_path)):
+      crawled.append(chapter.title)
+  assert crawled == ["Intro", "A"]
+
+  pages["https://example.com/docs/b"] = (200, "<html><body><article><h1>B</h1></article></body></html>")
+  calls.clear()
+  checkpoint = CrawlCheckpoint(tmp_path, resume=True)
+  chapters = list(iter_docusaurus_next(options, checkpoint=checkpoint))
+
+  assert [(c.index, c.title) for c in chapters] == [(1, "Intro"), (2, "A"), (3, "B"), (4, "C")]
+  assert calls == ["https://example.com/docs/b", "https://example.com/docs/c"]
+  assert checkpoint.replayed == 2
+
+  calls.clear()
+  replayed = list(iter_docusaurus_next(options, checkpoint=CrawlCheckpoint(tmp_path, resume=True)))
+  assert [c.title for c in replayed] == ["Intro", "A", "B", "C"]
+  assert calls == []
+
+  other = DocusaurusNextOptions(start_url="https://example.com/docs/other", sleep_s=0)
+  with pytest.raises(ValueError):
+    list(iter_docusaurus_next(other, checkpoint=CrawlCheckpoint(tmp_path, resume=True)))
+
+
+def test_iter_resumes_next_chain_from_checkpoint(monkeypatch, tmp_path):
+  def page(title: str, next_href: str | None) -> str:
+    pager = f'<nav aria-label="Docs pages"><a href="{next_href}">Next</a></nav>' if next_href else ""
+    return f"<html><body><article><h1>{title}</h1></article>{pager}</body></html>"
+
+  start_url = "https://example.com/docs/one"
+  pages = {
+    start_url: (200, page("One", "/docs/two")),
+    "https://example.com/docs/two": (503, "Unavailable"),
+    "https://example.com/docs/three": (200, page("Three", None)),
+  }
+  calls: list[str] = []
+  monkeypatch.setattr(
+    "docs2epub.docusaurus_next.new_session",
+    lambda *args, **kwargs: make_session_with_status(pages, calls=calls)(),
+  )
+  options = DocusaurusNextOptions(start_url=start_url, sleep_s=0, respect_robots=False, max_retries=0)
+
+  with pytest.raises(requests.HTTPError):
+    list(iter_docusaurus_next(options, checkpoint=CrawlCheckpoint(tmp_path)))
+
+  pages["https://example.com/docs/two"] = (200, page("Two", "/docs/three"))
+  calls.clear()
+  chapters = list(iter_docusaurus_next(options, checkpoint=CrawlCheckpoint(tmp_path, resume=True)))
+
+  assert [c.title for c in chapters] == ["One", "Two", "Three"]
+  assert calls == ["https://example.com/docs/two", "https://example.com/docs/three"]
+
+
+def test_iter_process_workers_keep_discovery_order(monkeypatch):
+  start_url, pages, delays = _concurrent_site()
+  calls: list[str] = []
+
+  # Worker processes are forked, so they inherit the patched session.
+  monkeypatch.setattr(
+    "docs2epub.docusaurus_next.new_session",
+    lambda *args, **kwargs: make_session(pages, delays=delays, calls=calls)(),
+  )
+
+  stats = RunStats()
+  options = DocusaurusNextOptions(start_url=start_url, sleep_s=0, processes=2, respect_robots=False)
+  chapters = list(iter_docusaurus_next(options, stats=stats))
+
+  assert [c.title for c in chapters] == [
+    "Intro",
+    "Alpha",
+    "Beta",
+    "Gamma",
+    "Delta",
+    "Alpha-Extra",
+    "Gamma-Extra",
+  ]
+  assert [c.index for c in chapters] == list(range(1, 8))
+  assert sum(stats.worker_pages.values()) == 6
+
+
+def test_iter_process_workers_stop_at_page_limit_and_report_stats(monkeypatch):
+  start_url, pages, delays = _concurrent_site()
+
+  class Session(make_session(pages, delays=delays)):
+    def get(self, url: str, timeout: int = 30, **kwargs):
+      # Real responses, so the download budget counts them.
+      resp = super().get(url, timeout=timeout, **kwargs)
+      return make_response(url, status=resp.status_code, body=resp.content)
+
+  monkeypatch.setattr("docs2epub.docusaurus_next.new_session", lambda *args, **kwargs: Session())
+
+  stats = RunStats()
+  options = DocusaurusNextOptions(start_url=start_url, sleep_s=0, processes=2, respect_robots=False, max_pages=2)
+  chapters = list(iter_docusaurus_next(options, stats=stats))
+
+  assert [c.title for c in chapters] == ["Intro", "Alpha"]
+  # Only Alpha was handed to the workers; Beta and Gamma finish sooner.
+  assert stats.worker_pages == {1: 1} or stats.worker_pages == {2: 1}
+  assert stats.page_parse.pages == 2
+  fetched = (start_url, "https://example.com/docs/alpha")
+  assert stats.downloads.downloaded_bytes == sum(len(pages[url].encode("utf-8")) for url in fetched)
+
+
+def test_iter_process_workers_report_failed_pages(monkeypatch):
+  start_url = "https://example.com/docs/intro"
+  sidebar = """
+  <nav class="menu">
+    <a class="menu__link" href="/docs/intro">Intro</a>
+    <a class="menu__link" href="/docs/broken">Broken</a>
+  </nav>
+  """
+  pages = {
+    start_url: (200, f"<html><body>{sidebar}<article><h1>Intro</h1></article></body></html>"),
+    "https://example.com/docs/broken": (500, "Server error"),
+  }
+  monkeypatch.setattr(
+    "docs2epub.docusaurus_next.new_session",
+    lambda *args, **kwargs: make_session_with_status(pages)(),
+  )
+
+  options = DocusaurusNextOptions(start_url=start_url, sleep_s=0, processes=2, respect_robots=False)
+  crawled: list[str] = []
+  with pytest.raises(RuntimeError, match="docs/broken"):
+    for chapter in iter_docusaurus_next(options):
+      crawled.append(chapter.title)
+
+  assert crawled == ["Intro"]
+
+
+def test_iter_skips_duplicate_pages_before_yielding(monkeypatch):
+  start_url = "https://example.com/docs/intro"
+  sidebar = """
+  <nav class="menu">
+    <a class="menu__link" href="/docs">Docs</a>
+    <a class="menu__link" href="/docs/intro">Intro</a>
+    <a class="menu__link" href="/docs/install">Install</a>
+  </nav>
+  """
+  body = " ".join(f"Paragraph {i} describes the docs2epub crawler in some detail." for i in range(10))
+  intro = f"<html><body>{sidebar}<article><h1>Intro</h1><p>{body}</p></article></body></html>"
+  pages = {
+    start_url: intro,
+    "https://example.com/docs": intro,
+    "https://example.com/docs/install": f"<html><body><article><h1>Install</h1><p>Run it.</p></article></body></html>",
+  }
+  monkeypatch.setattr(
+    "docs2epub.docusaurus_next.new_session",
+    lambda *args, **kwargs: make_session(pages)(),
+  )
+
+  stats = RunStats()
+  options = DocusaurusNextOptions(start_url=start_url, sleep_s=0, respect_robots=False)
+  chapters = list(iter_docusaurus_next(options, stats=stats))
+
+  assert [(c.index, c.url) for c in chapters] == [
+    (1, "https://example.com/docs"),
+    (2, "https://example.com/docs/install"),
+  ]
+  assert stats.duplicates == [("https://example.com/docs/intro", "https://example.com/docs")]
+
+  kept = list(iter_docusaurus_next(DocusaurusNextOptions(start_url=start_url, sleep_s=0, dedupe=False)))
+  assert len(kept) == 3
+
+
+def test_iter_prefetches_next_chain_and_discards_off_chain_pages(monkeypatch):
+  def page(title: str, next_href: str | None, guess: str | None = None) -> str:
+    head = f'<link rel="prefetch" href="{guess}">' if guess else ""
+    pager = (
+      f'<nav aria-label="Docs pages"><a class="pagination-nav__link--next" href="{next_href}">Next</a></nav>'
+      if next_href
+      else ""
+    )
+    return f"<html><head>{head}</head><body><article><h1>{title}</h1></article>{pager}</body></html>"
+
+  start_url = "https://example.com/docs/one"
+  pages = {
+    start_url: page("One", "/docs/two"),
+    "https://example.com/docs/two": page("Two", "/docs/three", guess="/docs/elsewhere"),
+    "https://example.com/docs/three": page("Three", None),
+    "https://example.com/docs/elsewhere": page("Elsewhere", None),
+  }
+  calls: list[str] = []
+  monkeypatch.setattr(
+    "docs2epub.docusaurus_next.new_session",
+    lambda *args, **kwargs: make_session(pages, calls=calls)(),
+  )
+
+  stats = RunStats()
+  options = DocusaurusNextOptions(start_url=start_url, sleep_s=0, respect_robots=False)
+  chapters = list(iter_docusaurus_next(options, stats=stats))
+
+  assert [c.title for c in chapters] == ["One", "Two", "Three"]
+  assert calls.count("https://example.com/docs/two") == 1
+  assert calls.count("https://example.com/docs/three") == 1
+  assert stats.prefetch.hits == 2
+  assert stats.prefetch.discarded == 1
@@ -0,0 +1,50 @@
+import gzip
+from datetime import datetime, timezone
+
+from docs2epub.sitemap import discover_sitemap_entries, parse_sitemap, sitemap_candidates
+
+
+URLSET = b"""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc>https://example.com/docs/intro</loc><lastmod>2024-05-01</lastmod></url>
+  <url><loc>https://example.com/docs/install</loc></url>
+</urlset>
+"""
+
+INDEX = b"""<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <sitemap><loc>https://example.com/sitemap-docs.xml.gz</loc></sitemap>
+</sitemapindex>
+"""
+
+
+def test_parse_sitemap_reads_locations_and_lastmod():
+  entries, children = parse_sitemap(URLSET)
+
+  assert [e.url for e in entries] == ["https://example.com/docs/intro", "https://example.com/docs/install"]
+  assert entries[0].lastmod == datetime(2024, 5, 1, tzinfo=timezone.utc)
+  assert entries[1].lastmod is None
+  assert children == []
+
+
+def test_discover_follows_gzipped_sitemap_index():
+  blobs = {
+    "https://example.com/sitemap.xml": INDEX,
+    "https://example.com/sitemap-docs.xml.gz": gzip.compress(URLSET),
+  }
+
+  entries = discover_sitemap_entries(blobs.get, ["https://example.com/sitemap.xml"])
+
+  assert [e.url for e in entries] == ["https://example.com/docs/intro", "https://example.com/docs/install"]
+
+
+def test_sitemap_candidates_prefer_robots_then_docs_root():
+  robots = "User-agent: *\nSitemap: https://example.com/custom.xml\n"
+
+  candidates = sitemap_candidates("https://example.com/en/stable/index.html", root_path="/en/stable", robots_txt=robots)
+
+  assert candidates == [
+    "https://example.com/custom.xml",
+    "https://example.com/en/stable/sitemap.xml",
+    "https://example.com/sitemap.xml",
+  ]
@@ -45,8 +45,68 @@ def test_kindle_cleaner_rewrites_images_when_enabled():
     '<p>x</p><img src="images/a.png" srcset="images/a@2x.png 2x" loading="lazy" /><p>y</p>',
     keep_images=True,
     base_url="https://example.com/docs/intro",
-    image_rewriter=lambda src, base_url: "assets/a.png",
+    image_rewriter=lambda src, base_url, size: "assets/a.png",
   )
   assert 'src="assets/a.png"' in cleaned
   assert "srcset=" not in cleaned
   assert "loading=" not in cleaned
+
+
+def test_build_epub3_streams_chapters_from_a_generator(tmp_path):
+  import zipfile
+
+  def chapters():
+    for i in range(1, 4):
+      yield Chapter(index=i, title=f"T{i}", url="https://example.com", html=f"<h1>T{i}</h1><p>Body {i}</p>")
+
+  out = tmp_path / "book.epub"
+  build_epub(chapters=chapters(), out_file=out, meta=EpubMetadata(title="T", author="A"))
+
+  with zipfile.ZipFile(out) as zf:
+    names = [n for n in zf.namelist() if n.endswith("chap_002.xhtml")]
+    assert names
+    assert "Body 2" in zf.read(names[0]).decode("utf-8")
+
+
+def _tree(html: str):
+  from bs4 import BeautifulSoup
+
+  return BeautifulSoup(f"<article>{html}</article>", "lxml").article
+
+
+def test_kindle_cleaner_cleans_a_parsed_tree_without_reparsing(monkeypatch):
+  def fail(html):
+    raise AssertionError("tree was parsed again")
+
+  monkeypatch.setattr("docs2epub.kindle_html.parse_fragment", fail)
+
+  cleaned = clean_html_for_kindle_epub2(_tree('<ol start="3"><li><u>Hi</u></li></ol>'), keep_images=False)
+
+  assert cleaned == '<ol><li><span style="text-decoration: underline;">Hi</span></li></ol>'
+
+
+def test_kindle_cleaner_gives_the_same_output_for_text_and_tree():
+  html = '<h1 id="a">A</h1><p tabindex="1"><a href="#missing">x</a></p><h2 id="a">B</h2>'
+
+  assert clean_html_for_kindle_epub2(html, keep_images=False) == clean_html_for_kindle_epub2(
+    _tree(html),
+    keep_images=False,
+  )
+
+
+def test_build_epub3_uses_chapter_tree_without_reparsing(monkeypatch, tmp_path):
+  def fail(html):
+    raise AssertionError("tree was parsed again")
+
+  monkeypatch.setattr("docs2epub.epub.parse_fragment", fail)
+  chapter = Chapter(
+    index=1,
+    title="Hello",
+    url="https://example.com",
+    html="<h1>Hello</h1><p>World</p>",
+    tree=_tree("<h1>Hello</h1><p>World</p>"),
+  )
+
+  path = build_epub(chapters=[chapter], out_file=tmp_path / "book.epub", meta=EpubMetadata(title="T", author="A"))
+
+  assert path.exists()
@@ -0,0 +1,197 @@
+import gzip
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from docs2epub.transport import (
+  DownloadBudget,
+  DownloadLimits,
+  LimitedSession,
+  ResourceTooLarge,
+  TransportOptions,
+  TransportStats,
+  new_session,
+)
+
+
+def _streamed(url: str, body: bytes, headers: dict[str, str] | None = None) -> requests.Response:
+  resp = requests.Response()
+  resp.url = url
+  resp.status_code = 200
+  resp.headers = CaseInsensitiveDict(headers or {})
+  resp.raw = io.BytesIO(body)
+  return resp
+
+
+class StreamingSession:
+  def __init__(self, responses: dict[str, requests.Response]) -> None:
+    self.headers = {}
+    self.streamed: list[bool] = []
+    self._responses = responses
+
+  def get(self, url: str, timeout: int = 30, stream: bool = False):
+    self.streamed.append(stream)
+    return self._responses[url]
+
+
+@pytest.fixture
+def server():
+  statuses: list[int] = []
+  seen: list[dict[str, str]] = []
+
+  class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+      seen.append(dict(self.headers))
+      status = statuses.pop(0) if statuses else 200
+      body = gzip.compress(b"<h1>Intro</h1>") if status == 200 else b"busy"
+      self.send_response(status)
+      if status == 200:
+        self.send_header("Content-Encoding", "gzip")
+      self.send_header("Content-Length", str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+    def log_message(self, *args):
+      pass
+
+  httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+  thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+  thread.start()
+  try:
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", statuses, seen
+  finally:
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_session_sizes_pools_and_sets_headers():
+  session = new_session(TransportOptions(pool_maxsize=12, retries=5), user_agent="docs2epub-test")
+
+  adapter = session.get_adapter("https://example.com/docs")
+  assert adapter._pool_maxsize == 12
+  assert adapter.max_retries.total == 5
+  assert 502 in adapter.max_retries.status_forcelist
+  assert 429 not in adapter.max_retries.status_forcelist
+  assert session.headers["User-Agent"] == "docs2epub-test"
+  assert "gzip" in session.headers["Accept-Encoding"]
+
+
+def test_session_retries_server_errors_and_reports_timings(server):
+  base_url, statuses, seen = server
+  statuses.extend([502, 500])
+  stats = TransportStats()
+  session = new_session(TransportOptions(backoff_factor=0, backoff_jitter=0), on_request=stats.record)
+
+  resp = session.get(f"{base_url}/docs/intro", timeout=5)
+
+  assert resp.status_code == 200
+  assert resp.text == "<h1>Intro</h1>"
+  assert len(seen) == 3
+  assert "gzip" in seen[0]["Accept-Encoding"]
+  assert stats.requests == 1
+  assert stats.retries == 2
+  assert stats.slowest_url == f"{base_url}/docs/intro"
+
+
+def test_session_gives_up_after_retries(server):
+  base_url, statuses, seen = server
+  statuses.extend([504, 504, 504])
+  stats = TransportStats()
+  session = new_session(TransportOptions(retries=1, backoff_factor=0, backoff_jitter=0), on_request=stats.record)
+
+  resp = session.get(f"{base_url}/docs/intro", timeout=5)
+
+  assert resp.status_code == 504
+  assert len(seen) == 2
+  assert stats.errors == 1
+
+
+def test_limited_session_streams_body_within_cap():
+  url = "https://example.com/img/logo.png"
+  session = StreamingSession({url: _streamed(url, b"x" * 300_000)})
+  budget = DownloadBudget(DownloadLimits(max_image_bytes=400_000))
+
+  resp = LimitedSession(session, budget, kind="image").get(url)
+
+  assert session.streamed == [True]
+  assert resp.content == b"x" * 300_000
+  assert budget.downloaded_bytes == 300_000
+  assert not budget.skipped
+
+
+def test_limited_session_counts_bodies_already_in_memory():
+  # The shape of the in-memory sessions in tests and benchmarks: `_content`
+  # set, no `raw` stream behind it.
+  class PreloadedSession:
+    headers: dict[str, str] = {}
+
+    def get(self, url, timeout=30, **kwargs):
+      resp = requests.Response()
+      resp.url = url
+      resp.status_code = 200
+      resp.headers = CaseInsensitiveDict({"Content-Type": "text/html; charset=utf-8"})
+      resp._content = b"<p>page</p>" * 100
+      return resp
+
+  budget = DownloadBudget(DownloadLimits(max_page_bytes=2_000, max_total_bytes=1_500))
+  limited = LimitedSession(PreloadedSession(), budget, kind="page")
+
+  assert limited.get("https://example.com/docs/a").text.startswith("<p>page</p>")
+  assert budget.downloaded_bytes == 1_100
+  with pytest.raises(ResourceTooLarge):
+    limited.get("https://example.com/docs/b")
+  assert budget.skipped == {"page": 1}
+
+
+def test_budget_rejects_declared_length_before_reading():
+  url = "https://example.com/img/huge.gif"
+  reads: list[int] = []
+
+  class Body(io.BytesIO):
+    def read(self, size=-1):
+      reads.append(size)
+      return super().read(size)
+
+  resp = _streamed(url, b"", {"Content-Length": str(200 * 1024 * 1024)})
+  resp.raw = Body(b"x" * 10)
+  budget = DownloadBudget(DownloadLimits(max_image_bytes=1024))
+
+  with pytest.raises(ResourceTooLarge):
+    budget.read(resp, kind="image")
+
+  assert reads == []
+  assert budget.skipped == {"image": 1}
+
+
+def test_budget_aborts_on_running_count_without_length():
+  url = "https://example.com/docs/endless"
+  budget = DownloadBudget(DownloadLimits(max_page_bytes=100_000))
+
+  with pytest.raises(ResourceTooLarge):
+    budget.read(_streamed(url, b"x" * 1_000_000), kind="page")
+
+  assert budget.downloaded_bytes <= 100_000 + 64 * 1024
+  assert budget.skipped == {"page": 1}
+
+
+def test_budget_caps_total_bytes_across_resources():
+  budget = DownloadBudget(DownloadLimits(max_total_bytes=150_000))
+  session = StreamingSession(
+    {
+      "https://example.com/a.png": _streamed("https://example.com/a.png", b"a" * 100_000),
+      "https://example.com/b.png": _streamed("https://example.com/b.png", b"b" * 100_000),
+    }
+  )
+  limited = LimitedSession(session, budget, kind="image")
+
+  assert len(limited.get("https://example.com/a.png").content) == 100_000
+  with pytest.raises(ResourceTooLarge):
+    limited.get("https://example.com/b.png")
+
+  assert budget.skipped == {"image": 1}
@@ -0,0 +1,123 @@
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from docs2epub.docusaurus_next import DocusaurusNextOptions, iter_docusaurus_next
+from docs2epub.local_site import LocalSiteSession
+from docs2epub.warc import RecordingSession, WarcArchive, WarcReplaySession, WarcWriter
+
+
+def _response(url: str, status: int, body: bytes, headers: dict[str, str]) -> requests.Response:
+  resp = requests.Response()
+  resp.url = url
+  resp.status_code = status
+  resp.reason = "OK" if status == 200 else "Not Found"
+  resp.headers = CaseInsensitiveDict(headers)
+  resp._content = body
+  return resp
+
+
+@pytest.mark.parametrize("name", ["crawl.warc", "crawl.warc.gz"])
+def test_warc_round_trips_responses(tmp_path, name):
+  writer = WarcWriter(tmp_path / name)
+  writer.record(
+    _response(
+      "https://example.com/docs/intro",
+      200,
+      "<h1>Intro — café</h1>".encode("utf-8"),
+      {"Content-Type": "text/html; charset=utf-8", "Content-Encoding": "gzip", "ETag": '"v1"'},
+    )
+  )
+  writer.record(_response("https://example.com/docs/missing", 404, b"gone", {}))
+  writer.record(_response("https://example.com/img/logo.png", 200, bytes(range(256)) * 40, {"Content-Type": "image/png"}))
+  writer.close()
+
+  archive = WarcArchive(tmp_path / name)
+
+  assert len(archive) == 3
+  page = archive.response("https://example.com/docs/intro")
+  assert page.status_code == 200
+  assert page.content == "<h1>Intro — café</h1>".encode("utf-8")
+  assert page.headers["ETag"] == '"v1"'
+  assert "Content-Encoding" not in page.headers
+  assert archive.response("https://example.com/docs/missing").status_code == 404
+  assert archive.response("https://example.com/img/logo.png").content == bytes(range(256)) * 40
+  assert archive.response("https://example.com/other") is None
+  archive.close()
+
+
+def test_recording_uses_requested_url_for_redirects(tmp_path):
+  class RedirectingSession:
+    headers = {}
+
+    def get(self, url, timeout=30, **kwargs):
+      return _response("https://example.com/docs/intro/", 200, b"<h1>Intro</h1>", {})
+
+  writer = WarcWriter(tmp_path / "crawl.warc")
+  RecordingSession(RedirectingSession(), writer).get("https://example.com/docs/intro")
+  writer.close()
+
+  replay = WarcReplaySession(tmp_path / "crawl.warc")
+
+  assert replay.get("https://example.com/docs/intro").content == b"<h1>Intro</h1>"
+  assert replay.get("https://example.com/docs/other").status_code == 404
+  assert replay.misses == 1
+
+
+def test_iter_replays_recorded_crawl_without_network(tmp_path, monkeypatch):
+  site = tmp_path / "build"
+  (site / "docs").mkdir(parents=True)
+  sidebar = """
+  <nav class="menu">
+    <a class="menu__link" href="/docs/intro">Intro</a>
+    <a class="menu__link" href="/docs/install">Install</a>
+  </nav>
+  """
+  for slug, title in [("intro", "Intro"), ("install", "Install")]:
+    (site / "docs" / f"{slug}.html").write_text(
+      f"<html><body>{sidebar}<article><h1>{title}</h1><p>{title} text</p></article></body></html>",
+      encoding="utf-8",
+    )
+  options = DocusaurusNextOptions(start_url="https://example.com/docs/intro", sleep_s=0)
+  writer = WarcWriter(tmp_path / "crawl.warc.gz")
+  recorded = list(
+    iter_docusaurus_next(
+      options,
+      session=LocalSiteSession(site, site_url="https://example.com/"),
+      warc=writer,
+    )
+  )
+  writer.close()
+
+  def no_http(*args, **kwargs):
+    raise AssertionError("replay must not open an HTTP session")
+
+  monkeypatch.setattr("docs2epub.docusaurus_next.new_session", no_http)
+  replayed = list(iter_docusaurus_next(DocusaurusNextOptions(start_url=options.start_url, replay=tmp_path / "crawl.warc.gz")))
+
+  assert [c.title for c in replayed] == [c.title for c in recorded] == ["Intro", "Install"]
+  assert [c.html for c in replayed] == [c.html for c in recorded]
+
+
+def test_cli_closes_warc_when_crawl_fails(tmp_path, monkeypatch):
+  from docs2epub import cli
+
+  warc_path = tmp_path / "crawl.warc.gz"
+
+  def failing_crawl(options, *, warc, **kwargs):
+    warc.record(_response("https://example.com/docs/intro", 200, b"<h1>Intro</h1>", {}))
+    raise RuntimeError("network down")
+    yield
+
+  monkeypatch.setattr(cli, "iter_docusaurus_next", failing_crawl)
+  closed: list[bool] = []
+  real_close = WarcWriter.close
+  monkeypatch.setattr(WarcWriter, "close", lambda self: closed.append(True) or real_close(self))
+
+  with pytest.raises(RuntimeError):
+    cli.main(["https://example.com/docs/intro", str(tmp_path / "out.epub"), "--record-warc", str(warc_path)])
+
+  assert closed == [True]
+  # The partial recording is flushed and readable.
+  archive = WarcArchive(warc_path)
+  assert archive.response("https://example.com/docs/intro").content == b"<h1>Intro</h1>"